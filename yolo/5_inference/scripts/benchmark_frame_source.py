@@ -0,0 +1,153 @@
+import importlib.util
+import json
+import os
+import platform
+import shutil
+import time
+from pathlib import Path
+
+import cv2
+
+from benchmark_inference import make_synthetic_video
+from frame_source import FrameSource, letterbox_size
+from stage_timer import StageTimer, summarize
+
+
+# -----------------------------
+# CONFIG
+# -----------------------------
+SAMPLE_VIDEO = r"5_inference/samples/bench_sample.mp4"   # même échantillon que benchmark_inference.py
+BACKENDS = ["cv2", "ffmpeg", "pyav"]                     # backends absents ignorés
+IMGSZ = [640]               # tailles modèle (rails et trains : 640 par défaut)
+MODELS_PER_FRAME = 2        # référence : Ultralytics redimensionne la frame pour chaque modèle
+PREFETCH = 8
+
+# Temps d'inférence simulé par frame : le thread de décodage travaille pendant ce temps.
+# 0 = débit brut du décodage seul.
+SIMULATED_INFER_MS = [0, 20]
+
+REPORT = Path("6_evaluation/reports/frame_source_bench.json")
+
+
+# -----------------------------
+# MESURES
+# -----------------------------
+def busy_wait(ms):
+    end = time.perf_counter() + ms / 1000.0
+    while time.perf_counter() < end:
+        pass
+
+
+def bench_videocapture(path, infer_ms):
+    """Référence : cv2.VideoCapture.read() + un resize letterbox par modèle, dans la boucle."""
+    timer = StageTimer()
+    cap = cv2.VideoCapture(path)
+    w = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
+    h = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+    t0 = time.perf_counter()
+    while True:
+        timer.start()
+        ret, frame = cap.read()
+        if not ret:
+            break
+        timer.lap("decode")
+        for _ in range(MODELS_PER_FRAME):
+            for s in IMGSZ:
+                cv2.resize(frame, letterbox_size(w, h, s), interpolation=cv2.INTER_LINEAR)
+        timer.lap("resize")
+        busy_wait(infer_ms)
+        timer.end_frame()
+    cap.release()
+    return timer, time.perf_counter() - t0
+
+
+def bench_frame_source(path, backend, infer_ms):
+    """FrameSource : décodage + réduction dans le thread ; la boucle ne fait qu'attendre le paquet."""
+    timer = StageTimer()
+    t0 = time.perf_counter()
+    src = FrameSource(path, backend=backend, prescale=IMGSZ, prefetch=PREFETCH)
+    while True:
+        timer.start()
+        pkt = src.read()
+        if pkt is None:
+            break
+        timer.lap("decode")
+        for s in IMGSZ:
+            pkt.model_input(s)
+        timer.lap("resize")
+        busy_wait(infer_ms)
+        timer.end_frame()
+    src.release()
+    return timer, time.perf_counter() - t0
+
+
+def available(backend):
+    if backend == "pyav":
+        return importlib.util.find_spec("av") is not None
+    if backend == "ffmpeg":
+        return shutil.which("ffmpeg") is not None
+    return True
+
+
+def row(name, timer, wall_s):
+    return {
+        "source": name,
+        "frames": timer.frames,
+        "wall_s": round(wall_s, 3),
+        "fps": round(timer.frames / wall_s, 1) if wall_s else None,
+        "stages": {k: {m: v for m, v in st.items() if m != "hist"} for k, st in summarize(timer.samples).items()},
+    }
+
+
+# -----------------------------
+# MAIN
+# -----------------------------
+def main():
+    sample = Path(SAMPLE_VIDEO)
+    if not sample.exists():
+        print(f"🎞️ Échantillon absent, génération synthétique: {sample}")
+        make_synthetic_video(sample)
+
+    backends = [b for b in BACKENDS if available(b)]
+    skipped = [b for b in BACKENDS if b not in backends]
+    if skipped:
+        print(f"⚠️ Backends indisponibles ignorés: {skipped}")
+
+    results = []
+    for infer_ms in SIMULATED_INFER_MS:
+        timer, wall_s = bench_videocapture(str(sample), infer_ms)
+        ref = row("cv2.VideoCapture", timer, wall_s)
+        ref["infer_ms"] = infer_ms
+        results.append(ref)
+        for backend in backends:
+            timer, wall_s = bench_frame_source(str(sample), backend, infer_ms)
+            r = row(f"FrameSource[{backend}]", timer, wall_s)
+            r["infer_ms"] = infer_ms
+            r["speedup"] = round(r["fps"] / ref["fps"], 2) if ref["fps"] and r["fps"] else None
+            results.append(r)
+
+    print("\n📊 Entrée vidéo (ms par frame côté boucle d'inférence):")
+    for r in results:
+        dec = r["stages"].get("decode", {}).get("p50_ms")
+        rs = r["stages"].get("resize", {}).get("p50_ms")
+        print(f"  infer={r['infer_ms']:>3} ms  {r['source']:<22} {r['fps']:>8} FPS  "
+              f"decode p50={dec} ms  resize p50={rs} ms  x{r.get('speedup', 1.0)}")
+
+    report = {
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "sample": str(sample),
+        "imgsz": IMGSZ,
+        "models_per_frame": MODELS_PER_FRAME,
+        "prefetch": PREFETCH,
+        "env": {"python": platform.python_version(), "platform": platform.platform(),
+                "cpu_count": os.cpu_count(), "opencv": cv2.__version__},
+        "skipped_backends": skipped,
+        "results": results,
+    }
+    REPORT.parent.mkdir(parents=True, exist_ok=True)
+    REPORT.write_text(json.dumps(report, indent=2, ensure_ascii=False), encoding="utf-8")
+    print(f"🧾 Rapport: {REPORT}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,196 @@
+import importlib
+import json
+import multiprocessing as mp
+import os
+import platform
+import sys
+import time
+from pathlib import Path
+
+import cv2
+import numpy as np
+
+from stage_timer import StageTimer, summarize
+
+
+# -----------------------------
+# CONFIG
+# -----------------------------
+SCRIPTS = [
+    "infer_rails",
+    "infer_trains",
+    "infer_trains_and_rails",
+    "infer_trains_and_rails_with_history",
+]
+
+# Échantillon fixe ; généré synthétiquement s'il n'existe pas
+SAMPLE_VIDEO = r"5_inference/samples/bench_sample.mp4"
+SYNTH_FRAMES = 150
+SYNTH_SIZE = (1280, 720)
+SYNTH_FPS = 30.0
+
+# Les premières frames (warm-up des modèles) sont exclues des statistiques
+WARMUP_FRAMES = 5
+
+REPORT_DIR = Path("6_evaluation/reports")
+OUT_TMP = Path("6_evaluation/reports/bench_outputs")   # sorties des scripts pendant le bench
+BASELINE = REPORT_DIR / "benchmark_baseline.json"
+UPDATE_BASELINE = False
+
+# Régression si dégradation relative > REGRESSION_TOL (et > MIN_DELTA_MS pour les étapes)
+REGRESSION_TOL = 0.10
+MIN_DELTA_MS = 0.5
+
+
+# -----------------------------
+# ÉCHANTILLON
+# -----------------------------
+def make_synthetic_video(path, n_frames=SYNTH_FRAMES, size=SYNTH_SIZE, fps=SYNTH_FPS):
+    """
+    Vidéo synthétique déterministe : fond, deux voies et un "wagon" qui se déplace.
+    Suffit pour mesurer le coût du pipeline (pas la précision).
+    """
+    w, h = size
+    Path(path).parent.mkdir(parents=True, exist_ok=True)
+    writer = cv2.VideoWriter(str(path), cv2.VideoWriter_fourcc(*"mp4v"), fps, (w, h))
+    rng = np.random.default_rng(0)
+    background = rng.integers(90, 140, size=(h, w, 3), dtype=np.uint8)
+    for x in (w // 3, 2 * w // 3):
+        cv2.line(background, (x - 80, h), (x - 10, h // 3), (60, 60, 60), 12)
+        cv2.line(background, (x + 80, h), (x + 10, h // 3), (60, 60, 60), 12)
+    for i in range(n_frames):
+        frame = background.copy()
+        x0 = int((i / max(1, n_frames - 1)) * (w - 300))
+        cv2.rectangle(frame, (x0, h // 2), (x0 + 300, h // 2 + 160), (30, 30, 160), -1)
+        writer.write(frame)
+    writer.release()
+
+
+# -----------------------------
+# EXÉCUTION D'UN SCRIPT
+# -----------------------------
+def peak_rss_mb():
+    try:
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak / 1e6 if sys.platform == "darwin" else peak / 1024.0  # octets (macOS) / Ko (Linux)
+    except ImportError:
+        import psutil  # Windows
+        return psutil.Process().memory_info().peak_wset / 1e6
+
+
+def redirect_outputs(module, out_dir: Path):
+    # toutes les constantes OUT_* des scripts sont redirigées vers un dossier temporaire
+    for name in dir(module):
+        if name.startswith("OUT_") and isinstance(getattr(module, name), str):
+            setattr(module, name, str(out_dir / Path(getattr(module, name)).name))
+
+
+def run_script(name, sample, out_dir):
+    """
+    Exécuté dans un processus dédié (spawn) pour que le pic RSS soit propre à chaque script.
+    """
+    module = importlib.import_module(name)
+    module.SOURCE_VIDEO = sample
+    redirect_outputs(module, Path(out_dir) / name)
+
+    timer = StageTimer()
+    t0 = time.perf_counter()
+    module.main(timer=timer)
+    wall_s = time.perf_counter() - t0
+
+    samples = {stage: vals[WARMUP_FRAMES:] or vals for stage, vals in timer.samples.items()}
+    frame_ms = samples.get("frame", [])
+    loop_s = sum(frame_ms) / 1000.0
+    return {
+        "frames": timer.frames,
+        "wall_s": round(wall_s, 3),
+        "startup_s": round(wall_s - sum(timer.samples.get("frame", [])) / 1000.0, 3),
+        "fps": round(len(frame_ms) / loop_s, 2) if loop_s > 0 else None,
+        "peak_rss_mb": round(peak_rss_mb(), 1),
+        "stages": summarize(samples),
+    }
+
+
+# -----------------------------
+# COMPARAISON BASELINE
+# -----------------------------
+def compare(current, baseline, tol=REGRESSION_TOL):
+    regressions = []
+    for name, cur in current["scripts"].items():
+        ref = baseline.get("scripts", {}).get(name)
+        if ref is None:
+            continue
+        if ref.get("fps") and cur.get("fps") and cur["fps"] < ref["fps"] * (1 - tol):
+            regressions.append(f"{name}: fps {cur['fps']} < {ref['fps']}")
+        if ref.get("peak_rss_mb") and cur["peak_rss_mb"] > ref["peak_rss_mb"] * (1 + tol):
+            regressions.append(f"{name}: peak_rss {cur['peak_rss_mb']} MB > {ref['peak_rss_mb']} MB")
+        for stage, st in cur["stages"].items():
+            ref_st = ref.get("stages", {}).get(stage)
+            if not ref_st or ref_st["p50_ms"] is None or st["p50_ms"] is None:
+                continue
+            delta = st["p50_ms"] - ref_st["p50_ms"]
+            if delta > MIN_DELTA_MS and st["p50_ms"] > ref_st["p50_ms"] * (1 + tol):
+                regressions.append(f"{name}/{stage}: p50 {st['p50_ms']} ms > {ref_st['p50_ms']} ms")
+    return regressions
+
+
+def print_report(report):
+    for name, res in report["scripts"].items():
+        print(f"\n📊 {name}: {res['fps']} FPS, {res['frames']} frames, "
+              f"pic RSS {res['peak_rss_mb']} MB, démarrage {res['startup_s']} s")
+        for stage, st in res["stages"].items():
+            print(f"   {stage:<22} p50={st['p50_ms']:>9} ms  p90={st['p90_ms']:>9} ms  max={st['max_ms']:>9} ms")
+
+
+# -----------------------------
+# MAIN
+# -----------------------------
+def main():
+    sample = Path(SAMPLE_VIDEO)
+    if not sample.exists():
+        print(f"🎞️ Échantillon absent, génération synthétique: {sample}")
+        make_synthetic_video(sample)
+
+    report = {
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "sample": str(sample),
+        "warmup_frames": WARMUP_FRAMES,
+        "env": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "opencv": cv2.__version__,
+        },
+        "scripts": {},
+    }
+
+    ctx = mp.get_context("spawn")
+    for name in SCRIPTS:
+        print(f"\n🚀 Benchmark {name}")
+        with ctx.Pool(1) as pool:
+            report["scripts"][name] = pool.apply(run_script, (name, str(sample), str(OUT_TMP)))
+
+    print_report(report)
+
+    REPORT_DIR.mkdir(parents=True, exist_ok=True)
+    out_path = REPORT_DIR / f"benchmark_{time.strftime('%Y%m%d_%H%M%S')}.json"
+    out_path.write_text(json.dumps(report, indent=2, ensure_ascii=False), encoding="utf-8")
+    print(f"\n🧾 Rapport: {out_path}")
+
+    if UPDATE_BASELINE or not BASELINE.exists():
+        BASELINE.write_text(json.dumps(report, indent=2, ensure_ascii=False), encoding="utf-8")
+        print(f"📌 Baseline mise à jour: {BASELINE}")
+        return
+
+    regressions = compare(report, json.loads(BASELINE.read_text(encoding="utf-8")))
+    if regressions:
+        print(f"\n❌ Régressions (> {REGRESSION_TOL:.0%}) vs {BASELINE}:")
+        for r in regressions:
+            print("  -", r)
+        raise SystemExit(1)
+    print(f"\n✅ Pas de régression (tolérance {REGRESSION_TOL:.0%}) vs {BASELINE}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+import json
+import time
+import tracemalloc
+from pathlib import Path
+
+import cv2
+import numpy as np
+
+import infer_trains_and_rails_with_history as pipeline
+from overlay_renderer import OverlayRenderer
+
+
+# -----------------------------
+# CONFIG
+# -----------------------------
+SIZES = [(1280, 720), (1920, 1080), (3840, 2160)]
+N_FRAMES = 100
+N_RAILS = 6
+REPORT = Path("6_evaluation/reports/overlay_bench.json")
+
+
+# -----------------------------
+# SCÈNE SYNTHÉTIQUE
+# -----------------------------
+def synthetic_scene(w, h, n_rails=N_RAILS):
+    """Masque de voies fixe (caméra fixe) + frames aléatoires."""
+    mask = np.zeros((h, w), dtype=np.uint8)
+    for i in range(n_rails):
+        x_bottom = int(w * (0.1 + 0.8 * i / max(1, n_rails - 1)))
+        x_top = int(w * (0.3 + 0.4 * i / max(1, n_rails - 1)))
+        cv2.line(mask, (x_bottom, h - 1), (x_top, h // 3), 255, max(4, w // 60))
+    rails_list, _ = pipeline.connected_components_rails(mask, expected=n_rails, min_area=pipeline.MIN_AREA_RAIL)
+    rng = np.random.default_rng(0)
+    frames = [rng.integers(0, 256, size=(h, w, 3), dtype=np.uint8) for _ in range(4)]
+    return mask, rails_list, frames
+
+
+def render_reference(frame, mask_bin, rails_list):
+    out = pipeline.overlay_mask(frame, mask_bin)
+    pipeline.draw_rails(out, rails_list)
+    return out
+
+
+# -----------------------------
+# MESURES
+# -----------------------------
+def measure(render, frames, mask, rails_list):
+    """ms par frame (sans traçage) puis octets alloués par frame (tracemalloc, pic - courant)."""
+    for f in frames:
+        render(f, mask, rails_list)  # warm-up (construction du calque)
+
+    times = []
+    for i in range(N_FRAMES):
+        t = time.perf_counter()
+        render(frames[i % len(frames)], mask, rails_list)
+        times.append((time.perf_counter() - t) * 1000.0)
+    times.sort()
+
+    tracemalloc.start()
+    alloc = []
+    for i in range(min(N_FRAMES, 20)):
+        base, _ = tracemalloc.get_traced_memory()
+        tracemalloc.reset_peak()
+        render(frames[i % len(frames)], mask, rails_list)
+        alloc.append(tracemalloc.get_traced_memory()[1] - base)
+    tracemalloc.stop()
+
+    frame_bytes = frames[0].nbytes
+    return {
+        "ms_p50": round(times[len(times) // 2], 3),
+        "ms_mean": round(sum(times) / len(times), 3),
+        "alloc_bytes_per_frame": int(np.median(alloc)),
+        "alloc_frames_per_frame": round(float(np.median(alloc)) / frame_bytes, 2),
+    }
+
+
+# -----------------------------
+# MAIN
+# -----------------------------
+def main():
+    results = []
+    for w, h in SIZES:
+        mask, rails_list, frames = synthetic_scene(w, h)
+        renderer = OverlayRenderer(w, h, pipeline.draw_rails)
+        identical = all(np.array_equal(render_reference(f, mask, rails_list), renderer.render(f, mask, rails_list))
+                        for f in frames)
+        ref = measure(render_reference, frames, mask, rails_list)
+        new = measure(renderer.render, frames, mask, rails_list)
+        results.append({"size": [w, h], "rails": len(rails_list), "identical": identical,
+                        "layer_cached": renderer.layer_cached, "reference": ref, "renderer": new,
+                        "speedup": round(ref["ms_p50"] / new["ms_p50"], 2) if new["ms_p50"] else None})
+
+    print("📊 Overlay (p50 ms / octets alloués par frame):")
+    for r in results:
+        w, h = r["size"]
+        print(f"  {w}x{h}: référence {r['reference']['ms_p50']} ms / {r['reference']['alloc_bytes_per_frame']} o"
+              f"  ->  renderer {r['renderer']['ms_p50']} ms / {r['renderer']['alloc_bytes_per_frame']} o"
+              f"  x{r['speedup']}  {'✅ identique' if r['identical'] else '❌ différent'}"
+              f"{'' if r['layer_cached'] else '  (calque redessiné : texte anti-aliasé)'}")
+
+    REPORT.parent.mkdir(parents=True, exist_ok=True)
+    REPORT.write_text(json.dumps({"created": time.strftime("%Y-%m-%dT%H:%M:%S"), "opencv": cv2.__version__,
+                                  "n_frames": N_FRAMES, "results": results}, indent=2, ensure_ascii=False),
+                      encoding="utf-8")
+    print(f"🧾 Rapport: {REPORT}")
+    if not all(r["identical"] for r in results):
+        raise SystemExit("\n❌ Le rendu diffère de overlay_mask + draw_rail_bbox\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,205 @@
+import json
+import time
+from pathlib import Path
+
+import numpy as np
+
+import infer_trains_and_rails_with_history as pipeline
+from detection_cache import DetectionCache, DetectionCacheWriter
+from evaluate_occupancy import score_video
+from replay_occupancy import replay
+
+
+# -----------------------------
+# CONFIG
+# -----------------------------
+# Cache écrit par infer_trains_and_rails_with_history.py (SAVE_DET_CACHE = True, TRACKER = "botsort.yaml")
+CACHE_DIR = Path("7_outputs/cache/video")
+# Vidéo du cache : frames pour la compensation de mouvement (GMC) de BoT-SORT ; None = meta["source"]
+SOURCE_VIDEO = None
+
+# Le cache du pipeline contient la sortie de track() : détections déjà filtrées par BoT-SORT (conf >= CONF_TRAINS).
+# Les trackers rejoués reçoivent à la place les détections brutes de predict() à RAW_CONF (seuil bas de
+# BoT-SORT/ByteTrack), calculées une fois sur SOURCE_VIDEO avec TRAINS_MODEL, masques rails repris du cache.
+RAW_CONF = 0.1
+RAW_CACHE_DIR = None   # None = <CACHE_DIR>_raw
+
+# Vérité terrain (format evaluate_occupancy.py) : ID switches, F1 d'occupation, événements
+GT_CSV = None  # ex: Path("1_datasets/tracking_videos/video_gt.csv")
+
+# "cache" : IDs enregistrés (BoT-SORT en ligne) ; YAML Ultralytics ; "rail" : rail_tracker.py
+TRACKERS = ["cache", "botsort.yaml", "bytetrack.yaml", "rail"]
+
+OUT_DIR = Path("7_outputs/tracker_bench")   # un sous-dossier par tracker
+REPORT = Path("6_evaluation/reports/tracker_comparison.json")
+
+
+# -----------------------------
+# TRACKERS REJOUÉS
+# -----------------------------
+class UltralyticsRetrack:
+    """Tracker Ultralytics (BoT-SORT / ByteTrack) nourri avec les détections du cache."""
+
+    def __init__(self, tracker_yaml, source, w, h, fps):
+        import yaml
+        from ultralytics.trackers.track import TRACKER_MAP
+        from ultralytics.utils import IterableSimpleNamespace
+        from ultralytics.utils.checks import check_yaml
+
+        from frame_source import FrameSource
+
+        # même construction que cascade_detector.py / tiled_inference.py
+        cfg = IterableSimpleNamespace(**yaml.safe_load(Path(check_yaml(tracker_yaml)).read_text(encoding="utf-8")))
+        self.tracker = TRACKER_MAP[cfg.tracker_type](args=cfg, frame_rate=int(round(fps)))
+        self.src = FrameSource(source)
+        self.w, self.h = w, h
+        self.seconds = 0.0
+
+    def __call__(self, frame_idx, xyxy, confs, cc_labels, rails_list):
+        from ultralytics.engine.results import Boxes
+
+        pkt = self.src.read()   # frames dans l'ordre, comme le pipeline
+        if pkt is None or pkt.idx != frame_idx:
+            raise RuntimeError(f"Vidéo et cache désynchronisés à la frame {frame_idx}")
+        det = np.concatenate([xyxy, confs[:, None], np.zeros((len(xyxy), 1), dtype=np.float32)], axis=1)
+        t0 = time.perf_counter()
+        tracks = self.tracker.update(Boxes(det, (self.h, self.w)), pkt.frame) if len(det) else np.zeros((0, 8))
+        self.seconds += time.perf_counter() - t0
+        if len(tracks) == 0:
+            return xyxy[:0], confs[:0], np.zeros(0, dtype=int)
+        idx = tracks[:, -1].astype(int)
+        return xyxy[idx], confs[idx], tracks[:, 4].astype(int)
+
+    def close(self):
+        self.src.release()
+
+    def summary(self):
+        return {}
+
+
+class RailRetrack:
+    """rail_tracker.py, nourri comme dans le pipeline : détections de predict() à CONF_TRAINS."""
+
+    def __init__(self):
+        self.tracker = pipeline.make_rail_tracker()
+        self.seconds = 0.0
+
+    def __call__(self, frame_idx, xyxy, confs, cc_labels, rails_list):
+        keep = confs >= pipeline.CONF_TRAINS
+        xyxy, confs = xyxy[keep], confs[keep]
+        t0 = time.perf_counter()
+        out = self.tracker.update(frame_idx, xyxy, confs, cc_labels, rails_list)
+        self.seconds += time.perf_counter() - t0
+        return out
+
+    def close(self):
+        pass
+
+    def summary(self):
+        return self.tracker.summary()
+
+
+def make_retrack(name, cache, source):
+    if name == "cache":
+        return None
+    if name == "rail":
+        return RailRetrack()
+    return UltralyticsRetrack(name, source, cache.w, cache.h, cache.fps)
+
+
+def build_raw_cache(cache, source, cache_dir: Path):
+    """
+    Détections brutes (predict() à RAW_CONF, sans tracker) de toute la vidéo, masques rails du cache
+    enregistré. Réutilisé tant que la source, le modèle et le seuil ne changent pas.
+    """
+    meta = {**cache.meta, "tracker": None, "raw_conf": RAW_CONF, "source": str(source),
+            "trains_model": str(pipeline.TRAINS_MODEL)}
+    if (cache_dir / "meta.json").exists():
+        raw = DetectionCache(cache_dir)
+        if all(raw.meta.get(k) == meta[k] for k in ("raw_conf", "source", "trains_model", "n_frames")):
+            return raw
+
+    from frame_source import FrameSource
+
+    print(f"🔎 Détections brutes (conf >= {RAW_CONF}) -> {cache_dir}")
+    model = pipeline.load_model(pipeline.TRAINS_MODEL)
+    src = FrameSource(source)
+    writer = DetectionCacheWriter(cache_dir, cache.fps, cache.w, cache.h, meta={
+        k: v for k, v in meta.items() if k not in ("fps", "w", "h", "n_frames", "mask_blobs")})
+    try:
+        for frame_idx in range(cache.n_frames):
+            pkt = src.read()
+            if pkt is None or pkt.idx != frame_idx:
+                raise RuntimeError(f"Vidéo et cache désynchronisés à la frame {frame_idx}")
+            tr = model.predict(pkt.frame, imgsz=pipeline.IMGSZ_TRAINS, conf=RAW_CONF,
+                               iou=pipeline.IOU_TRAINS, verbose=False)[0]
+            xyxy, confs, _ = pipeline.boxes_from_result(tr)
+            q = cache.mask(int(cache.mask_blob[frame_idx]))
+            writer.add(xyxy, confs, None, None if q is None else q[None].astype(np.float32) / 255.0)
+    finally:
+        src.release()
+        writer.close()
+    return DetectionCache(cache_dir)
+
+
+def count_ids(out_dir: Path):
+    ids = set()
+    for line in (out_dir / "occupancy_per_frame.csv").read_text(encoding="utf-8").splitlines()[1:]:
+        tids = line.rsplit(",", 1)[-1].strip()
+        if tids:
+            ids.update(tids.split(";"))
+    return len(ids)
+
+
+# -----------------------------
+# MAIN
+# -----------------------------
+def main():
+    if not (CACHE_DIR / "meta.json").exists():
+        raise SystemExit(f"\n❌ Cache introuvable: {CACHE_DIR} (lance d'abord le pipeline avec SAVE_DET_CACHE = True)\n")
+
+    cache = DetectionCache(CACHE_DIR)
+    source = SOURCE_VIDEO or cache.meta.get("source")
+    print(f"🗃️ Cache: {CACHE_DIR} ({cache.n_frames} frames, tracker enregistré: {cache.meta.get('tracker')})")
+    raw = None
+    if any(name != "cache" for name in TRACKERS):
+        raw = build_raw_cache(cache, source, Path(RAW_CACHE_DIR or f"{CACHE_DIR}_raw"))
+
+    results = []
+    for name in TRACKERS:
+        retrack = make_retrack(name, cache, source)
+        out_dir = OUT_DIR / Path(name).stem
+        t0 = time.perf_counter()
+        try:
+            replay(cache if retrack is None else raw, out_dir, retrack=retrack)
+        finally:
+            if retrack is not None:
+                retrack.close()
+        wall = time.perf_counter() - t0
+
+        res = {"tracker": name, "out_dir": str(out_dir), "replay_s": round(wall, 3),
+               "ids_on_rails": count_ids(out_dir)}
+        if retrack is not None:
+            res["tracker_ms_per_frame"] = round(1000.0 * retrack.seconds / cache.n_frames, 3)
+            res["tracker_fps"] = round(cache.n_frames / retrack.seconds, 1) if retrack.seconds else None
+            res.update(retrack.summary())
+        if GT_CSV is not None:
+            res["score"] = score_video(out_dir, Path(GT_CSV))
+        results.append(res)
+
+        line = f"▶️ {name:<15} {res['ids_on_rails']} IDs"
+        if "tracker_ms_per_frame" in res:
+            line += f"  {res['tracker_ms_per_frame']} ms/frame"
+        if "score" in res:
+            line += f"  F1={res['score']['occupancy']['f1']}  idsw={res['score']['id_switches']}"
+        print(line)
+
+    REPORT.parent.mkdir(parents=True, exist_ok=True)
+    REPORT.write_text(json.dumps({"cache": str(CACHE_DIR), "raw_cache": str(raw.dir) if raw else None,
+                                  "raw_conf": RAW_CONF, "frames": cache.n_frames, "results": results},
+                                 indent=2, ensure_ascii=False), encoding="utf-8")
+    print(f"🧾 Rapport: {REPORT}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+from collections import Counter
+from pathlib import Path
+
+import numpy as np
+import torch
+import yaml
+from ultralytics import YOLO
+from ultralytics.trackers.track import TRACKER_MAP
+from ultralytics.utils import IterableSimpleNamespace
+from ultralytics.utils.checks import check_yaml
+
+import yard_metrics as metrics
+
+
+# -----------------------------
+# UTILS
+# -----------------------------
+def iou_matrix(a, b):
+    """IoU (len(a), len(b)) entre deux tableaux de boîtes xyxy."""
+    if len(a) == 0 or len(b) == 0:
+        return np.zeros((len(a), len(b)), dtype=np.float32)
+    x1 = np.maximum(a[:, None, 0], b[None, :, 0])
+    y1 = np.maximum(a[:, None, 1], b[None, :, 1])
+    x2 = np.minimum(a[:, None, 2], b[None, :, 2])
+    y2 = np.minimum(a[:, None, 3], b[None, :, 3])
+    inter = np.clip(x2 - x1, 0, None) * np.clip(y2 - y1, 0, None)
+    area_a = (a[:, 2] - a[:, 0]) * (a[:, 3] - a[:, 1])
+    area_b = (b[:, 2] - b[:, 0]) * (b[:, 3] - b[:, 1])
+    return inter / np.maximum(area_a[:, None] + area_b[None, :] - inter, 1e-9)
+
+
+# -----------------------------
+# CASCADE
+# -----------------------------
+class CascadeTracker:
+    """
+    Détecteur en cascade avec la même interface que YOLO.track(...)[0] :
+      - le petit modèle (nano) tourne sur chaque frame ;
+      - le modèle complet (yolo11s) n'est appelé que si la frame est "incertaine" :
+          * une détection a une confiance dans [conf_low, conf_high[,
+          * le nombre de détections change par rapport à la frame précédente,
+          * une détection ne recouvre aucune boîte de la frame précédente (nouveau train) ;
+      - le tracker (BoT-SORT / ByteTrack, même YAML) est mis à jour avec les détections
+        retenues, exactement comme le fait Ultralytics dans track().
+    """
+
+    def __init__(self, fast_model, heavy_model, conf_low=0.10, conf_high=0.50, new_object_iou=0.3):
+        self.fast = YOLO(fast_model)
+        self.heavy = YOLO(heavy_model)
+        self.conf_low = conf_low
+        self.conf_high = conf_high
+        self.new_object_iou = new_object_iou
+
+        self.tracker = None
+        self.prev_xyxy = np.zeros((0, 4), dtype=np.float32)
+        self.frames = 0
+        self.escalated = 0
+        self.reasons = Counter()
+
+    @staticmethod
+    def _make_tracker(tracker_yaml):
+        # même construction que ultralytics.trackers.track.on_predict_start
+        cfg = IterableSimpleNamespace(**yaml.safe_load(Path(check_yaml(tracker_yaml)).read_text(encoding="utf-8")))
+        return TRACKER_MAP[cfg.tracker_type](args=cfg, frame_rate=30)
+
+    def escalation_reason(self, boxes, conf):
+        xyxy = boxes.xyxy.cpu().numpy()
+        confs = boxes.conf.cpu().numpy()
+        if ((confs >= self.conf_low) & (confs < max(self.conf_high, conf))).any():
+            return "uncertain_conf"
+        if len(xyxy) != len(self.prev_xyxy):
+            return "count_change"
+        if len(xyxy) and (iou_matrix(xyxy, self.prev_xyxy).max(axis=1) < self.new_object_iou).any():
+            return "new_object"
+        return None
+
+    def track(self, frame, imgsz=640, conf=0.25, iou=0.45, tracker="botsort.yaml", persist=True, verbose=False):
+        if self.tracker is None or not persist:
+            self.tracker = self._make_tracker(tracker)
+        self.frames += 1
+
+        # le nano tourne avec un seuil bas pour voir les détections "limites"
+        result = self.fast.predict(frame, imgsz=imgsz, conf=self.conf_low, iou=iou, verbose=verbose)[0]
+        reason = self.escalation_reason(result.boxes, conf)
+        if reason is not None:
+            self.escalated += 1
+            self.reasons[reason] += 1
+            metrics.inc("cascade_escalations_total", reason=reason)
+            result = self.heavy.predict(frame, imgsz=imgsz, conf=conf, iou=iou, verbose=verbose)[0]
+
+        det = result.boxes.cpu().numpy()
+        self.prev_xyxy = det.xyxy
+        if len(det) == 0:
+            return [result]
+        tracks = self.tracker.update(det, frame)
+        if len(tracks) == 0:
+            return [result]
+        idx = tracks[:, -1].astype(int)
+        result = result[idx]
+        result.update(boxes=torch.as_tensor(tracks[:, :-1]))
+        return [result]
+
+    def summary(self):
+        return {
+            "frames": self.frames,
+            "escalated": self.escalated,
+            "escalation_ratio": round(self.escalated / self.frames, 4) if self.frames else 0.0,
+            "reasons": dict(self.reasons),
+        }
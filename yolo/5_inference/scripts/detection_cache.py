@@ -0,0 +1,135 @@
+import json
+import zlib
+from pathlib import Path
+
+import numpy as np
+
+
+# -----------------------------
+# FORMAT
+# -----------------------------
+# Un dossier par vidéo :
+#   meta.json   fps, w, h, n_frames, modèles et paramètres d'inférence
+#   dets.npz    box_offsets (n+1), boxes (M,4) float32, confs (M,) float32,
+#               ids (M,) int32 (-1 = pas d'ID), mask_blob (n,) int32 (-1 = aucun masque)
+#   masks.bin   masques rails compressés (zlib), un blob par masque DIFFÉRENT du précédent
+#   masks.npz   blob_offsets (B+1), blob_shape (B,2)
+#
+# Le masque stocké est le max des masques d'instance à la résolution modèle, quantifié
+# en uint8. Ultralytics et onnx_yolo.py binarisent déjà les masques à 0.5 : il ne contient
+# que 0 et 255, et MASK_THRESH ne peut pas être rejoué depuis le cache.
+ZLIB_LEVEL = 1
+
+
+def quantize_mask(masks):
+    """Masques d'instance (K,mh,mw) float 0..1 -> masque stocké (mh,mw) uint8."""
+    return np.rint(np.asarray(masks).max(axis=0) * 255.0).astype(np.uint8)
+
+
+class DetectionCacheWriter:
+    """
+    Écrit les sorties brutes des modèles frame par frame (flux, mémoire bornée
+    pour les masques ; les boîtes sont petites et gardées jusqu'à close()).
+    """
+
+    def __init__(self, cache_dir, fps, w, h, meta=None):
+        self.dir = Path(cache_dir)
+        self.dir.mkdir(parents=True, exist_ok=True)
+        self.meta = {"fps": fps, "w": w, "h": h, **(meta or {})}
+        self._masks = open(self.dir / "masks.bin", "wb")
+        self._boxes, self._confs, self._ids = [], [], []
+        self._box_offsets = [0]
+        self._mask_blob = []
+        self._blob_offsets = [0]
+        self._blob_shape = []
+        self._prev_mask = None
+
+    def add(self, xyxy, confs, track_ids, masks):
+        """
+        xyxy (N,4), confs (N,), track_ids (N,) ou None, masks (K,mh,mw) float 0..1 ou None,
+        ou masque déjà quantifié (mh,mw) uint8 (quantize_mask, infer_pipeline_mp.py).
+        """
+        n = 0 if xyxy is None else len(xyxy)
+        if n:
+            self._boxes.append(np.asarray(xyxy, dtype=np.float32).reshape(n, 4))
+            self._confs.append(np.asarray(confs, dtype=np.float32))
+            ids = np.full(n, -1, dtype=np.int32) if track_ids is None else np.asarray(track_ids, dtype=np.int32)
+            self._ids.append(ids)
+        self._box_offsets.append(self._box_offsets[-1] + n)
+
+        if masks is None or len(masks) == 0:
+            self._mask_blob.append(-1)
+            return
+        masks = np.asarray(masks)
+        if masks.ndim == 2 and masks.dtype == np.uint8:
+            q = masks.copy()   # peut être une vue sur un slot réutilisé
+        else:
+            q = quantize_mask(masks)
+        # caméra fixe : le masque rails change rarement, on réutilise le blob précédent
+        if self._prev_mask is not None and q.shape == self._prev_mask.shape and np.array_equal(q, self._prev_mask):
+            self._mask_blob.append(len(self._blob_shape) - 1)
+            return
+        blob = zlib.compress(q.tobytes(), ZLIB_LEVEL)
+        self._masks.write(blob)
+        self._blob_offsets.append(self._blob_offsets[-1] + len(blob))
+        self._blob_shape.append(q.shape)
+        self._mask_blob.append(len(self._blob_shape) - 1)
+        self._prev_mask = q
+
+    def close(self):
+        self._masks.close()
+        cat = lambda parts, shape, dtype: np.concatenate(parts) if parts else np.zeros(shape, dtype=dtype)
+        np.savez(
+            self.dir / "dets.npz",
+            box_offsets=np.asarray(self._box_offsets, dtype=np.int64),
+            boxes=cat(self._boxes, (0, 4), np.float32),
+            confs=cat(self._confs, (0,), np.float32),
+            ids=cat(self._ids, (0,), np.int32),
+            mask_blob=np.asarray(self._mask_blob, dtype=np.int32),
+        )
+        np.savez(
+            self.dir / "masks.npz",
+            blob_offsets=np.asarray(self._blob_offsets, dtype=np.int64),
+            blob_shape=np.asarray(self._blob_shape, dtype=np.int32).reshape(-1, 2),
+        )
+        self.meta["n_frames"] = len(self._mask_blob)
+        self.meta["mask_blobs"] = len(self._blob_shape)
+        (self.dir / "meta.json").write_text(json.dumps(self.meta, indent=2), encoding="utf-8")
+
+
+class DetectionCache:
+    """Lecture d'un cache écrit par DetectionCacheWriter."""
+
+    def __init__(self, cache_dir):
+        self.dir = Path(cache_dir)
+        self.meta = json.loads((self.dir / "meta.json").read_text(encoding="utf-8"))
+        self.fps = float(self.meta["fps"])
+        self.w = int(self.meta["w"])
+        self.h = int(self.meta["h"])
+
+        d = np.load(self.dir / "dets.npz")
+        self.box_offsets = d["box_offsets"]
+        self.boxes = d["boxes"]
+        self.confs = d["confs"]
+        self.ids = d["ids"]
+        self.mask_blob = d["mask_blob"]
+        self.n_frames = len(self.mask_blob)
+
+        m = np.load(self.dir / "masks.npz")
+        self.blob_offsets = m["blob_offsets"]
+        self.blob_shape = m["blob_shape"]
+        self._blobs = (self.dir / "masks.bin").read_bytes()
+
+    def detections(self, i):
+        """-> (xyxy, confs, track_ids ou None) pour la frame i."""
+        a, b = self.box_offsets[i], self.box_offsets[i + 1]
+        ids = self.ids[a:b]
+        return self.boxes[a:b], self.confs[a:b], (None if len(ids) and (ids < 0).all() else ids)
+
+    def mask(self, blob_id):
+        """Masque rails uint8 (résolution modèle) d'un blob, ou None si blob_id < 0."""
+        if blob_id < 0:
+            return None
+        a, b = self.blob_offsets[blob_id], self.blob_offsets[blob_id + 1]
+        mh, mw = self.blob_shape[blob_id]
+        return np.frombuffer(zlib.decompress(self._blobs[a:b]), dtype=np.uint8).reshape(mh, mw)
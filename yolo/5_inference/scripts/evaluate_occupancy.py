@@ -0,0 +1,348 @@
+import csv
+import json
+import os
+import time
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from multiprocessing import get_context
+from pathlib import Path
+
+
+# -----------------------------
+# CONFIG
+# -----------------------------
+VIDEOS_DIR = Path("1_datasets/tracking_videos")
+VIDEO_EXTS = {".mp4", ".avi", ".mov", ".mkv"}
+# Vérité terrain : <video_stem>_gt.csv à côté de la vidéo, colonnes voie,gt_id,start_s,end_s
+GT_SUFFIX = "_gt.csv"
+
+OUT_DIR = Path("7_outputs/eval")          # sorties du pipeline, un dossier par vidéo
+RUN_INFERENCE = True      # False = ne fait que scorer les sorties déjà présentes dans OUT_DIR
+PIPELINE = "infer_trains_and_rails_with_history"
+
+# Variante évaluée : constantes du pipeline surchargées, ex. {"CASCADE": True} ou {"MOTION_GATE": True}.
+# RUN_NAME sépare les rapports des variantes pour les comparer (précision vs débit).
+RUN_NAME = "default"
+PIPELINE_OVERRIDES = {}
+
+REPORT = Path(f"6_evaluation/reports/occupancy_eval_{RUN_NAME}.json")
+REPORT_CSV = Path(f"6_evaluation/reports/occupancy_eval_{RUN_NAME}.csv")
+
+NUM_WORKERS = max(1, (os.cpu_count() or 2) // 4)
+THREADS_PER_WORKER = 4    # threads torch/OpenMP par worker (évite la sur-souscription)
+
+EVENT_TOL_S = 2.0         # fenêtre d'appariement des événements arrivée/départ
+
+
+# -----------------------------
+# LECTURE
+# -----------------------------
+def load_gt(gt_csv: Path):
+    """
+    Retourne {voie: [(gt_id, start_s, end_s), ...]}.
+    """
+    gt = defaultdict(list)
+    with open(gt_csv, newline="", encoding="utf-8") as f:
+        for row in csv.DictReader(f):
+            gt[row["voie"]].append((row["gt_id"], float(row["start_s"]), float(row["end_s"])))
+    for voie in gt:
+        gt[voie].sort(key=lambda it: it[1])
+    return gt
+
+
+def load_pred_frames(occupancy_csv: Path):
+    """
+    occupancy_per_frame.csv -> (times{frame: time_s}, occ{(frame, voie): [track_ids]})
+    """
+    times = {}
+    occ = {}
+    with open(occupancy_csv, newline="", encoding="utf-8") as f:
+        for row in csv.DictReader(f):
+            fr = int(row["frame"])
+            times[fr] = float(row["time_s"])
+            ids = [int(x) for x in row["train_track_ids"].split(";") if x]
+            occ[(fr, row["voie"])] = ids
+    return times, occ
+
+
+def load_pred_events(events_jsonl: Path, times):
+    """
+    Arrivées/départs horodatés à partir de occupancy_events.jsonl :
+      - arrival  : à start_frame (première frame du track sur une voie) ;
+      - departure : à end_frame + 1 (première frame sans le track) ;
+      - voie_change entre deux voies : départ + arrivée à end_frame + 1 (première frame sur la nouvelle voie).
+    Les voie_change avec un bout None (passage hors masque) ne sont pas comptés en plus, sauf retour sur une
+    autre voie que la dernière connue du track. Sorties antérieures sans arrival/departure : voie_change seuls.
+    """
+    events = []
+    if not events_jsonl.exists():
+        return events
+    with open(events_jsonl, encoding="utf-8") as f:
+        recs = [json.loads(line) for line in f if line.strip()]
+    explicit = any(ev["event"] in ("arrival", "departure") for ev in recs)
+
+    def at(fr, default):
+        return times.get(fr, default)
+
+    last_voie = {}   # track_id -> dernière voie connue (arrival / voie_change), pour les retours hors masque
+    for ev in recs:
+        kind, tid = ev["event"], ev["track_id"]
+        if kind == "arrival":
+            events.append(("arrival", ev["to_voie"], at(ev["start_frame"], ev["start_time_s"])))
+            last_voie[tid] = ev["to_voie"]
+        elif kind == "departure":
+            events.append(("departure", ev["from_voie"], at(ev["end_frame"] + 1, ev["end_time_s"])))
+            last_voie.pop(tid, None)
+        elif kind == "voie_change":
+            t = at(ev["end_frame"] + 1, ev["end_time_s"])
+            src, dst = ev["from_voie"], ev["to_voie"]
+            if explicit and src is None:
+                src = last_voie.get(tid)
+                if src == dst or dst is None:
+                    continue
+            elif explicit and dst is None:
+                continue
+            if src:
+                events.append(("departure", src, t))
+            if dst:
+                events.append(("arrival", dst, t))
+                last_voie[tid] = dst
+    return events
+
+
+# -----------------------------
+# SCORES
+# -----------------------------
+def gt_ids_at(intervals, t):
+    return [gid for gid, s, e in intervals if s <= t <= e]
+
+
+def frame_occupancy_scores(gt, times, occ):
+    voies = sorted({v for (_, v) in occ} | set(gt))
+    tp = fp = fn = tn = 0
+    per_voie = {}
+    for voie in voies:
+        vtp = vfp = vfn = 0
+        for fr, t in times.items():
+            pred = bool(occ.get((fr, voie)))
+            true = bool(gt_ids_at(gt.get(voie, []), t))
+            if pred and true:
+                vtp += 1
+            elif pred:
+                vfp += 1
+            elif true:
+                vfn += 1
+            else:
+                tn += 1
+        per_voie[voie] = f1_block(vtp, vfp, vfn)
+        tp, fp, fn = tp + vtp, fp + vfp, fn + vfn
+    out = f1_block(tp, fp, fn)
+    out["tn"] = tn
+    out["per_voie"] = per_voie
+    return out
+
+
+def f1_block(tp, fp, fn):
+    p = tp / (tp + fp) if tp + fp else 0.0
+    r = tp / (tp + fn) if tp + fn else 0.0
+    f1 = 2 * p * r / (p + r) if p + r else 0.0
+    return {"tp": tp, "fp": fp, "fn": fn, "precision": round(p, 4), "recall": round(r, 4), "f1": round(f1, 4)}
+
+
+def gt_events(gt):
+    events = []
+    for voie, intervals in gt.items():
+        for _, s, e in intervals:
+            events.append(("arrival", voie, s))
+            events.append(("departure", voie, e))
+    return events
+
+
+def event_timing_scores(gt_evs, pred_evs, tol=EVENT_TOL_S):
+    """
+    Appariement glouton (par type et voie, écart croissant) dans une fenêtre de tol secondes.
+    """
+    candidates = []
+    for i, (gk, gv, gt_t) in enumerate(gt_evs):
+        for j, (pk, pv, pt) in enumerate(pred_evs):
+            if gk == pk and gv == pv and abs(pt - gt_t) <= tol:
+                candidates.append((abs(pt - gt_t), i, j))
+    candidates.sort()
+    used_g, used_p, errors = set(), set(), []
+    for err, i, j in candidates:
+        if i in used_g or j in used_p:
+            continue
+        used_g.add(i)
+        used_p.add(j)
+        errors.append(err)
+    errors.sort()
+    n = len(errors)
+    return {
+        "gt_events": len(gt_evs),
+        "pred_events": len(pred_evs),
+        "matched": n,
+        "missed": len(gt_evs) - n,
+        "spurious": len(pred_evs) - n,
+        "mean_abs_error_s": round(sum(errors) / n, 3) if n else None,
+        "median_abs_error_s": round(errors[n // 2], 3) if n else None,
+        "p90_abs_error_s": round(errors[min(n - 1, int(0.9 * n))], 3) if n else None,
+    }
+
+
+def id_switches(gt, times, occ):
+    """
+    Pour chaque intervalle GT, suit l'ID du train prédit sur la voie frame par frame
+    et compte les changements d'ID (les frames sans prédiction sont ignorées).
+    """
+    switches = 0
+    for voie, intervals in gt.items():
+        for _, s, e in intervals:
+            prev = None
+            for fr in sorted(f for f, t in times.items() if s <= t <= e):
+                ids = occ.get((fr, voie))
+                if not ids:
+                    continue
+                cur = prev if prev in ids else min(ids)
+                if prev is not None and cur != prev:
+                    switches += 1
+                prev = cur
+    return switches
+
+
+def score_video(out_dir: Path, gt_csv: Path):
+    times, occ = load_pred_frames(out_dir / "occupancy_per_frame.csv")
+    gt = load_gt(gt_csv)
+    pred_evs = load_pred_events(out_dir / "occupancy_events.jsonl", times)
+    return {
+        "frames": len(times),
+        "occupancy": frame_occupancy_scores(gt, times, occ),
+        "events": event_timing_scores(gt_events(gt), pred_evs),
+        "id_switches": id_switches(gt, times, occ),
+    }
+
+
+# -----------------------------
+# WORKER
+# -----------------------------
+def init_worker(threads):
+    # avant tout import de torch / numpy dans le worker
+    for var in ["OMP_NUM_THREADS", "MKL_NUM_THREADS", "OPENBLAS_NUM_THREADS"]:
+        os.environ[var] = str(threads)
+
+
+def eval_one(video: str, gt_csv: str):
+    video, gt_csv = Path(video), Path(gt_csv)
+    out_dir = OUT_DIR / RUN_NAME / video.stem
+    result = {"video": video.name}
+
+    if RUN_INFERENCE:
+        import importlib
+
+        from benchmark_inference import redirect_outputs
+        from stage_timer import StageTimer
+
+        pipeline = importlib.import_module(PIPELINE)
+        pipeline.SOURCE_VIDEO = str(video)
+        for k, v in PIPELINE_OVERRIDES.items():
+            setattr(pipeline, k, v)
+        redirect_outputs(pipeline, out_dir)
+        out_dir.mkdir(parents=True, exist_ok=True)
+
+        timer = StageTimer()
+        t0 = time.perf_counter()
+        pipeline.main(timer=timer)
+        wall = time.perf_counter() - t0
+        loop_s = sum(timer.samples.get("frame", [])) / 1000.0
+        result["throughput"] = {
+            "wall_s": round(wall, 2),
+            "fps": round(timer.frames / loop_s, 2) if loop_s else None,
+        }
+
+    result.update(score_video(out_dir, gt_csv))
+    return result
+
+
+def find_videos():
+    pairs = []
+    for v in sorted(VIDEOS_DIR.iterdir()):
+        if v.suffix.lower() not in VIDEO_EXTS:
+            continue
+        gt = v.with_name(v.stem + GT_SUFFIX)
+        if gt.exists():
+            pairs.append((v, gt))
+        else:
+            print(f"⚠️ Pas de vérité terrain pour {v.name} ({gt.name})")
+    return pairs
+
+
+# -----------------------------
+# MAIN
+# -----------------------------
+def aggregate(results):
+    tp = sum(r["occupancy"]["tp"] for r in results)
+    fp = sum(r["occupancy"]["fp"] for r in results)
+    fn = sum(r["occupancy"]["fn"] for r in results)
+    errs = [r["events"]["mean_abs_error_s"] for r in results if r["events"]["mean_abs_error_s"] is not None]
+    out = {
+        "videos": len(results),
+        "frames": sum(r["frames"] for r in results),
+        "occupancy": f1_block(tp, fp, fn),
+        "events_matched": sum(r["events"]["matched"] for r in results),
+        "events_missed": sum(r["events"]["missed"] for r in results),
+        "events_spurious": sum(r["events"]["spurious"] for r in results),
+        "mean_event_error_s": round(sum(errs) / len(errs), 3) if errs else None,
+        "id_switches": sum(r["id_switches"] for r in results),
+    }
+    fps = [r["throughput"]["fps"] for r in results if r.get("throughput", {}).get("fps")]
+    if fps:
+        out["mean_fps_per_video"] = round(sum(fps) / len(fps), 2)
+    return out
+
+
+def main():
+    pairs = find_videos()
+    if not pairs:
+        raise SystemExit(f"❌ Aucune vidéo annotée dans {VIDEOS_DIR} (attendu: <nom>.mp4 + <nom>{GT_SUFFIX})")
+
+    print(f"🎥 {len(pairs)} vidéos, {NUM_WORKERS} workers x {THREADS_PER_WORKER} threads")
+    t0 = time.perf_counter()
+    results = []
+    with ProcessPoolExecutor(max_workers=NUM_WORKERS, mp_context=get_context("spawn"),
+                             initializer=init_worker, initargs=(THREADS_PER_WORKER,)) as pool:
+        futures = {pool.submit(eval_one, str(v), str(g)): v for v, g in pairs}
+        for fut in as_completed(futures):
+            r = fut.result()
+            results.append(r)
+            print(f"✅ {r['video']}: F1={r['occupancy']['f1']}  "
+                  f"evt_err={r['events']['mean_abs_error_s']} s  idsw={r['id_switches']}  "
+                  f"fps={r.get('throughput', {}).get('fps')}")
+    wall = time.perf_counter() - t0
+
+    results.sort(key=lambda r: r["video"])
+    summary = aggregate(results)
+    summary["run_name"] = RUN_NAME
+    summary["overrides"] = PIPELINE_OVERRIDES
+    summary["wall_s"] = round(wall, 2)
+    summary["aggregate_fps"] = round(summary["frames"] / wall, 2) if wall else None
+
+    REPORT.parent.mkdir(parents=True, exist_ok=True)
+    REPORT.write_text(json.dumps({"summary": summary, "videos": results}, indent=2, ensure_ascii=False),
+                      encoding="utf-8")
+    with open(REPORT_CSV, "w", newline="", encoding="utf-8") as f:
+        w = csv.writer(f)
+        w.writerow(["video", "frames", "f1", "precision", "recall", "events_matched", "events_missed",
+                    "events_spurious", "mean_event_error_s", "id_switches", "fps"])
+        for r in results:
+            w.writerow([r["video"], r["frames"], r["occupancy"]["f1"], r["occupancy"]["precision"],
+                        r["occupancy"]["recall"], r["events"]["matched"], r["events"]["missed"],
+                        r["events"]["spurious"], r["events"]["mean_abs_error_s"], r["id_switches"],
+                        r.get("throughput", {}).get("fps")])
+
+    print(f"\n📊 F1 occupation={summary['occupancy']['f1']}  erreur evt={summary['mean_event_error_s']} s  "
+          f"ID switches={summary['id_switches']}  débit={summary['aggregate_fps']} frames/s")
+    print(f"🧾 Rapport: {REPORT}")
+    print(f"📊 CSV    : {REPORT_CSV}")
+
+
+if __name__ == "__main__":
+    main()
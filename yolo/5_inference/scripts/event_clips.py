@@ -0,0 +1,156 @@
+import json
+from pathlib import Path
+
+import cv2
+import numpy as np
+
+
+# -----------------------------
+# CLIPS D'ÉVÉNEMENTS
+# -----------------------------
+class EventClipRecorder:
+    """
+    Clips courts + snapshot JPEG autour de chaque événement, au lieu d'encoder toute la vidéo.
+
+    - anneau préalloué des `pre_s` dernières secondes de frames (réduites à `width` px de
+      large si demandé) : au déclenchement, le pré-roll est écrit depuis l'anneau, puis les
+      frames suivantes jusqu'à `post_s` après l'événement ;
+    - un événement qui tombe pendant un clip encore ouvert prolonge ce clip (même fichier)
+      tant que le clip ne dépasse pas `max_s` ;
+    - snapshot : la frame de l'événement en pleine résolution (une par frame, partagée) ;
+    - index `clips.json` écrit à la fermeture (bornes, événements et snapshots de chaque clip).
+
+    Appels par frame : trigger(event, frame_idx) pour chaque événement de la frame (retourne
+    les chemins à lier dans l'enregistrement), puis push(frame_idx, img) avec l'image rendue.
+    """
+
+    def __init__(self, out_dir, fps, w, h, pre_s=3.0, post_s=3.0, max_s=30.0, width=None,
+                 jpeg_quality=85, fourcc="mp4v"):
+        self.dir = Path(out_dir)
+        self.dir.mkdir(parents=True, exist_ok=True)
+        self.fps = fps
+        self.fourcc = cv2.VideoWriter_fourcc(*fourcc)
+        self.jpeg_quality = jpeg_quality
+
+        self.pre_n = int(round(pre_s * fps))
+        self.post_n = int(round(post_s * fps))
+        self.max_n = max(int(round(max_s * fps)), self.pre_n + self.post_n + 1)
+
+        if width and width < w:
+            self.size = (int(width), int(round(h * width / w)) // 2 * 2)
+        else:
+            self.size = (w, h)
+        cw, ch = self.size
+        n_slots = max(1, self.pre_n)
+        self._ring = np.empty((n_slots, ch, cw, 3), dtype=np.uint8)
+        self._ring_frame = np.full(n_slots, -1, dtype=np.int64)
+
+        self.clips = []        # tous les clips (index)
+        self._active = []      # clips en cours d'écriture
+        self._snapshots = {}   # frame_idx -> chemin, snapshots à écrire au prochain push()
+
+        self.frames_seen = 0
+        self.frames_encoded = 0
+
+    @property
+    def nbytes(self):
+        return self._ring.nbytes
+
+    def _open_clip(self, frame_idx):
+        path = self.dir / f"clip_{frame_idx:07d}.mp4"
+        clip = {"path": str(path), "start_frame": frame_idx, "end_frame": frame_idx + self.post_n,
+                "events": [], "snapshots": [],
+                "writer": cv2.VideoWriter(str(path), self.fourcc, self.fps, self.size)}
+        # pré-roll : frames encore présentes dans l'anneau
+        for f in range(max(0, frame_idx - self.pre_n), frame_idx):
+            slot = f % len(self._ring)
+            if self._ring_frame[slot] == f:
+                if clip["start_frame"] == frame_idx:
+                    clip["start_frame"] = f
+                clip["writer"].write(self._ring[slot])
+                self.frames_encoded += 1
+        self.clips.append(clip)
+        self._active.append(clip)
+        return clip
+
+    def trigger(self, event, frame_idx, snapshot_frame=None):
+        """
+        Rattache l'événement à un clip (ouvert ou nouveau) ; retourne {"clip", "snapshot"}.
+        snapshot_frame < frame_idx (départ : dernière frame où le train était vu) : snapshot pris dans
+        l'anneau s'il y est encore (résolution des clips), sinon frame courante.
+        """
+        clip = self._active[-1] if self._active else None
+        if clip is None or frame_idx + self.post_n - clip["start_frame"] >= self.max_n:
+            clip = self._open_clip(frame_idx)
+        else:
+            clip["end_frame"] = max(clip["end_frame"], frame_idx + self.post_n)
+
+        if snapshot_frame is not None and snapshot_frame < frame_idx:
+            slot = snapshot_frame % len(self._ring)
+            if self._ring_frame[slot] == snapshot_frame:
+                snap = str(self.dir / f"snap_{snapshot_frame:07d}.jpg")
+                if snap not in clip["snapshots"]:
+                    cv2.imwrite(snap, self._ring[slot], [cv2.IMWRITE_JPEG_QUALITY, self.jpeg_quality])
+                    clip["snapshots"].append(snap)
+                clip["events"].append({"event": event["event"], "track_id": event["track_id"],
+                                       "from_voie": event["from_voie"], "to_voie": event["to_voie"],
+                                       "frame": frame_idx, "snapshot_frame": snapshot_frame})
+                return {"clip": clip["path"], "snapshot": snap}
+
+        snap = self._snapshots.get(frame_idx)
+        if snap is None:
+            snap = str(self.dir / f"snap_{frame_idx:07d}.jpg")
+            self._snapshots[frame_idx] = snap
+            clip["snapshots"].append(snap)
+        clip["events"].append({"event": event["event"], "track_id": event["track_id"],
+                               "from_voie": event["from_voie"], "to_voie": event["to_voie"],
+                               "frame": frame_idx})
+        return {"clip": clip["path"], "snapshot": snap}
+
+    def push(self, frame_idx, img):
+        """Image rendue de la frame : snapshot si demandé, anneau, clips ouverts."""
+        self.frames_seen += 1
+        snap = self._snapshots.pop(frame_idx, None)
+        if snap is not None:
+            cv2.imwrite(snap, img, [cv2.IMWRITE_JPEG_QUALITY, self.jpeg_quality])
+
+        slot = frame_idx % len(self._ring)
+        if self.size == (img.shape[1], img.shape[0]):
+            np.copyto(self._ring[slot], img)
+        else:
+            cv2.resize(img, self.size, dst=self._ring[slot], interpolation=cv2.INTER_AREA)
+        self._ring_frame[slot] = frame_idx
+
+        for clip in self._active:
+            clip["writer"].write(self._ring[slot])
+            self.frames_encoded += 1
+        done = [c for c in self._active if frame_idx >= c["end_frame"]]
+        for clip in done:
+            self._finish(clip, frame_idx)
+
+    def _finish(self, clip, last_frame):
+        clip["writer"].release()
+        clip["end_frame"] = last_frame
+        self._active.remove(clip)
+
+    def close(self, last_frame):
+        """Fin de vidéo : clips ouverts raccourcis, index écrit."""
+        for clip in list(self._active):
+            self._finish(clip, min(clip["end_frame"], last_frame))
+        index = [{k: v for k, v in c.items() if k != "writer"} for c in self.clips]
+        for c in index:
+            c["start_time_s"] = c["start_frame"] / float(self.fps)
+            c["end_time_s"] = c["end_frame"] / float(self.fps)
+        (self.dir / "clips.json").write_text(
+            json.dumps({"fps": self.fps, "size": list(self.size), "clips": index}, indent=2, ensure_ascii=False),
+            encoding="utf-8")
+
+    def summary(self):
+        return {
+            "clips": len(self.clips),
+            "events": sum(len(c["events"]) for c in self.clips),
+            "frames_seen": self.frames_seen,
+            "frames_encoded": self.frames_encoded,
+            "encoded_ratio": self.frames_encoded / self.frames_seen if self.frames_seen else 0.0,
+            "ring_mb": self.nbytes / 1e6,
+        }
@@ -0,0 +1,91 @@
+import os
+import uuid
+from multiprocessing import shared_memory
+
+import numpy as np
+
+
+# -----------------------------
+# ANNEAU DE FRAMES EN MÉMOIRE PARTAGÉE
+# -----------------------------
+class FrameRing:
+    """
+    Slots préalloués en mémoire partagée, passés entre processus par leur index :
+      - frames[slot]  : frame décodée (h, w, 3) uint8 (écrite par le décodeur)
+      - mask_bin[slot]: masque rails binaire (h, w) uint8 (écrit par un worker rails)
+      - cc[slot]      : labels des composantes connexes (h, w) int32 (idem)
+      - seq[slot]     : numéro de frame occupant le slot, -1 si libre
+      - rail_mask[slot], rail_mask_hw[slot] : masque rails quantifié du cache de détections
+        (résolution modèle, au plus mask_size x mask_size), et sa taille (0, 0 = aucun)
+    Aucune frame n'est copiée dans les queues : seuls (seq, slot) et les petits
+    résultats (boîtes, liste des rails) y transitent. Le propriétaire (create=True)
+    crée les segments et les libère avec unlink() ; les workers s'y rattachent
+    avec FrameRing.attach(ring.spec()).
+    """
+
+    FIELDS = {
+        "frames": (np.uint8, 3),
+        "mask_bin": (np.uint8, None),
+        "cc": (np.int32, None),
+        "seq": (np.int64, 0),
+        "rail_mask": (np.uint8, "mask"),
+        "rail_mask_hw": (np.int32, "pair"),
+    }
+
+    def __init__(self, n_slots, h, w, prefix=None, create=True, mask_size=0):
+        self.n_slots, self.h, self.w = n_slots, h, w
+        self.mask_size = mask_size
+        self.create = create
+        self.prefix = prefix or f"yard_{os.getpid()}_{uuid.uuid4().hex[:8]}"
+        self._shm = {}
+        for name, (dtype, ch) in self.FIELDS.items():
+            shape = self._shape(ch)
+            nbytes = int(np.prod(shape)) * np.dtype(dtype).itemsize
+            shm_name = f"{self.prefix}_{name}"
+            if create:
+                shm = shared_memory.SharedMemory(name=shm_name, create=True, size=max(1, nbytes))
+            else:
+                shm = shared_memory.SharedMemory(name=shm_name)
+            self._shm[name] = shm
+            setattr(self, name, np.ndarray(shape, dtype=dtype, buffer=shm.buf))
+        if create:
+            self.seq[:] = -1
+
+    def _shape(self, ch):
+        if ch == 0:
+            return (self.n_slots,)
+        if ch == "mask":
+            return (self.n_slots, self.mask_size, self.mask_size)
+        if ch == "pair":
+            return (self.n_slots, 2)
+        if ch is None:
+            return (self.n_slots, self.h, self.w)
+        return (self.n_slots, self.h, self.w, ch)
+
+    def spec(self):
+        """Ce qu'il faut passer à un processus fils pour se rattacher à l'anneau."""
+        return {"n_slots": self.n_slots, "h": self.h, "w": self.w, "prefix": self.prefix,
+                "mask_size": self.mask_size}
+
+    @classmethod
+    def attach(cls, spec):
+        return cls(spec["n_slots"], spec["h"], spec["w"], prefix=spec["prefix"], create=False,
+                   mask_size=spec["mask_size"])
+
+    @property
+    def nbytes(self):
+        return sum(shm.size for shm in self._shm.values())
+
+    def close(self):
+        # les vues numpy doivent disparaître avant de fermer les segments
+        for name in self.FIELDS:
+            setattr(self, name, None)
+        for shm in self._shm.values():
+            shm.close()
+
+    def unlink(self):
+        self.close()
+        if self.create:
+            for shm in self._shm.values():
+                shm.unlink()
+
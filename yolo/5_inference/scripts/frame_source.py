@@ -0,0 +1,245 @@
+import atexit
+import queue
+import shutil
+import subprocess
+import threading
+
+import cv2
+import numpy as np
+
+import yard_metrics as metrics
+
+
+# -----------------------------
+# PAQUET DE FRAME
+# -----------------------------
+class FramePacket:
+    """
+    Une frame décodée et ses variantes, produites ensemble par le thread de décodage :
+      - frame : pleine résolution BGR (overlay, vidéo de sortie)
+      - small[imgsz] : frame réduite à la géométrie du letterbox Ultralytics pour imgsz
+        (côté long = imgsz, cv2.INTER_LINEAR comme LetterBox) ; le modèle ne la redimensionne plus
+      - gray : niveaux de gris réduits à `gray_width` (motion gate), sinon None
+      - roi : vue de `frame` sur la ROI (x0, y0, x1, y1), sinon None
+    """
+
+    __slots__ = ("idx", "frame", "small", "gray", "roi")
+
+    def __init__(self, idx, frame, small, gray, roi):
+        self.idx = idx
+        self.frame = frame
+        self.small = small
+        self.gray = gray
+        self.roi = roi
+
+    def model_input(self, imgsz):
+        """Image à donner au modèle : la version réduite si elle existe, sinon pleine résolution."""
+        return self.small.get(imgsz, self.frame)
+
+    def to_full(self, xyxy, imgsz):
+        """Boîtes xyxy dans le repère de model_input(imgsz) -> repère pleine résolution."""
+        small = self.small.get(imgsz)
+        if small is None or len(xyxy) == 0:
+            return xyxy
+        sx = self.frame.shape[1] / small.shape[1]
+        sy = self.frame.shape[0] / small.shape[0]
+        return xyxy * np.array([sx, sy, sx, sy], dtype=xyxy.dtype)
+
+
+def letterbox_size(w, h, imgsz):
+    # même calcul que ultralytics.data.augment.LetterBox (scaleup autorisé)
+    r = min(imgsz / h, imgsz / w)
+    return int(round(w * r)), int(round(h * r))
+
+
+def make_packet(idx, frame, prescale=(), gray_width=None, roi=None):
+    """
+    FramePacket d'une frame déjà décodée. Utilisé par FrameSource et par les workers
+    de infer_pipeline_mp.py (frame lue dans un slot de l'anneau) : mêmes réductions.
+    """
+    h, w = frame.shape[:2]
+    small = {}
+    for s in prescale:
+        wh = letterbox_size(w, h, s)
+        if wh != (w, h):
+            small[s] = cv2.resize(frame, wh, interpolation=cv2.INTER_LINEAR)
+    gray = None
+    if gray_width:
+        # même réduction que MotionGate._small (resize puis niveaux de gris)
+        gh = max(1, round(h * gray_width / w))
+        gray = cv2.cvtColor(cv2.resize(frame, (gray_width, gh), interpolation=cv2.INTER_AREA), cv2.COLOR_BGR2GRAY)
+    if roi is not None:
+        x0, y0, x1, y1 = roi
+        roi = frame[y0:y1, x0:x1]
+    return FramePacket(idx, frame, small, gray, roi)
+
+
+# -----------------------------
+# SOURCE
+# -----------------------------
+class FrameSource:
+    """
+    Lecture vidéo dans un thread, `prefetch` frames d'avance sur l'inférence.
+
+    Backends (tous locaux) :
+      - "pyav"   : PyAV (libav, décodage multi-thread), si `av` est installé
+      - "ffmpeg" : binaire ffmpeg en pipe rawvideo bgr24, s'il est dans le PATH
+      - "cv2"    : cv2.VideoCapture (toujours disponible)
+      - "auto"   : le premier disponible dans cet ordre
+    Les métadonnées (fps, w, h) viennent de cv2.VideoCapture pour tous les backends.
+
+    `stride` > 1 : une frame sur `stride` seulement (pkt.idx reste l'index dans la vidéo) ;
+    les autres sont décodées sans conversion BGR (cv2 : grab(), pyav : frame ignorée,
+    ffmpeg : filtre select).
+    cv2 : une frame illisible au milieu du fichier est sautée (dropped, dropped_frames_total) ;
+    pkt.idx garde l'index dans la vidéo (trou dans la numérotation, time_s = idx / fps reste juste).
+
+        src = FrameSource(path, prescale=[640])
+        while (pkt := src.read()) is not None:
+            model.predict(pkt.model_input(640), imgsz=640)
+    """
+
+    MAX_READ_FAILURES = 25   # échecs de lecture consécutifs avant de considérer le flux terminé
+
+    def __init__(self, path, backend="auto", prescale=(), gray_width=None, roi=None, prefetch=8, stride=1):
+        self.path = str(path)
+        self.stride = max(1, int(stride))
+        self.prescale = sorted(set(prescale or ()))
+        self.gray_width = gray_width
+        self.roi = roi
+        self.prefetch = prefetch
+
+        probe = cv2.VideoCapture(self.path)
+        if not probe.isOpened():
+            raise RuntimeError(f"Impossible d'ouvrir la vidéo: {self.path}")
+        self.fps = probe.get(cv2.CAP_PROP_FPS) or 25.0
+        self.w = int(probe.get(cv2.CAP_PROP_FRAME_WIDTH))
+        self.h = int(probe.get(cv2.CAP_PROP_FRAME_HEIGHT))
+        self.n_frames = int(probe.get(cv2.CAP_PROP_FRAME_COUNT))
+        probe.release()
+        self.dropped = 0        # frames illisibles sautées (backend cv2)
+        self.dropped_run = 0
+
+        self.backend = self._pick_backend(backend)
+        self._queue = queue.Queue(maxsize=max(1, prefetch))
+        self._stop = threading.Event()
+        self._proc = None
+        self._thread = threading.Thread(target=self._run, name="frame_source", daemon=True)
+        self._thread.start()
+        # arrêt propre du thread si le script s'interrompt sur une exception
+        atexit.register(self.release)
+
+    @staticmethod
+    def _pick_backend(backend):
+        if backend != "auto":
+            return backend
+        try:
+            import av  # noqa: F401
+            return "pyav"
+        except ImportError:
+            pass
+        if shutil.which("ffmpeg"):
+            return "ffmpeg"
+        return "cv2"
+
+    # -- décodage --
+    def _frames_cv2(self):
+        cap = cv2.VideoCapture(self.path)
+        try:
+            idx = 0
+            while not self._stop.is_set():
+                if idx % self.stride:
+                    if not cap.grab():
+                        return
+                    idx += 1
+                    continue
+                ret, frame = cap.read()
+                if not ret:
+                    # frame illisible avant la fin annoncée (fichier abîmé) : sautée, son index consommé
+                    # (timeline et échantillonnage par stride inchangés) ; fin après MAX_READ_FAILURES de suite
+                    if (self.dropped_run >= self.MAX_READ_FAILURES
+                            or cap.get(cv2.CAP_PROP_POS_FRAMES) >= self.n_frames):
+                        return
+                    self.dropped_run += 1
+                    idx += 1
+                    continue
+                if self.dropped_run:
+                    # comptées seulement si la lecture reprend (pas un nombre de frames surestimé en fin de fichier)
+                    self.dropped += self.dropped_run
+                    metrics.inc("dropped_frames_total", self.dropped_run, reason="read_failure")
+                    self.dropped_run = 0
+                yield idx, frame
+                idx += 1
+        finally:
+            cap.release()
+
+    def _frames_pyav(self):
+        import av
+        with av.open(self.path) as container:
+            stream = container.streams.video[0]
+            stream.thread_type = "AUTO"
+            for idx, f in enumerate(container.decode(stream)):
+                if self._stop.is_set():
+                    return
+                if idx % self.stride == 0:
+                    yield idx, f.to_ndarray(format="bgr24")
+
+    def _frames_ffmpeg(self):
+        cmd = ["ffmpeg", "-loglevel", "error", "-i", self.path, "-vsync", "passthrough"]
+        if self.stride > 1:
+            cmd += ["-vf", f"select=not(mod(n\\,{self.stride}))"]
+        cmd += ["-f", "rawvideo", "-pix_fmt", "bgr24", "-"]
+        self._proc = subprocess.Popen(cmd, stdout=subprocess.PIPE, bufsize=self.w * self.h * 3)
+        size = self.w * self.h * 3
+        try:
+            idx = 0
+            while not self._stop.is_set():
+                buf = self._proc.stdout.read(size)
+                if len(buf) < size:
+                    return
+                yield idx, np.frombuffer(buf, dtype=np.uint8).reshape(self.h, self.w, 3)
+                idx += self.stride
+        finally:
+            self._proc.stdout.close()
+            self._proc.wait()
+
+    def _packet(self, idx, frame):
+        return make_packet(idx, frame, self.prescale, self.gray_width, self.roi)
+
+    def _run(self):
+        frames = {"cv2": self._frames_cv2, "pyav": self._frames_pyav, "ffmpeg": self._frames_ffmpeg}[self.backend]
+        try:
+            for idx, frame in frames():
+                self._put(self._packet(idx, frame))
+            self._put(None)
+        except Exception as e:  # remonté au thread principal par read()
+            self._put(e)
+
+    def _put(self, item):
+        while not self._stop.is_set():
+            try:
+                self._queue.put(item, timeout=0.1)
+                metrics.set_gauge("queue_depth", self._queue.qsize(), queue="frame_source")
+                return
+            except queue.Full:
+                continue
+
+    # -- API --
+    def read(self):
+        """FramePacket suivant, ou None en fin de vidéo."""
+        item = self._queue.get()
+        if isinstance(item, Exception):
+            raise item
+        if item is None:
+            self._queue.put(None)  # read() après la fin renvoie toujours None
+        return item
+
+    def __iter__(self):
+        while (pkt := self.read()) is not None:
+            yield pkt
+
+    def release(self):
+        self._stop.set()
+        if self._proc is not None and self._proc.poll() is None:
+            self._proc.kill()
+        self._thread.join(timeout=5)
@@ -0,0 +1,257 @@
+import heapq
+import json
+from pathlib import Path
+
+import infer_trains_and_rails_with_history as pipeline
+from yard_aggregates import YardAggregator
+
+
+# -----------------------------
+# CONFIG
+# -----------------------------
+# Une entrée par caméra : JSONL par frame du pipeline (trains_rails_per_frame.jsonl, segments acceptés),
+# décalage de sa frame 0 sur l'horloge commune, voies locales (rangs gauche->droite) -> voies du triage.
+CAMERAS = {
+    "cam_ouest": {
+        "frames": r"7_outputs/cameras/cam_ouest/trains_rails_per_frame.jsonl",
+        "start_time": 0.0,      # s : instant de la frame 0 sur l'horloge commune
+        "weight": 1.0,          # fiabilité relative de la caméra dans les conflits
+        "voies": {"voie1": "voie1", "voie2": "voie2", "voie3": "voie3",
+                  "voie4": "voie4", "voie5": "voie5", "voie6": "voie6"},
+    },
+    "cam_est": {
+        "frames": r"7_outputs/cameras/cam_est/trains_rails_per_frame.jsonl",
+        "start_time": 0.0,
+        "weight": 1.0,
+        "voies": {"voie1": "voie5", "voie2": "voie6", "voie3": "voie7", "voie4": "voie8"},
+    },
+}
+
+FUSION_FPS = 10.0       # état fusionné échantillonné à cette cadence (frames des sorties fusionnées)
+STALE_S = 1.0           # observation d'une caméra plus vieille que ça : ignorée (caméra coupée, retard)
+EMPTY_CONF = 0.5        # confiance d'une voie vue vide, face à la conf du meilleur train vu dessus
+HANDOVER_S = 5.0        # un nouveau train sur une voie reprend l'ID d'un train vu dessus par une autre caméra
+
+OUT_DIR = Path("7_outputs/yard_fusion")   # mêmes fichiers que le pipeline (JSONL/CSV par frame et événements)
+YARD_STATE = False      # agrégats du dashboard (yard_aggregates.py) sur les voies du triage
+YARD_START_TIME = None  # epoch de l'instant 0 de l'horloge commune (None = heure de lancement)
+
+
+# -----------------------------
+# LECTURE
+# -----------------------------
+def iter_records(path):
+    """JSONL ligne à ligne ; flux segmenté (ROTATE_MB / ROTATE_HOURLY) lu dans l'ordre de l'index."""
+    path = Path(path)
+    index = path.with_name(f"{path.name}.segments.json")
+    paths = [Path(s["path"]) for s in json.loads(index.read_text(encoding="utf-8"))["segments"]] \
+        if index.exists() else [path]
+    for p in paths:
+        with open(p, encoding="utf-8") as f:
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+
+
+def camera_stream(name, cfg):
+    """(instant commun, caméra, record) ; frames déjà dans l'ordre du temps dans chaque flux."""
+    offset = float(cfg.get("start_time", 0.0))
+    for rec in iter_records(cfg["frames"]):
+        yield offset + rec["time_s"], name, rec
+
+
+def voie_order(v):
+    return (len(v), v)   # voie2 avant voie10
+
+
+# -----------------------------
+# FUSION
+# -----------------------------
+class YardFusion:
+    """
+    État d'occupation du triage à partir de plusieurs caméras :
+      - chaque frame d'une caméra remplace, pour les voies du triage qu'elle voit, sa dernière
+        observation : trains (ID global, conf) ou voie vide ;
+      - conflit (voie vue par plusieurs caméras) : l'observation de moins de `stale_s` au meilleur
+        score gagne ; score = conf du meilleur train (ou `empty_conf` si vide) x poids de la caméra ;
+      - IDs globaux : un (caméra, track_id) reçoit à sa première apparition l'ID d'un train vu sur la
+        même voie depuis moins de `handover_s` et pas encore suivi par cette caméra (passage de relais
+        entre champs de vue), sinon un nouvel ID.
+    update() coûte O(trains + voies de la caméra) ; snapshot() O(voies x caméras par voie).
+    """
+
+    def __init__(self, cameras, stale_s=1.0, empty_conf=0.5, handover_s=5.0):
+        self.cameras = cameras
+        self.stale_s = stale_s
+        self.empty_conf = empty_conf
+        self.handover_s = handover_s
+        self.voies = sorted({v for c in cameras.values() for v in c["voies"].values()}, key=voie_order)
+
+        self.obs = {v: {} for v in self.voies}        # voie -> caméra -> (t, score, [train])
+        self.recent = {v: {} for v in self.voies}     # voie -> ID global -> dernier instant vu
+        self.links = {}                               # (caméra, track_id local) -> ID global
+        self.gid_cameras = {}                         # ID global -> caméras qui le suivent
+        self._next_gid = 1
+        self.stats = {"updates": 0, "handovers": 0, "conflicts": 0, "voie_conflicts": 0}
+
+    def _global_id(self, cam, tid, voie, t):
+        key = (cam, tid)
+        gid = self.links.get(key)
+        if gid is not None:
+            return gid
+        best = None
+        for g, seen in self.recent[voie].items():
+            if t - seen <= self.handover_s and cam not in self.gid_cameras[g] and (best is None or seen > best[1]):
+                best = (g, seen)
+        if best is not None:
+            gid = best[0]
+            self.stats["handovers"] += 1
+        else:
+            gid = self._next_gid
+            self._next_gid += 1
+            self.gid_cameras[gid] = set()
+        self.links[key] = gid
+        self.gid_cameras[gid].add(cam)
+        return gid
+
+    def update(self, t, cam, rec):
+        """Frame `rec` (JSONL du pipeline) de la caméra `cam` à l'instant commun `t`."""
+        cfg = self.cameras[cam]
+        mapping = cfg["voies"]
+        weight = cfg.get("weight", 1.0)
+        per_voie = {v: [] for v in mapping.values()}
+        for tr in rec["trains"]:
+            voie = mapping.get(tr["voie"])
+            if voie is None or tr["track_id"] is None:     # hors voie, ou voie hors du triage
+                continue
+            gid = self._global_id(cam, tr["track_id"], voie, t)
+            per_voie[voie].append({"track_id": gid, "voie": voie, "conf": tr["conf"],
+                                   "camera": cam, "local_track_id": tr["track_id"]})
+            self.recent[voie][gid] = t
+        for voie, trains in per_voie.items():
+            score = (max(tr["conf"] for tr in trains) if trains else self.empty_conf) * weight
+            self.obs[voie][cam] = (t, score, trains)
+        self.stats["updates"] += 1
+
+    def snapshot(self, now):
+        """(trains fusionnés, occupation voie -> [ID global], caméra retenue par voie) à l'instant `now`."""
+        chosen = {}
+        for voie in self.voies:
+            best = None
+            fresh = 0
+            for cam, (t, score, trains) in self.obs[voie].items():
+                if now - t > self.stale_s:
+                    continue
+                fresh += 1
+                if best is None or score > best[1]:
+                    best = (cam, score, trains)
+            if fresh > 1:
+                self.stats["conflicts"] += 1
+            if best is not None:
+                chosen[voie] = best
+
+        # un ID global sur deux voies (caméras en désaccord) : gardé sur la voie au meilleur score
+        where = {}
+        for voie, (cam, score, trains) in chosen.items():
+            for tr in trains:
+                prev = where.get(tr["track_id"])
+                if prev is None or score > prev[1]:
+                    where[tr["track_id"]] = (voie, score)
+                if prev is not None:
+                    self.stats["voie_conflicts"] += 1
+
+        trains_out = []
+        occupancy_map = {v: [] for v in self.voies}
+        sources = {}
+        for voie, (cam, score, trains) in chosen.items():
+            sources[voie] = cam
+            for tr in trains:
+                if where[tr["track_id"]][0] == voie:
+                    trains_out.append(tr)
+                    occupancy_map[voie].append(tr["track_id"])
+        return trains_out, occupancy_map, sources
+
+    def forget(self, now):
+        """Purge des instants de passage de relais trop anciens (appelée à chaque frame fusionnée)."""
+        for seen in self.recent.values():
+            for g in [g for g, t in seen.items() if now - t > self.handover_s]:
+                del seen[g]
+
+    def summary(self):
+        return {"global_ids": self._next_gid - 1, **self.stats}
+
+
+# -----------------------------
+# SORTIES (formats du pipeline)
+# -----------------------------
+def redirect_outputs(out_dir: Path):
+    for name in dir(pipeline):
+        if name.startswith("OUT_") and isinstance(getattr(pipeline, name), str):
+            setattr(pipeline, name, str(out_dir / Path(getattr(pipeline, name)).name))
+
+
+# -----------------------------
+# MAIN
+# -----------------------------
+def main():
+    for name, cfg in CAMERAS.items():
+        p = Path(cfg["frames"])
+        if not p.exists() and not p.with_name(f"{p.name}.segments.json").exists():
+            raise SystemExit(f"\n❌ Flux introuvable pour {name}: {p}\n")
+
+    fusion = YardFusion(CAMERAS, stale_s=STALE_S, empty_conf=EMPTY_CONF, handover_s=HANDOVER_S)
+    print(f"📷 {len(CAMERAS)} caméras -> {len(fusion.voies)} voies du triage: {', '.join(fusion.voies)}")
+
+    redirect_outputs(OUT_DIR)
+    out, frames_out, events_out, frames_csv, events_csv = pipeline.open_writers()
+    yard = None
+    if YARD_STATE:
+        yard = YardAggregator(fusion.voies, OUT_DIR / "yard_state.json", start_time=YARD_START_TIME,
+                              parked_after_s=pipeline.PARKED_AFTER_S, maintenance_voies=pipeline.MAINTENANCE_VOIES)
+
+    t0 = min(float(c.get("start_time", 0.0)) for c in CAMERAS.values())
+    last_voie, event_start_frame, presence = {}, {}, {}
+    frame_idx = 0
+
+    def emit(now):
+        trains, occupancy_map, sources = fusion.snapshot(now)
+        t_s = frame_idx / FUSION_FPS
+        if yard is not None:
+            yard.update(t_s, trains, occupancy_map)
+        pipeline.write_frame_rows(frames_csv, frame_idx, t_s, occupancy_map)
+        frames_out.put({"frame": frame_idx, "time_s": t_s, "sources": sources,
+                        "trains": trains, "occupancy": occupancy_map})
+        for event in pipeline.update_events(trains, frame_idx, FUSION_FPS, last_voie, event_start_frame, presence):
+            pipeline.write_event(event, events_out, events_csv)
+        fusion.forget(now)
+
+    # flux fusionnés par instant commun ; l'état est échantillonné à chaque pas de FUSION_FPS
+    streams = [camera_stream(name, cfg) for name, cfg in CAMERAS.items()]
+    for t, cam, rec in heapq.merge(*streams, key=lambda item: item[0]):
+        while t0 + frame_idx / FUSION_FPS < t:
+            emit(t0 + frame_idx / FUSION_FPS)
+            frame_idx += 1
+        fusion.update(t, cam, rec)
+    emit(t0 + frame_idx / FUSION_FPS)
+    frame_idx += 1
+
+    for event in pipeline.close_events(last_voie, event_start_frame, frame_idx - 1, FUSION_FPS):
+        pipeline.write_event(event, events_out, events_csv)
+    out.close()
+    if yard is not None:
+        yard.close()
+
+    s = fusion.summary()
+    print(f"🔀 Fusion: {s['updates']} frames caméra -> {frame_idx} frames triage ({FUSION_FPS:g}/s), "
+          f"{s['global_ids']} IDs globaux, {s['handovers']} passages de relais, "
+          f"{s['conflicts']} arbitrages de voie, {s['voie_conflicts']} désaccords de voie")
+    print("🧾 Frames JSONL:", pipeline.OUT_JSONL_FRAMES)
+    print("📊 Frames CSV  :", pipeline.OUT_CSV_FRAMES)
+    print("🧾 Events JSONL:", pipeline.OUT_JSONL_EVENTS)
+    print("📊 Events CSV  :", pipeline.OUT_CSV_EVENTS)
+    if yard is not None:
+        print("🏗️ État du triage:", OUT_DIR / "yard_state.json")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,115 @@
+import json
+import multiprocessing as mp
+import platform
+import shutil
+import time
+from pathlib import Path
+
+import infer_trains_and_rails_with_history as pipeline
+
+
+# -----------------------------
+# CONFIG
+# -----------------------------
+# Lancement à démarrage rapide du pipeline infer_trains_and_rails_with_history.py (mêmes sorties) :
+# deux modèles ONNX exécutés avec ONNX Runtime, tracker "rail" -> ni torch ni ultralytics importés.
+# Export du détecteur : yolo export model=runs/detect/train5/weights/best.pt format=onnx
+TRAINS_MODEL = r"runs/detect/train5/weights/best.onnx"
+RAILS_MODEL = None          # None = celui du pipeline (déjà en .onnx)
+
+FAST_CONFIG = {
+    "TRACKER": "rail",
+    "ONNX_RUNTIME": True,
+    "WARMUP": True,
+    "CASCADE": False,
+    "TILED": False,
+    "PRESCALE": True,       # sans track() Ultralytics : même image pour predict(), boîtes ramenées par to_full()
+}
+
+TARGET_S = 0.5              # objectif de temps jusqu'au premier résultat (lancement -> 1re frame écrite)
+REPORT = Path("6_evaluation/reports/cold_start.json")
+
+# Benchmark : BENCH_RUNS lancements, chacun dans un processus neuf, sur l'échantillon de
+# benchmark_inference.py ; cache ORT vidé avant le premier (démarrage à froid), réutilisé ensuite
+BENCH = False
+BENCH_RUNS = 3
+BENCH_OUT = Path("7_outputs/fast_start_bench")
+
+
+# -----------------------------
+# LANCEMENT
+# -----------------------------
+def configure():
+    for k, v in FAST_CONFIG.items():
+        setattr(pipeline, k, v)
+    pipeline.TRAINS_MODEL = TRAINS_MODEL
+    if RAILS_MODEL is not None:
+        pipeline.RAILS_MODEL = RAILS_MODEL
+    for name in ("TRAINS_MODEL", "RAILS_MODEL"):
+        path = Path(getattr(pipeline, name))
+        if path.suffix != ".onnx":
+            raise SystemExit(f"\n❌ {name} doit être un export ONNX pour un démarrage sans torch: {path}\n")
+        if not path.exists():
+            raise SystemExit(f"\n❌ Modèle introuvable: {path}\n")
+
+
+def run_child(sample, out_dir, cache_dir):
+    """Un lancement du benchmark (processus spawn neuf) : rapport de démarrage de main()."""
+    from benchmark_inference import redirect_outputs
+
+    configure()
+    pipeline.SOURCE_VIDEO = sample
+    pipeline.ORT_CACHE_DIR = cache_dir
+    redirect_outputs(pipeline, Path(out_dir))
+    return pipeline.main()
+
+
+def bench():
+    from benchmark_inference import SAMPLE_VIDEO, make_synthetic_video
+
+    sample = Path(SAMPLE_VIDEO)
+    if not sample.exists():
+        print(f"🎞️ Échantillon absent, génération synthétique: {sample}")
+        make_synthetic_video(sample)
+    cache_dir = BENCH_OUT / "ort_cache"
+    shutil.rmtree(cache_dir, ignore_errors=True)
+
+    runs = []
+    ctx = mp.get_context("spawn")
+    for i in range(BENCH_RUNS):
+        with ctx.Pool(1) as pool:
+            res = pool.apply(run_child, (str(sample), str(BENCH_OUT / "outputs"), str(cache_dir)))
+        res["run"] = "froid" if i == 0 else "cache"
+        runs.append(res)
+        print(f"▶️ run {i + 1} ({res['run']}): premier résultat {res['time_to_first_result_s']:.3f} s")
+    return {"sample": str(sample), "runs": runs}
+
+
+def main():
+    if BENCH:
+        report = bench()
+        ttfr = min(r["time_to_first_result_s"] for r in report["runs"][1:] or report["runs"])
+    else:
+        configure()
+        report = pipeline.main()
+        if report is None:
+            raise SystemExit("\n❌ Aucune frame lue\n")
+        ttfr = report["time_to_first_result_s"]
+
+    import onnxruntime as ort
+
+    report.update({
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "target_s": TARGET_S,
+        "env": {"python": platform.python_version(), "platform": platform.platform(),
+                "onnxruntime": ort.__version__},
+    })
+    REPORT.parent.mkdir(parents=True, exist_ok=True)
+    REPORT.write_text(json.dumps(report, indent=2, ensure_ascii=False), encoding="utf-8")
+    status = "✅" if ttfr <= TARGET_S else "⚠️"
+    print(f"{status} Premier résultat: {ttfr:.3f} s (objectif {TARGET_S} s)")
+    print(f"🧾 Rapport: {REPORT}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,379 @@
+import hashlib
+import json
+import multiprocessing as mp
+import os
+import platform
+import queue
+import time
+from pathlib import Path
+
+import cv2
+
+import infer_trains_and_rails_with_history as pipeline
+import yard_metrics as metrics
+from detection_cache import quantize_mask
+from frame_ring import FrameRing
+from frame_source import FrameSource, make_packet
+
+
+# -----------------------------
+# CONFIG
+# -----------------------------
+# Modèles, vidéo source, seuils et sorties : ceux de infer_trains_and_rails_with_history.py
+RAILS_WORKERS = 2          # processus de segmentation rails (sans état -> parallélisables)
+RING_SLOTS = 16            # slots préalloués ; borne la mémoire et l'avance du décodeur
+THREADS_PER_WORKER = 1     # torch/ONNX Runtime/OpenCV par processus (les mêmes pour tous les modes comparés)
+WORKER_TIMEOUT_S = 120     # pas de résultat pendant ce temps -> on vérifie que les workers vivent
+
+# Benchmark de scaling (BENCH = True) : référence mono-processus puis RAILS_WORKERS variable,
+# sorties comparées octet par octet (sha256) à la référence
+BENCH = False
+BENCH_WORKERS = [1, 2, 3, 4]
+BENCH_OUT = Path("7_outputs/pipeline_bench")
+BENCH_REPORT = Path("6_evaluation/reports/pipeline_scaling.json")
+
+# Constantes du pipeline transmises aux processus fils (spawn : modules réimportés)
+PIPELINE_KEYS = [
+    "TRAINS_MODEL", "RAILS_MODEL", "SOURCE_VIDEO", "DECODER", "PREFETCH", "PRESCALE",
+    "IMGSZ_TRAINS", "IMGSZ_RAILS", "CONF_TRAINS", "IOU_TRAINS", "CONF_RAILS", "TRACKER",
+    "EXPECTED_RAILS", "MIN_AREA_RAIL", "MASK_THRESH", "POINT_OFFSET_PX",
+    "ONNX_RUNTIME", "ORT_CACHE_DIR", "SAVE_DET_CACHE",
+]
+# Options du pipeline mono-processus non reprises ici : main() refuse de tourner si elles sont actives
+UNSUPPORTED_KEYS = ["MOTION_GATE", "CASCADE", "TILED"]
+
+
+# -----------------------------
+# PROCESSUS
+# -----------------------------
+def onnx_only():
+    """Les deux modèles passent par ONNX Runtime (load_model) : aucun processus n'a besoin de torch."""
+    return (pipeline.ONNX_RUNTIME and pipeline.TRACKER == "rail"
+            and Path(pipeline.RAILS_MODEL).suffix == ".onnx" and Path(pipeline.TRAINS_MODEL).suffix == ".onnx")
+
+
+def init_process(cfg):
+    os.environ["OMP_NUM_THREADS"] = str(THREADS_PER_WORKER)
+    cv2.setNumThreads(THREADS_PER_WORKER)
+    for k, v in cfg.items():
+        setattr(pipeline, k, v)
+    pipeline.ORT_THREADS = THREADS_PER_WORKER
+    if not onnx_only():
+        try:
+            import torch
+            torch.set_num_threads(THREADS_PER_WORKER)
+        except ImportError:
+            pass
+
+
+def decoder_proc(cfg, spec, free_slots, q_rails, q_track, n_rails):
+    """Lit la vidéo dans les slots libres ; bloque quand l'anneau est plein (backpressure)."""
+    init_process(cfg)
+    ring = FrameRing.attach(spec)
+    src = FrameSource(pipeline.SOURCE_VIDEO, backend=pipeline.DECODER, prefetch=pipeline.PREFETCH)
+    for pkt in src:
+        slot = free_slots.get()
+        ring.frames[slot] = pkt.frame
+        ring.seq[slot] = pkt.idx
+        q_rails.put((pkt.idx, slot))
+        q_track.put((pkt.idx, slot))
+    src.release()
+    for _ in range(n_rails):
+        q_rails.put(None)
+    q_track.put(None)
+    ring.close()
+
+
+def rails_proc(cfg, spec, q_rails, q_post):
+    """Segmentation rails + union + composantes, écrites dans le slot (ordre quelconque)."""
+    init_process(cfg)
+    ring = FrameRing.attach(spec)
+    model = pipeline.load_model(pipeline.RAILS_MODEL)
+    while True:
+        item = q_rails.get()
+        if item is None:
+            break
+        frame_idx, slot = item
+        pkt = make_packet(frame_idx, ring.frames[slot], [pipeline.IMGSZ_RAILS] if pipeline.PRESCALE else [])
+        rr = model.predict(pkt.model_input(pipeline.IMGSZ_RAILS), imgsz=pipeline.IMGSZ_RAILS, conf=pipeline.CONF_RAILS, verbose=False)[0]
+        masks = pipeline.rail_masks_from_result(rr)
+        mask_bin = pipeline.union_rail_masks(masks if masks is not None else [], ring.w, ring.h,
+                                             out=ring.mask_bin[slot])
+        rails_list, cc_labels = pipeline.connected_components_rails(
+            mask_bin, expected=pipeline.EXPECTED_RAILS, min_area=pipeline.MIN_AREA_RAIL)
+        ring.cc[slot] = cc_labels
+        # masque du cache de détections écrit dans le slot : seule la liste des rails passe par la file
+        mh = mw = 0
+        if pipeline.SAVE_DET_CACHE and masks is not None and len(masks):
+            q = quantize_mask(masks)
+            mh, mw = q.shape
+            if mh > ring.mask_size or mw > ring.mask_size:
+                raise ValueError(f"Masque rails {mh}x{mw} plus grand que l'anneau ({ring.mask_size})")
+            ring.rail_mask[slot, :mh, :mw] = q
+        ring.rail_mask_hw[slot] = (mh, mw)
+        q_post.put(("rails", frame_idx, rails_list, None))
+    q_post.put(("done", None, None, None))
+    ring.close()
+
+
+def tracker_proc(cfg, spec, q_track, q_post):
+    """Détection + suivi : un seul processus, frames dans l'ordre (le tracker a un état)."""
+    init_process(cfg)
+    ring = FrameRing.attach(spec)
+    model = pipeline.load_model(pipeline.TRAINS_MODEL, track=pipeline.TRACKER != "rail")
+    while True:
+        item = q_track.get()
+        if item is None:
+            break
+        frame_idx, slot = item
+        pkt = make_packet(frame_idx, ring.frames[slot], [pipeline.IMGSZ_TRAINS] if pipeline.PRESCALE else [])
+        if pipeline.TRACKER == "rail":
+            # suivi le long des voies fait dans le processus principal (il a besoin des rails)
+            tr = model.predict(pkt.model_input(pipeline.IMGSZ_TRAINS), imgsz=pipeline.IMGSZ_TRAINS,
+                               conf=pipeline.CONF_TRAINS, iou=pipeline.IOU_TRAINS, verbose=False)[0]
+        else:
+            tr = model.track(
+                pkt.model_input(pipeline.IMGSZ_TRAINS),
+                imgsz=pipeline.IMGSZ_TRAINS,
+                conf=pipeline.CONF_TRAINS,
+                iou=pipeline.IOU_TRAINS,
+                tracker=pipeline.TRACKER,
+                persist=True,
+                verbose=False
+            )[0]
+        xyxy, confs, track_ids = pipeline.boxes_from_result(tr)
+        q_post.put(("track", frame_idx, (pkt.to_full(xyxy, pipeline.IMGSZ_TRAINS), confs, track_ids), None))
+    q_post.put(("done", None, None, None))
+    ring.close()
+
+
+def report_queue_depths(queues):
+    if not metrics.ENABLED:
+        return
+    for name, q in queues.items():
+        try:
+            metrics.set_gauge("queue_depth", q.qsize(), queue=name)
+        except NotImplementedError:  # macOS : qsize() non disponible sur mp.Queue
+            return
+
+
+def next_message(q_post, procs):
+    while True:
+        try:
+            return q_post.get(timeout=WORKER_TIMEOUT_S)
+        except queue.Empty:
+            dead = [p.name for p in procs if p.exitcode not in (None, 0)]
+            if dead:
+                raise RuntimeError(f"Processus arrêtés en erreur: {dead}")
+
+
+# -----------------------------
+# MAIN
+# -----------------------------
+def main(timer=None, rails_workers=None):
+    """
+    Même sorties que infer_trains_and_rails_with_history.main(), réparties en processus :
+    décodeur -> [workers rails x N] + [tracker] -> post-traitement/écriture (ce processus).
+    TRACKER = "rail" : le processus tracker ne fait que détecter, le suivi le long des voies
+    est fait ici, dans l'ordre des frames, avec les composantes rails du slot.
+    Les frames passent par un anneau de slots en mémoire partagée, identifiés par leur index.
+    """
+    enabled = [k for k in UNSUPPORTED_KEYS if getattr(pipeline, k)]
+    if enabled:
+        raise ValueError(f"Non supporté par infer_pipeline_mp.py: {enabled} "
+                         "(utiliser infer_trains_and_rails_with_history.py ou les désactiver)")
+    timer = timer or metrics.timer()
+    rails_workers = rails_workers or RAILS_WORKERS
+    metrics.start(script="infer_pipeline_mp")
+    metrics.set_gauge("rails_expected", pipeline.EXPECTED_RAILS)
+
+    cap = cv2.VideoCapture(pipeline.SOURCE_VIDEO)
+    if not cap.isOpened():
+        raise RuntimeError(f"Impossible d'ouvrir la vidéo: {pipeline.SOURCE_VIDEO}")
+    fps = cap.get(cv2.CAP_PROP_FPS) or 25.0
+    w = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
+    h = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+    cap.release()
+
+    cfg = {k: getattr(pipeline, k) for k in PIPELINE_KEYS}
+    # masques rails du cache à la résolution modèle : au plus IMGSZ_RAILS de côté (letterbox)
+    ring = FrameRing(RING_SLOTS, h, w, mask_size=pipeline.IMGSZ_RAILS if pipeline.SAVE_DET_CACHE else 0)
+    ctx_mp = mp.get_context("spawn")
+    free_slots = ctx_mp.Queue()
+    for slot in range(RING_SLOTS):
+        free_slots.put(slot)
+    q_rails, q_track, q_post = ctx_mp.Queue(), ctx_mp.Queue(), ctx_mp.Queue()
+    queues = {"q_rails": q_rails, "q_track": q_track, "q_post": q_post}
+
+    spec = ring.spec()
+    procs = [ctx_mp.Process(target=decoder_proc, name="decoder",
+                            args=(cfg, spec, free_slots, q_rails, q_track, rails_workers))]
+    procs += [ctx_mp.Process(target=rails_proc, name=f"rails_{i}", args=(cfg, spec, q_rails, q_post))
+              for i in range(rails_workers)]
+    procs.append(ctx_mp.Process(target=tracker_proc, name="tracker", args=(cfg, spec, q_track, q_post)))
+
+    print("🚀 MODELS")
+    print("  trains:", pipeline.TRAINS_MODEL)
+    print("  rails :", pipeline.RAILS_MODEL, f"(x{rails_workers} processus)")
+    print("🎥 SOURCE:", pipeline.SOURCE_VIDEO)
+    print(f"💾 Anneau: {RING_SLOTS} slots, {ring.nbytes / 1e6:.1f} MB partagés")
+
+    ctx = pipeline.open_outputs(fps, w, h)
+    rail_tracker = pipeline.make_rail_tracker() if pipeline.TRACKER == "rail" else None
+    for p in procs:
+        p.start()
+
+    # Résultats rails (désordonnés) et trains (ordonnés) réassemblés par numéro de frame.
+    # Numéros = index dans la vidéo (trous possibles : frames illisibles) ; le tracker reçoit toutes les
+    # frames dans l'ordre, donc son plus petit résultat en attente est la prochaine frame.
+    rails_res, track_res = {}, {}
+    done, n_done, last_idx = 0, 0, -1
+    try:
+        while True:
+            timer.start()
+            while not track_res or min(track_res) not in rails_res:
+                if done == rails_workers + 1:
+                    break
+                kind, idx, a, b = next_message(q_post, procs)
+                if kind == "rails":
+                    rails_res[idx] = a
+                elif kind == "track":
+                    track_res[idx] = a
+                else:
+                    done += 1
+            if not track_res or min(track_res) not in rails_res:
+                break
+            frame_idx = min(track_res)
+            timer.lap("wait")
+            report_queue_depths(queues)
+
+            slot = int(next(s for s in range(RING_SLOTS) if ring.seq[s] == frame_idx))
+            rails_list = rails_res.pop(frame_idx)
+            mh, mw = ring.rail_mask_hw[slot]
+            cache_mask = ring.rail_mask[slot, :mh, :mw] if mh else None
+            xyxy, confs, track_ids = track_res.pop(frame_idx)
+            if rail_tracker is not None:
+                xyxy, confs, track_ids = rail_tracker.update(frame_idx, xyxy, confs, ring.cc[slot], rails_list)
+            metrics.set_gauge("rails_detected", len(rails_list))
+            if len(rails_list) != pipeline.EXPECTED_RAILS:
+                metrics.inc("rails_mismatch_total")
+
+            pipeline.postprocess_frame(ctx, ring.frames[slot], frame_idx, cache_mask, ring.mask_bin[slot],
+                                       rails_list, ring.cc[slot], xyxy, confs, track_ids, timer)
+            timer.end_frame()
+
+            # slot rendu au décodeur une fois la frame entièrement écrite
+            ring.seq[slot] = -1
+            free_slots.put(slot)
+
+            last_idx = frame_idx
+            n_done += 1
+            if n_done % 50 == 0:
+                print(f"Processed {n_done} frames...")
+
+        for p in procs:
+            p.join()
+    finally:
+        for p in procs:
+            if p.is_alive():
+                p.terminate()
+        pipeline.close_outputs(ctx, last_idx + 1)
+        ring.unlink()
+
+    print("✅ Done.")
+    pipeline.print_outputs(ctx)
+    return n_done
+
+
+# -----------------------------
+# BENCHMARK DE SCALING
+# -----------------------------
+def redirect(out_dir: Path):
+    out_dir.mkdir(parents=True, exist_ok=True)
+    for name in dir(pipeline):
+        if name.startswith("OUT_") and isinstance(getattr(pipeline, name), str):
+            setattr(pipeline, name, str(out_dir / Path(getattr(pipeline, name)).name))
+
+
+def hash_outputs(out_dir: Path):
+    return {str(p.relative_to(out_dir)): hashlib.sha256(p.read_bytes()).hexdigest()
+            for p in sorted(out_dir.rglob("*")) if p.is_file()}
+
+
+def bench_run(cfg, mode, n_workers, out_dir, q_result):
+    """
+    Exécuté dans un processus dédié (spawn) : mêmes threads pour la référence et le MP.
+    Process et non Pool : un worker de Pool (daemon) ne peut pas lancer les processus du pipeline.
+    """
+    init_process(cfg)
+    redirect(Path(out_dir))
+    t0 = time.perf_counter()
+    if mode == "single":
+        pipeline.main()
+        n = None
+    else:
+        n = main(rails_workers=n_workers)
+    wall_s = time.perf_counter() - t0
+    q_result.put({"wall_s": round(wall_s, 3), "frames": n})
+
+
+def bench():
+    ctx_mp = mp.get_context("spawn")
+    cfg = {k: getattr(pipeline, k) for k in PIPELINE_KEYS}
+    runs = [("single", 0)] + [("mp", n) for n in BENCH_WORKERS]
+    results = []
+    ref_hashes = None
+    for mode, n in runs:
+        name = "single" if mode == "single" else f"mp_{n}"
+        out_dir = BENCH_OUT / name
+        print(f"\n🚀 Bench {name}")
+        q_result = ctx_mp.Queue()
+        p = ctx_mp.Process(target=bench_run, args=(cfg, mode, n, str(out_dir), q_result))
+        p.start()
+        p.join()
+        if p.exitcode != 0:
+            raise SystemExit(f"\n❌ Bench {name} en erreur (code {p.exitcode})\n")
+        res = q_result.get()
+        hashes = hash_outputs(out_dir)
+        if ref_hashes is None:
+            ref_hashes = hashes
+        res.update({"mode": name, "rails_workers": n or None, "processes": (n + 3) if n else 1,
+                    "identical": hashes == ref_hashes})
+        if res["frames"]:
+            res["fps"] = round(res["frames"] / res["wall_s"], 2)
+        results.append(res)
+
+    n_frames = next((r["frames"] for r in results if r["frames"]), None)
+    for r in results:
+        if r["frames"] is None and n_frames:
+            r["frames"] = n_frames
+            r["fps"] = round(n_frames / r["wall_s"], 2)
+    ref_fps = results[0].get("fps")
+    for r in results:
+        r["speedup"] = round(r["fps"] / ref_fps, 2) if ref_fps and r.get("fps") else None
+
+    report = {
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "source": pipeline.SOURCE_VIDEO,
+        "ring_slots": RING_SLOTS,
+        "threads_per_worker": THREADS_PER_WORKER,
+        "env": {"python": platform.python_version(), "platform": platform.platform(), "cpu_count": os.cpu_count()},
+        "results": results,
+    }
+    BENCH_REPORT.parent.mkdir(parents=True, exist_ok=True)
+    BENCH_REPORT.write_text(json.dumps(report, indent=2, ensure_ascii=False), encoding="utf-8")
+
+    print("\n📊 Scaling:")
+    for r in results:
+        flag = "✅" if r["identical"] else "❌ sorties différentes"
+        print(f"  {r['mode']:<8} {r['processes']:>2} proc  {r.get('fps')} FPS  x{r['speedup']}  {flag}")
+    print(f"🧾 Rapport: {BENCH_REPORT}")
+    if not all(r["identical"] for r in results):
+        raise SystemExit("\n❌ Les sorties multi-processus diffèrent de la référence\n")
+
+
+if __name__ == "__main__":
+    if BENCH:
+        bench()
+    else:
+        main()
@@ -5,6 +5,10 @@ import cv2
 import numpy as np
 from ultralytics import YOLO
 
+import yard_metrics as metrics
+from frame_source import FrameSource
+from overlay_renderer import OverlayRenderer
+
 
 # -----------------------------
 # CONFIG
@@ -21,6 +25,12 @@ EXPECTED_RAILS = 6      # voies attendues (1..6)
 MIN_AREA = 800          # filtre bruit (à ajuster)
 CONNECTIVITY = 8        # 4 ou 8
 
+# Entrée vidéo (frame_source.py) : décodage dans un thread, en avance sur l'inférence,
+# et frame réduite à la taille modèle produite en même temps que la pleine résolution
+DECODER = "auto"    # "auto" | "pyav" | "ffmpeg" | "cv2"
+PREFETCH = 8        # frames décodées d'avance
+PRESCALE = True     # le modèle reçoit la frame déjà réduite (plus de resize dans Ultralytics)
+
 
 # -----------------------------
 # UTILS
@@ -63,31 +73,35 @@ def rank_rails_from_mask(mask_bin, expected=6, min_area=800):
     return comps
 
 
-def overlay_mask(frame, mask_bin):
-    """Superpose un masque binaire sur l'image (simple)."""
-    overlay = frame.copy()
-    # couleur fixe (vert) - tu peux changer si tu veux
-    overlay[mask_bin > 0] = (0, 255, 0)
-    return cv2.addWeighted(frame, 0.65, overlay, 0.35, 0)
+def draw_rails(img, rails):
+    """Boîtes + libellés des voies (calque statique d'OverlayRenderer)."""
+    for rail in rails:
+        x1, y1, x2, y2 = rail["bbox"]
+        cv2.rectangle(img, (x1, y1), (x2, y2), (255, 255, 255), 2)
+        cv2.putText(img, rail["label"], (x1, max(20, y1-10)),
+                    cv2.FONT_HERSHEY_SIMPLEX, 0.7, (255, 255, 255), 2)
 
 
 # -----------------------------
 # MAIN
 # -----------------------------
-def main():
-    model = YOLO(MODEL_PATH)
+def main(timer=None):
+    # timer: StageTimer optionnel (benchmark_inference.py), sinon métriques (YARD_METRICS=1) ou aucun coût
+    timer = timer or metrics.timer()
+    metrics.start(script="infer_rails")
+    metrics.set_gauge("rails_expected", EXPECTED_RAILS)
 
-    cap = cv2.VideoCapture(SOURCE_VIDEO)
-    if not cap.isOpened():
-        raise RuntimeError(f"Impossible d'ouvrir la vidéo: {SOURCE_VIDEO}")
+    model = YOLO(MODEL_PATH)
 
-    fps = cap.get(cv2.CAP_PROP_FPS) or 25.0
-    w = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
-    h = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+    cap = FrameSource(SOURCE_VIDEO, backend=DECODER, prescale=[IMGSZ] if PRESCALE else [], prefetch=PREFETCH)
+    fps, w, h = cap.fps, cap.w, cap.h
 
     fourcc = cv2.VideoWriter_fourcc(*"mp4v")
     Path(OUT_VIDEO).parent.mkdir(parents=True, exist_ok=True)
     writer = cv2.VideoWriter(OUT_VIDEO, fourcc, fps, (w, h))
+    # superposition du masque (vert) + voies, buffers réutilisés d'une frame à l'autre
+    renderer = OverlayRenderer(w, h, draw_rails)
+    mask_bin = np.zeros((h, w), dtype=np.uint8)
 
     Path(OUT_JSONL).parent.mkdir(parents=True, exist_ok=True)
     fjson = open(OUT_JSONL, "w", encoding="utf-8")
@@ -95,19 +109,24 @@ def main():
     frame_idx = 0
 
     print("🚀 Inference rails ONNX:", MODEL_PATH)
-    print("🎥 Source:", SOURCE_VIDEO)
+    print("🎥 Source:", SOURCE_VIDEO, f"(décodeur {cap.backend})")
 
     while True:
-        ret, frame = cap.read()
-        if not ret:
+        timer.start()
+        pkt = cap.read()
+        if pkt is None:
             break
+        frame_idx = pkt.idx   # index dans la vidéo (frame illisible sautée : trou, pas de décalage)
+        frame = pkt.frame
+        timer.lap("decode")
 
         # Ultralytics inference
-        results = model.predict(frame, imgsz=IMGSZ, conf=CONF, verbose=False)
+        results = model.predict(pkt.model_input(IMGSZ), imgsz=IMGSZ, conf=CONF, verbose=False)
         r = results[0]
+        timer.lap("rail_predict")
 
         # Construire masque binaire global (union des instances)
-        mask_bin = np.zeros((frame.shape[0], frame.shape[1]), dtype=np.uint8)
+        mask_bin.fill(0)
 
         if r.masks is not None and r.masks.data is not None:
             # r.masks.data: (n, mask_h, mask_w) float/0-1
@@ -116,19 +135,21 @@ def main():
             for m in masks:
                 m_resized = cv2.resize(m, (frame.shape[1], frame.shape[0]), interpolation=cv2.INTER_NEAREST)
                 mask_bin[m_resized > 0.5] = 255
+        timer.lap("mask_union")
 
         # Numérotation voies gauche->droite
         rails = rank_rails_from_mask(mask_bin, expected=EXPECTED_RAILS, min_area=MIN_AREA)
+        timer.lap("connected_components")
+        metrics.set_gauge("rails_detected", len(rails))
+        if len(rails) != EXPECTED_RAILS:
+            metrics.inc("rails_mismatch_total")
 
         # Overlay + dessin bbox voies
-        out = overlay_mask(frame, mask_bin)
-        for rail in rails:
-            x1, y1, x2, y2 = rail["bbox"]
-            cv2.rectangle(out, (x1, y1), (x2, y2), (255, 255, 255), 2)
-            cv2.putText(out, rail["label"], (x1, max(20, y1-10)),
-                        cv2.FONT_HERSHEY_SIMPLEX, 0.7, (255, 255, 255), 2)
+        out = renderer.render(frame, mask_bin, rails)
+        timer.lap("overlay")
 
         writer.write(out)
+        timer.lap("encode")
 
         # JSONL (backend)
         payload = {
@@ -140,6 +161,8 @@ def main():
             ]
         }
         fjson.write(json.dumps(payload, ensure_ascii=False) + "\n")
+        timer.lap("write")
+        timer.end_frame()
 
         frame_idx += 1
         if frame_idx % 50 == 0:
@@ -5,6 +5,9 @@ import cv2
 import numpy as np
 from ultralytics import YOLO
 
+import yard_metrics as metrics
+from frame_source import FrameSource
+
 
 # -----------------------------
 # CONFIG
@@ -22,6 +25,19 @@ IOU = 0.45
 TRACKER = "botsort.yaml"  # fourni avec Ultralytics
 MAX_SLOTS = 6             # train1..train6
 
+# Entrée vidéo (frame_source.py) : décodage dans un thread, en avance sur l'inférence,
+# et frame réduite à la taille modèle produite en même temps que la pleine résolution
+DECODER = "auto"    # "auto" | "pyav" | "ffmpeg" | "cv2"
+PREFETCH = 8        # frames décodées d'avance
+PRESCALE = False    # True : le modèle reçoit la frame déjà réduite (voir INFERENCE.md, track() la voit réduite)
+
+# Cascade : un détecteur nano tourne sur chaque frame, MODEL_PATH n'est appelé
+# que sur les frames incertaines (voir cascade_detector.py)
+CASCADE = False
+TRAINS_MODEL_FAST = r"4_models/detection/trains_nano.pt"
+CASCADE_CONF_LOW  = 0.10   # seuil du nano ; [LOW, HIGH[ = incertain -> modèle complet
+CASCADE_CONF_HIGH = 0.50
+
 
 # -----------------------------
 # UTILS
@@ -53,20 +69,24 @@ def draw_box(img, bbox, text, thickness=2):
 # -----------------------------
 # MAIN
 # -----------------------------
-def main():
-    model = YOLO(MODEL_PATH)
+def main(timer=None):
+    # timer: StageTimer optionnel (benchmark_inference.py), sinon métriques (YARD_METRICS=1) ou aucun coût
+    timer = timer or metrics.timer()
+    metrics.start(script="infer_trains")
 
-    cap = cv2.VideoCapture(SOURCE_VIDEO)
-    if not cap.isOpened():
-        raise RuntimeError(f"Impossible d'ouvrir la vidéo: {SOURCE_VIDEO}")
+    if CASCADE:
+        from cascade_detector import CascadeTracker
+        model = CascadeTracker(TRAINS_MODEL_FAST, MODEL_PATH, CASCADE_CONF_LOW, CASCADE_CONF_HIGH)
+    else:
+        model = YOLO(MODEL_PATH)
 
-    fps = cap.get(cv2.CAP_PROP_FPS) or 25.0
-    w = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
-    h = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+    cap = FrameSource(SOURCE_VIDEO, backend=DECODER, prescale=[IMGSZ] if PRESCALE else [], prefetch=PREFETCH)
+    fps, w, h = cap.fps, cap.w, cap.h
 
     fourcc = cv2.VideoWriter_fourcc(*"mp4v")
     Path(OUT_VIDEO).parent.mkdir(parents=True, exist_ok=True)
     writer = cv2.VideoWriter(OUT_VIDEO, fourcc, fps, (w, h))
+    out = np.empty((h, w, 3), dtype=np.uint8)   # buffer overlay réutilisé à chaque frame
 
     Path(OUT_JSONL).parent.mkdir(parents=True, exist_ok=True)
     fjson = open(OUT_JSONL, "w", encoding="utf-8")
@@ -74,17 +94,21 @@ def main():
     frame_idx = 0
 
     print("🚀 Train tracking inference:", MODEL_PATH)
-    print("🎥 Source:", SOURCE_VIDEO)
+    print("🎥 Source:", SOURCE_VIDEO, f"(décodeur {cap.backend})")
     print("🧭 Tracker:", TRACKER)
 
     while True:
-        ret, frame = cap.read()
-        if not ret:
+        timer.start()
+        pkt = cap.read()
+        if pkt is None:
             break
+        frame_idx = pkt.idx   # index dans la vidéo (frame illisible sautée : trou, pas de décalage)
+        frame = pkt.frame
+        timer.lap("decode")
 
         # Tracking (IDs stables)
         results = model.track(
-            frame,
+            pkt.model_input(IMGSZ),
             imgsz=IMGSZ,
             conf=CONF,
             iou=IOU,
@@ -93,11 +117,12 @@ def main():
             verbose=False
         )
         r = results[0]
+        timer.lap("track")
 
         dets = []
         # r.boxes contient les bbox détectées
         if r.boxes is not None and len(r.boxes) > 0:
-            xyxy = r.boxes.xyxy.cpu().numpy()
+            xyxy = pkt.to_full(r.boxes.xyxy.cpu().numpy(), IMGSZ)
             confs = r.boxes.conf.cpu().numpy()
             clss = r.boxes.cls.cpu().numpy().astype(int)
 
@@ -117,19 +142,24 @@ def main():
                 }
                 dets.append(det)
 
+        metrics.observe("detections_per_frame", len(dets))
+
         # Numérotation gauche->droite (train1..train6)
         dets_ranked = rank_left_to_right(dets, max_slots=MAX_SLOTS)
+        timer.lap("rank")
 
         # Overlay
-        out = frame.copy()
+        np.copyto(out, frame)
         for d in dets_ranked:
             tid = d["track_id"]
             label = d["lr_label"]
             conf = d["conf"]
             txt = f"{label}  id={tid}  conf={conf:.2f}" if tid is not None else f"{label}  conf={conf:.2f}"
             draw_box(out, d["bbox"], txt)
+        timer.lap("overlay")
 
         writer.write(out)
+        timer.lap("encode")
 
         # JSONL (backend)
         payload = {
@@ -138,6 +168,8 @@ def main():
             "trains": dets_ranked
         }
         fjson.write(json.dumps(payload, ensure_ascii=False) + "\n")
+        timer.lap("write")
+        timer.end_frame()
 
         frame_idx += 1
         if frame_idx % 50 == 0:
@@ -147,6 +179,10 @@ def main():
     writer.release()
     fjson.close()
 
+    if CASCADE:
+        c = model.summary()
+        print(f"🪜 Cascade: {c['escalated']}/{c['frames']} frames vers le modèle complet "
+              f"({c['escalation_ratio']:.1%}) {c['reasons']}")
     print("✅ Done.")
     print("📹 Overlay video:", OUT_VIDEO)
     print("🧾 JSONL:", OUT_JSONL)
@@ -5,6 +5,11 @@ import cv2
 import numpy as np
 from ultralytics import YOLO
 
+import yard_metrics as metrics
+from frame_source import FrameSource
+from motion_gate import MotionGate
+from overlay_renderer import OverlayRenderer
+
 # -----------------------------
 # CONFIG
 # -----------------------------
@@ -29,6 +34,42 @@ MIN_AREA_RAIL  = 1200     # ajuste si trop de “bruit”
 MASK_THRESH    = 0.5      # seuil mask (0.35–0.6 selon qualité)
 POINT_OFFSET_PX = 2       # point bas-centre = y2 - 2px
 
+# Voie d'un train (comme infer_trains_and_rails_with_history.py) :
+#   "strip" : voie dominante sur la bande basse de la boîte (pixels comptés par composante, rails_for_boxes)
+#   "point" : composante sous le seul point bas-centre (ancien comportement, trous du masque -> None)
+RAIL_ASSIGN = "strip"
+STRIP_FRAC = 0.15         # hauteur de la bande : fraction de la hauteur de la boîte...
+STRIP_MIN_PX = 4          # ... et au moins N px
+STRIP_WIDTH_FRAC = 0.5    # largeur de la bande (centrée) : fraction de la largeur de la boîte
+MIN_RAIL_OVERLAP = 0.10   # part de la bande sur la voie dominante en dessous de laquelle voie = None
+
+# Cascade : un détecteur nano tourne sur chaque frame, TRAINS_MODEL n'est appelé
+# que sur les frames incertaines (voir cascade_detector.py)
+CASCADE = False
+TRAINS_MODEL_FAST = r"4_models/detection/trains_nano.pt"
+CASCADE_CONF_LOW  = 0.10   # seuil du nano ; [LOW, HIGH[ = incertain -> modèle complet
+CASCADE_CONF_HIGH = 0.50
+
+# Inférence tuilée (4K) : tuiles recouvrantes inférées en un batch, NMS inter-tuiles pour
+# les trains, masques recollés pour les rails, tuiles sans rail sautées (tiled_inference.py)
+TILED = False
+TILE_SIZE = 1280
+TILE_OVERLAP = 0.2
+
+# Motion gate : si rien ne bouge dans la ROI des rails (frame réduite), les modèles
+# ne sont pas appelés et les sorties de la frame précédente sont reprises
+MOTION_GATE = False
+MOTION_WIDTH = 320          # largeur de la frame réduite pour la comparaison
+MOTION_PIXEL_THRESH = 18    # écart de niveau de gris considéré comme mouvement
+MOTION_FRAC = 0.002         # part de pixels de la ROI en mouvement pour déclencher
+MOTION_MAX_SKIP = 50        # sécurité : au moins un appel modèle toutes les N frames
+
+# Entrée vidéo (frame_source.py) : décodage dans un thread, en avance sur l'inférence,
+# et frames réduites aux tailles modèle produites en même temps que la pleine résolution
+DECODER = "auto"    # "auto" | "pyav" | "ffmpeg" | "cv2"
+PREFETCH = 8        # frames décodées d'avance
+PRESCALE = False    # True : les modèles reçoivent la frame déjà réduite (voir INFERENCE.md ; ignoré si TILED)
+
 
 # -----------------------------
 # UTILS
@@ -109,10 +150,47 @@ def find_rail_for_point(cc_labels, rails_list, x, y):
             return r["label"]
     return None
 
-def overlay_mask(frame, mask_bin):
-    overlay = frame.copy()
-    overlay[mask_bin > 0] = (0, 255, 0)
-    return cv2.addWeighted(frame, 0.65, overlay, 0.35, 0)
+def rails_for_boxes(cc_labels, rails_list, xyxy):
+    """
+    Voie dominante de chaque boîte par recouvrement : pixels de cc_labels comptés par voie sur la
+    bande basse de la boîte, pour toutes les boîtes en un seul np.bincount (pas de boucle par train).
+    Retourne (labels de voie ou None, part de la bande sur la voie dominante).
+    """
+    n = len(xyxy)
+    if n == 0 or not rails_list:
+        return [None] * n, np.zeros(n, dtype=np.float32)
+    h, w = cc_labels.shape[:2]
+    b = np.asarray(xyxy, dtype=np.float32)
+    cx = (b[:, 0] + b[:, 2]) / 2.0
+    half = np.maximum((b[:, 2] - b[:, 0]) * STRIP_WIDTH_FRAC / 2.0, 1.0)
+    x0 = np.clip(np.floor(cx - half), 0, w - 1).astype(np.int64)
+    x1 = np.clip(np.ceil(cx + half), x0 + 1, w).astype(np.int64)
+    y1 = np.clip(np.ceil(b[:, 3]), 1, h).astype(np.int64)
+    y0 = np.clip(np.floor(b[:, 3] - np.maximum((b[:, 3] - b[:, 1]) * STRIP_FRAC, STRIP_MIN_PX)), 0, y1 - 1).astype(np.int64)
+
+    # indices à plat de tous les pixels de toutes les bandes : une ligne de bande = un segment contigu
+    sw, sh = x1 - x0, y1 - y0
+    area = sw * sh
+    row_box = np.repeat(np.arange(n), sh)
+    row_y = y0[row_box] + np.arange(sh.sum()) - np.repeat(np.cumsum(sh) - sh, sh)
+    row_len = sw[row_box]
+    starts = row_y * w + x0[row_box]
+    idx = np.repeat(starts - (np.cumsum(row_len) - row_len), row_len) + np.arange(row_len.sum())
+    box = np.repeat(row_box, row_len)
+
+    # composante -> index de voie (0 = pas une voie retenue)
+    max_id = max(r["comp_id"] for r in rails_list)
+    lut = np.zeros(max_id + 2, dtype=np.int64)
+    for k, r in enumerate(rails_list, start=1):
+        lut[r["comp_id"]] = k
+    rail = lut[np.minimum(cc_labels.reshape(-1)[idx], max_id + 1)]
+
+    k = len(rails_list) + 1
+    counts = np.bincount(box * k + rail, minlength=n * k).reshape(n, k)[:, 1:]
+    best = counts.argmax(axis=1)
+    overlap = counts[np.arange(n), best] / area
+    voies = [rails_list[j]["label"] if o >= MIN_RAIL_OVERLAP else None for j, o in zip(best, overlap)]
+    return voies, overlap
 
 def draw_box(img, bbox, text, color=(0, 255, 255), thickness=2):
     x1, y1, x2, y2 = map(int, bbox)
@@ -126,74 +204,127 @@ def draw_rail_bbox(img, rail):
     cv2.putText(img, rail["label"], (x1, max(25, y1 - 8)),
                 cv2.FONT_HERSHEY_SIMPLEX, 0.7, (255, 255, 255), 2)
 
+def draw_rails(img, rails_list):
+    # calque statique d'OverlayRenderer
+    for r in rails_list:
+        draw_rail_bbox(img, r)
+
 
 # -----------------------------
 # MAIN
 # -----------------------------
-def main():
-    trains_model = YOLO(TRAINS_MODEL)
+def main(timer=None):
+    # timer: StageTimer optionnel (benchmark_inference.py), sinon métriques (YARD_METRICS=1) ou aucun coût
+    timer = timer or metrics.timer()
+    metrics.start(script="infer_trains_and_rails")
+    metrics.set_gauge("rails_expected", EXPECTED_RAILS)
+
+    if CASCADE:
+        from cascade_detector import CascadeTracker
+        trains_model = CascadeTracker(TRAINS_MODEL_FAST, TRAINS_MODEL, CASCADE_CONF_LOW, CASCADE_CONF_HIGH)
+    else:
+        trains_model = YOLO(TRAINS_MODEL)
     rails_model = YOLO(RAILS_MODEL)
 
-    cap = cv2.VideoCapture(SOURCE_VIDEO)
-    if not cap.isOpened():
-        raise RuntimeError(f"Impossible d'ouvrir la vidéo: {SOURCE_VIDEO}")
+    if TILED:
+        if CASCADE:
+            raise ValueError("TILED et CASCADE ne se combinent pas : choisir l'un des deux")
+        from tiled_inference import TiledModel
+        rails_model = TiledModel(rails_model, TILE_SIZE, TILE_OVERLAP)
+        trains_model = TiledModel(trains_model, TILE_SIZE, TILE_OVERLAP)
 
-    fps = cap.get(cv2.CAP_PROP_FPS) or 25.0
-    w = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
-    h = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+    # TILED : les tuiles sont découpées dans la frame pleine résolution, pas de réduction
+    prescale = [IMGSZ_RAILS, IMGSZ_TRAINS] if PRESCALE and not TILED else []
+    cap = FrameSource(SOURCE_VIDEO, backend=DECODER, prescale=prescale,
+                      gray_width=MOTION_WIDTH if MOTION_GATE else None, prefetch=PREFETCH)
+    fps, w, h = cap.fps, cap.w, cap.h
 
     Path(OUT_VIDEO).parent.mkdir(parents=True, exist_ok=True)
     writer = cv2.VideoWriter(OUT_VIDEO, cv2.VideoWriter_fourcc(*"mp4v"), fps, (w, h))
+    renderer = OverlayRenderer(w, h, draw_rails)
+    mask_buf = np.zeros((h, w), dtype=np.uint8)   # réutilisé à chaque frame
 
     Path(OUT_JSONL).parent.mkdir(parents=True, exist_ok=True)
     fjson = open(OUT_JSONL, "w", encoding="utf-8")
 
+    gate = None
+    if MOTION_GATE:
+        gate = MotionGate(MOTION_WIDTH, MOTION_PIXEL_THRESH, MOTION_FRAC, MOTION_MAX_SKIP)
+
     frame_idx = 0
     print("🚀 MODELS")
     print("  trains:", TRAINS_MODEL)
     print("  rails :", RAILS_MODEL)
-    print("🎥 SOURCE:", SOURCE_VIDEO)
+    print("🎥 SOURCE:", SOURCE_VIDEO, f"(décodeur {cap.backend})")
 
     while True:
-        ret, frame = cap.read()
-        if not ret:
+        timer.start()
+        pkt = cap.read()
+        if pkt is None:
             break
+        frame_idx = pkt.idx   # index dans la vidéo (frame illisible sautée : trou, pas de décalage)
+        frame = pkt.frame
+        timer.lap("decode")
+
+        # 0) Motion gate : sans mouvement, on garde rr/tr et les rails de la frame précédente
+        run_models = gate is None or gate.should_run(pkt.gray)
+        if gate is not None:
+            timer.lap("gate")
+            if not run_models:
+                metrics.inc("gated_frames_total")
 
         # -----------------------------
         # 1) RAILS segmentation -> mask_bin
         # -----------------------------
-        rr = rails_model.predict(frame, imgsz=IMGSZ_RAILS, conf=CONF_RAILS, verbose=False)[0]
-        mask_bin = np.zeros((h, w), dtype=np.uint8)
-
-        if rr.masks is not None and rr.masks.data is not None:
-            masks = rr.masks.data.cpu().numpy()  # (n, mh, mw)
-            for m in masks:
-                m_resized = cv2.resize(m, (w, h), interpolation=cv2.INTER_NEAREST)
-                mask_bin[m_resized > MASK_THRESH] = 255
-
-        rails_list, cc_labels = connected_components_rails(mask_bin, expected=EXPECTED_RAILS, min_area=MIN_AREA_RAIL)
+        if run_models:
+            rr = rails_model.predict(pkt.model_input(IMGSZ_RAILS), imgsz=IMGSZ_RAILS, conf=CONF_RAILS, verbose=False)[0]
+            timer.lap("rail_predict")
+            mask_bin = mask_buf
+            mask_bin.fill(0)
+
+            if rr.masks is not None and rr.masks.data is not None:
+                masks = rr.masks.data.cpu().numpy()  # (n, mh, mw)
+                for m in masks:
+                    m_resized = cv2.resize(m, (w, h), interpolation=cv2.INTER_NEAREST)
+                    mask_bin[m_resized > MASK_THRESH] = 255
+            timer.lap("mask_union")
+
+            rails_list, cc_labels = connected_components_rails(mask_bin, expected=EXPECTED_RAILS, min_area=MIN_AREA_RAIL)
+            timer.lap("connected_components")
+            if gate is not None:
+                gate.set_roi(mask_bin)
+            if TILED:
+                trains_model.set_layout(mask_bin)
+        metrics.set_gauge("rails_detected", len(rails_list))
+        if len(rails_list) != EXPECTED_RAILS:
+            metrics.inc("rails_mismatch_total")
 
         # -----------------------------
         # 2) TRAINS detect + track
         # -----------------------------
-        tr = trains_model.track(
-            frame,
-            imgsz=IMGSZ_TRAINS,
-            conf=CONF_TRAINS,
-            iou=IOU_TRAINS,
-            tracker=TRACKER,
-            persist=True,
-            verbose=False
-        )[0]
+        if run_models:
+            tr = trains_model.track(
+                pkt.model_input(IMGSZ_TRAINS),
+                imgsz=IMGSZ_TRAINS,
+                conf=CONF_TRAINS,
+                iou=IOU_TRAINS,
+                tracker=TRACKER,
+                persist=True,
+                verbose=False
+            )[0]
+            timer.lap("track")
 
         trains = []
         if tr.boxes is not None and len(tr.boxes) > 0:
-            xyxy = tr.boxes.xyxy.cpu().numpy()
+            xyxy = pkt.to_full(tr.boxes.xyxy.cpu().numpy(), IMGSZ_TRAINS)
             confs = tr.boxes.conf.cpu().numpy()
             track_ids = None
             if getattr(tr.boxes, "id", None) is not None:
                 track_ids = tr.boxes.id.cpu().numpy().astype(int)
 
+            strip = RAIL_ASSIGN == "strip"
+            if strip:
+                voies, overlaps = rails_for_boxes(cc_labels, rails_list, xyxy)
             for i in range(len(xyxy)):
                 bbox = xyxy[i].tolist()
                 tid = int(track_ids[i]) if track_ids is not None else None
@@ -203,15 +334,23 @@ def main():
                 px = (x1 + x2) / 2.0
                 py = y2 - POINT_OFFSET_PX
 
-                voie = find_rail_for_point(cc_labels, rails_list, px, py)
+                if strip:
+                    voie = voies[i]
+                else:
+                    voie = find_rail_for_point(cc_labels, rails_list, px, py)
 
-                trains.append({
+                train = {
                     "bbox": bbox,
                     "conf": float(confs[i]),
                     "track_id": tid,
                     "point": [float(px), float(py)],
                     "voie": voie
-                })
+                }
+                if strip:
+                    train["rail_overlap"] = round(float(overlaps[i]), 3)
+                trains.append(train)
+
+        metrics.observe("detections_per_frame", len(trains))
 
         # numérotation gauche->droite train1..train6
         trains_ranked = rank_left_to_right(
@@ -220,15 +359,13 @@ def main():
             max_slots=EXPECTED_RAILS,  # souvent 6
             label_prefix="train"
         )
+        timer.lap("occupancy")
 
         # -----------------------------
         # 3) Overlay
         # -----------------------------
-        out = overlay_mask(frame, mask_bin)
-
-        # rails bbox + labels
-        for r in rails_list:
-            draw_rail_bbox(out, r)
+        # teinte + rails bbox/labels (calque mis en cache tant que les rails ne changent pas)
+        out = renderer.render(frame, mask_bin, rails_list)
 
         # trains bbox + association voie
         for t in trains_ranked:
@@ -240,8 +377,10 @@ def main():
             # point bas-centre
             px, py = map(int, t["point"])
             cv2.circle(out, (px, py), 4, (0, 0, 255), -1)
+        timer.lap("overlay")
 
         writer.write(out)
+        timer.lap("encode")
 
         # -----------------------------
         # 4) JSONL per frame
@@ -257,6 +396,8 @@ def main():
             "trains": trains_ranked
         }
         fjson.write(json.dumps(payload, ensure_ascii=False) + "\n")
+        timer.lap("write")
+        timer.end_frame()
 
         frame_idx += 1
         if frame_idx % 50 == 0:
@@ -265,6 +406,18 @@ def main():
     cap.release()
     writer.release()
     fjson.close()
+    if gate is not None:
+        g = gate.summary()
+        print(f"🚦 Motion gate: {g['skipped']}/{g['frames']} frames sans appel modèle ({g['skip_ratio']:.1%})")
+    if CASCADE:
+        c = trains_model.summary()
+        print(f"🪜 Cascade: {c['escalated']}/{c['frames']} frames vers le modèle complet "
+              f"({c['escalation_ratio']:.1%}) {c['reasons']}")
+    if TILED:
+        t = rails_model.summary()
+        print(f"🧩 Tuiles rails sautées: {t['tiles_skipped']}/{t['tiles_run'] + t['tiles_skipped']} ({t['skip_ratio']:.1%})")
+        t = trains_model.summary()
+        print(f"🧩 Tuiles trains sautées: {t['tiles_skipped']}/{t['tiles_run'] + t['tiles_skipped']} ({t['skip_ratio']:.1%})")
     print("✅ Done.")
     print("📹 Overlay:", OUT_VIDEO)
     print("🧾 JSONL :", OUT_JSONL)
@@ -1,11 +1,24 @@
-import json
-import csv
+import os
+import sys
+import time
 from pathlib import Path
 from collections import defaultdict
 
 import cv2
 import numpy as np
-from ultralytics import YOLO
+
+import yard_metrics as metrics
+from detection_cache import DetectionCacheWriter
+from event_clips import EventClipRecorder
+from frame_source import FrameSource, letterbox_size
+from motion_gate import MotionGate
+from overlay_renderer import OverlayRenderer
+from rail_tracker import RailTracker
+from record_writer import AsyncRecordWriter
+from yard_aggregates import YardAggregator
+
+_T_IMPORT = time.time()
+_MAIN_RUNS = 0   # main() déjà lancés dans ce processus (évaluation multi-vidéos)
 
 # -----------------------------
 # CONFIG
@@ -17,6 +30,20 @@ SOURCE_VIDEO = r"video.mp4"  # <-- change ce chemin
 
 OUT_VIDEO = r"7_outputs/overlays/trains_rails_overlay.mp4"
 
+# Sorties vidéo :
+#   "full"  : overlay de toute la vidéo (OUT_VIDEO)
+#   "clips" : seulement des clips courts + snapshots JPEG autour des événements (event_clips.py),
+#             liés depuis occupancy_events.jsonl ("clip", "snapshot")
+#   "both"  : les deux ; "none" : aucune vidéo (ni rendu de l'overlay)
+VIDEO_MODE = "full"
+OUT_CLIPS_DIR = r"7_outputs/clips"   # un sous-dossier par vidéo
+CLIP_EVENTS = ("voie_change", "arrival", "departure")
+CLIP_PRE_S = 3.0            # pré-roll gardé en mémoire (anneau de frames)
+CLIP_POST_S = 3.0
+CLIP_MAX_S = 30.0           # au-delà, un événement ouvre un nouveau clip au lieu de prolonger
+CLIP_WIDTH = 960            # largeur des clips (None = pleine résolution) ; snapshots en pleine résolution
+SNAPSHOT_QUALITY = 85
+
 # Sorties "par frame"
 OUT_JSONL_FRAMES = r"7_outputs/predictions/trains_rails_per_frame.jsonl"
 OUT_CSV_FRAMES   = r"7_outputs/predictions/occupancy_per_frame.csv"
@@ -24,6 +51,32 @@ OUT_CSV_FRAMES   = r"7_outputs/predictions/occupancy_per_frame.csv"
 # Sorties "par événement" (changements voie<->train)
 OUT_JSONL_EVENTS = r"7_outputs/predictions/occupancy_events.jsonl"
 OUT_CSV_EVENTS   = r"7_outputs/predictions/occupancy_events.csv"
+# Événements : voie_change, arrival (1re frame d'un track sur une voie), departure (track perdu),
+# end_of_video ; un track passé par une voie et non revu depuis N s est parti (< CLIP_PRE_S : départ dans le clip)
+DEPARTURE_AFTER_S = 2.0
+
+# Cache des sorties brutes des modèles (boîtes, confs, IDs, masques rails) pour
+# rejouer l'occupation avec d'autres paramètres (replay_occupancy.py) sans réinférer
+SAVE_DET_CACHE = True
+OUT_DET_CACHE  = r"7_outputs/cache"   # un sous-dossier par vidéo
+
+# Écriture des JSONL/CSV (record_writer.py) : thread dédié, écritures par lots
+WRITER_FLUSH_S = 1.0        # flush des fichiers au plus tard toutes les N s
+WRITER_FSYNC = "never"      # "never" | "batch" (après chaque flush) | "close"
+WRITER_ENCODER = "json"     # "json" (mêmes octets partout) | "orjson" (compact, plus rapide) | "auto"
+ROTATE_MB = None            # ex. 256 -> segments de 256 MB + index <fichier>.segments.json
+ROTATE_HOURLY = False       # nouveau segment à chaque heure (flux continus)
+
+# Agrégats du dashboard (yard_aggregates.py) : heures glissantes, occupation par voie, trains,
+# tenus à jour à chaque frame et écrits dans un JSON au format de src/services/smartYardApi.js
+YARD_STATE = False
+OUT_YARD_STATE = r"7_outputs/dashboard/yard_state.json"
+YARD_STATE_INTERVAL_S = 5.0   # écriture du JSON (et rafraîchissement de l'endpoint)
+YARD_API_PORT = 0             # ex. 8765 -> http://127.0.0.1:8765/api/state, 0 = pas de serveur
+YARD_START_TIME = None        # epoch de la frame 0 (None = heure de lancement)
+YARD_RESUME = False           # reprendre les cases horaires du JSON existant (flux continu relancé)
+PARKED_AFTER_S = 300.0        # train "disponible" : sur la même voie depuis N s
+MAINTENANCE_VOIES = []        # ex. ["voie6"] : voies réservées à la maintenance
 
 IMGSZ_TRAINS = 640
 IMGSZ_RAILS  = 640
@@ -31,13 +84,66 @@ CONF_TRAINS  = 0.25
 CONF_RAILS   = 0.25
 IOU_TRAINS   = 0.45
 
-TRACKER = "botsort.yaml"
+TRACKER = "botsort.yaml"    # ou "rail" : suivi 1D le long des voies segmentées (rail_tracker.py)
+
+# Tracker "rail" : position/vitesse de chaque train le long de la centreligne de sa voie
+RAIL_TRACK_GATE_PX = 80.0       # écart max |s_détection - s_prédit| (au moins)
+RAIL_TRACK_GATE_FRAC = 0.5      # ... ou cette fraction de la longueur du train le long de la voie
+RAIL_TRACK_MAX_LOST = 30        # frames de prédiction sans détection (occultation) avant abandon
+RAIL_TRACK_MIN_HITS = 2         # détections avant attribution d'un ID
+RAIL_TRACK_OFF_RAIL_PX = 40.0   # point hors masque : rattaché à la centreligne si plus proche que ça
+RAIL_TRACK_SWITCH_PX = 15.0     # centrelignes plus proches que ça = aiguillage (changement de voie permis)
 
 EXPECTED_RAILS = 6
 MIN_AREA_RAIL  = 1200     # ajuste si bruit
 MASK_THRESH    = 0.5      # 0.35–0.6 selon masque
 POINT_OFFSET_PX = 2       # point bas-centre = y2 - 2px
 
+# Voie d'un train :
+#   "strip" : voie dominante sur la bande basse de la boîte (pixels comptés par composante, rails_for_boxes)
+#   "point" : composante sous le seul point bas-centre (ancien comportement, trous du masque -> None)
+RAIL_ASSIGN = "strip"
+STRIP_FRAC = 0.15         # hauteur de la bande : fraction de la hauteur de la boîte...
+STRIP_MIN_PX = 4          # ... et au moins N px
+STRIP_WIDTH_FRAC = 0.5    # largeur de la bande (centrée) : fraction de la largeur de la boîte
+MIN_RAIL_OVERLAP = 0.10   # part de la bande sur la voie dominante en dessous de laquelle voie = None
+
+# Cascade : un détecteur nano tourne sur chaque frame, TRAINS_MODEL n'est appelé
+# que sur les frames incertaines (voir cascade_detector.py)
+CASCADE = False
+TRAINS_MODEL_FAST = r"4_models/detection/trains_nano.pt"
+CASCADE_CONF_LOW  = 0.10   # seuil du nano ; [LOW, HIGH[ = incertain -> modèle complet
+CASCADE_CONF_HIGH = 0.50
+
+# Inférence tuilée (4K) : tuiles recouvrantes inférées en un batch, NMS inter-tuiles pour
+# les trains, masques recollés pour les rails, tuiles sans rail sautées (tiled_inference.py)
+TILED = False
+TILE_SIZE = 1280
+TILE_OVERLAP = 0.2
+
+# Motion gate : si rien ne bouge dans la ROI des rails (frame réduite), les modèles
+# ne sont pas appelés et les sorties de la frame précédente sont reprises
+MOTION_GATE = False
+MOTION_WIDTH = 320          # largeur de la frame réduite pour la comparaison
+MOTION_PIXEL_THRESH = 18    # écart de niveau de gris considéré comme mouvement
+MOTION_FRAC = 0.002         # part de pixels de la ROI en mouvement pour déclencher
+MOTION_MAX_SKIP = 50        # sécurité : au moins un appel modèle toutes les N frames
+
+# Démarrage rapide : les modèles .onnx sont exécutés directement avec ONNX Runtime (onnx_yolo.py), sans
+# importer torch ni ultralytics. Ne s'applique pas aux modèles suivis par un YAML Ultralytics (BoT-SORT,
+# ByteTrack) : TRACKER = "rail" pour un run entièrement ONNX. Ignoré avec CASCADE et TILED.
+# Opt-in (activé par infer_fast_start.py) : les masques rails diffèrent de ceux d'Ultralytics (sans padding).
+ONNX_RUNTIME = False
+ORT_CACHE_DIR = r"4_models/.ort_cache"   # graphes optimisés gardés entre les runs (None = pas de cache disque)
+ORT_THREADS = None                       # threads intra-op ONNX Runtime (None = défaut)
+WARMUP = True                            # une inférence à vide par modèle avant la première frame
+
+# Entrée vidéo (frame_source.py) : décodage dans un thread, en avance sur l'inférence,
+# et frames réduites aux tailles modèle produites en même temps que la pleine résolution
+DECODER = "auto"    # "auto" | "pyav" | "ffmpeg" | "cv2"
+PREFETCH = 8        # frames décodées d'avance
+PRESCALE = False    # True : les modèles reçoivent la frame déjà réduite (voir INFERENCE.md ; ignoré si TILED)
+
 
 # -----------------------------
 # UTILS
@@ -99,7 +205,50 @@ def find_rail_for_point(cc_labels, rails_list, x, y):
             return r["label"]
     return None
 
+def rails_for_boxes(cc_labels, rails_list, xyxy):
+    """
+    Voie dominante de chaque boîte par recouvrement : pixels de cc_labels comptés par voie sur la
+    bande basse de la boîte, pour toutes les boîtes en un seul np.bincount (pas de boucle par train).
+    Retourne (labels de voie ou None, part de la bande sur la voie dominante).
+    """
+    n = len(xyxy)
+    if n == 0 or not rails_list:
+        return [None] * n, np.zeros(n, dtype=np.float32)
+    h, w = cc_labels.shape[:2]
+    b = np.asarray(xyxy, dtype=np.float32)
+    cx = (b[:, 0] + b[:, 2]) / 2.0
+    half = np.maximum((b[:, 2] - b[:, 0]) * STRIP_WIDTH_FRAC / 2.0, 1.0)
+    x0 = np.clip(np.floor(cx - half), 0, w - 1).astype(np.int64)
+    x1 = np.clip(np.ceil(cx + half), x0 + 1, w).astype(np.int64)
+    y1 = np.clip(np.ceil(b[:, 3]), 1, h).astype(np.int64)
+    y0 = np.clip(np.floor(b[:, 3] - np.maximum((b[:, 3] - b[:, 1]) * STRIP_FRAC, STRIP_MIN_PX)), 0, y1 - 1).astype(np.int64)
+
+    # indices à plat de tous les pixels de toutes les bandes : une ligne de bande = un segment contigu
+    sw, sh = x1 - x0, y1 - y0
+    area = sw * sh
+    row_box = np.repeat(np.arange(n), sh)
+    row_y = y0[row_box] + np.arange(sh.sum()) - np.repeat(np.cumsum(sh) - sh, sh)
+    row_len = sw[row_box]
+    starts = row_y * w + x0[row_box]
+    idx = np.repeat(starts - (np.cumsum(row_len) - row_len), row_len) + np.arange(row_len.sum())
+    box = np.repeat(row_box, row_len)
+
+    # composante -> index de voie (0 = pas une voie retenue)
+    max_id = max(r["comp_id"] for r in rails_list)
+    lut = np.zeros(max_id + 2, dtype=np.int64)
+    for k, r in enumerate(rails_list, start=1):
+        lut[r["comp_id"]] = k
+    rail = lut[np.minimum(cc_labels.reshape(-1)[idx], max_id + 1)]
+
+    k = len(rails_list) + 1
+    counts = np.bincount(box * k + rail, minlength=n * k).reshape(n, k)[:, 1:]
+    best = counts.argmax(axis=1)
+    overlap = counts[np.arange(n), best] / area
+    voies = [rails_list[j]["label"] if o >= MIN_RAIL_OVERLAP else None for j, o in zip(best, overlap)]
+    return voies, overlap
+
 def overlay_mask(frame, mask_bin):
+    # version de référence, remplacée dans la boucle par OverlayRenderer (benchmark_overlay.py)
     overlay = frame.copy()
     overlay[mask_bin > 0] = (0, 255, 0)
     return cv2.addWeighted(frame, 0.65, overlay, 0.35, 0)
@@ -116,254 +265,585 @@ def draw_rail_bbox(img, rail):
     cv2.putText(img, rail["label"], (x1, max(25, y1 - 8)),
                 cv2.FONT_HERSHEY_SIMPLEX, 0.7, (255, 255, 255), 2)
 
+def draw_rails(img, rails_list):
+    # calque statique d'OverlayRenderer
+    for r in rails_list:
+        draw_rail_bbox(img, r)
+
 
 # -----------------------------
-# HISTORIQUE (EVENTS)
+# POST-TRAITEMENT (partagé avec replay_occupancy.py)
 # -----------------------------
-def open_writers():
-    Path(OUT_JSONL_FRAMES).parent.mkdir(parents=True, exist_ok=True)
-    Path(OUT_VIDEO).parent.mkdir(parents=True, exist_ok=True)
+def union_rail_masks(masks, w, h, out=None):
+    # out : buffer (h, w) uint8 réutilisé d'une frame à l'autre au lieu d'une nouvelle allocation
+    if out is None:
+        mask_bin = np.zeros((h, w), dtype=np.uint8)
+    else:
+        mask_bin = out
+        mask_bin.fill(0)
+    for m in masks:
+        m_resized = cv2.resize(m, (w, h), interpolation=cv2.INTER_NEAREST)
+        mask_bin[m_resized > MASK_THRESH] = 255
+    return mask_bin
+
+def trains_from_boxes(xyxy, confs, track_ids, cc_labels, rails_list):
+    strip = RAIL_ASSIGN == "strip"
+    if strip:
+        voies, overlaps = rails_for_boxes(cc_labels, rails_list, xyxy)
+    trains = []
+    for i in range(len(xyxy)):
+        bbox = xyxy[i].tolist()
+        tid = int(track_ids[i]) if track_ids is not None else None
+
+        x1, y1, x2, y2 = bbox
+        px = (x1 + x2) / 2.0
+        py = y2 - POINT_OFFSET_PX
+
+        if strip:
+            voie = voies[i]
+        else:
+            voie = find_rail_for_point(cc_labels, rails_list, px, py)
+
+        train = {
+            "bbox": bbox,
+            "conf": float(confs[i]),
+            "track_id": tid,
+            "point": [float(px), float(py)],
+            "voie": voie
+        }
+        if strip:
+            train["rail_overlap"] = round(float(overlaps[i]), 3)
+        trains.append(train)
+    return trains
+
+def occupancy_from_trains(trains_ranked):
+    # occupancy_map["voie1"] = [track_id1, track_id2, ...]
+    occupancy_map = {f"voie{i}": [] for i in range(1, EXPECTED_RAILS + 1)}
+    for t in trains_ranked:
+        if t["voie"] in occupancy_map and t["track_id"] is not None:
+            occupancy_map[t["voie"]].append(t["track_id"])
+    return occupancy_map
+
+def make_event(kind, tid, from_voie, to_voie, start_f, end_f, fps):
+    start_t = start_f / float(fps)
+    end_t = end_f / float(fps)
+    return {
+        "event": kind,
+        "track_id": tid,
+        "from_voie": from_voie,
+        "to_voie": to_voie,
+        "start_frame": start_f,
+        "end_frame": end_f,
+        "start_time_s": start_t,
+        "end_time_s": end_t,
+        "duration_s": max(0.0, end_t - start_t),
+    }
+
+def update_events(trains_ranked, frame_idx, fps, last_voie, event_start_frame, presence=None):
+    """
+    Met à jour last_voie / event_start_frame et retourne les voie_change de la frame.
+    presence (track_id -> (dernière voie, dernière frame vue)) : ajoute aussi
+      - arrival   : track vu pour la première fois sur une voie (from_voie=None) ;
+      - departure : track passé par une voie et plus vu du tout depuis DEPARTURE_AFTER_S
+        (to_voie=None, bornes = dernière frame vue). Un train suivi hors du masque reste présent.
+    """
+    events = []
+    if presence is not None:
+        for t in trains_ranked:
+            tid, voie = t["track_id"], t["voie"]
+            if tid is None:
+                continue
+            if voie is None:
+                if tid in presence:
+                    presence[tid] = (presence[tid][0], frame_idx)   # garde sa dernière voie
+                continue
+            if tid not in presence:
+                events.append(make_event("arrival", tid, None, voie, frame_idx, frame_idx, fps))
+            presence[tid] = (voie, frame_idx)
+        lost = frame_idx - DEPARTURE_AFTER_S * fps
+        for tid in [tid for tid, (_, f) in presence.items() if f < lost]:
+            voie, f = presence.pop(tid)
+            events.append(make_event("departure", tid, voie, None, f, f, fps))
+    for t in trains_ranked:
+        tid = t["track_id"]
+        if tid is None:
+            continue
 
-    f_frames = open(OUT_JSONL_FRAMES, "w", encoding="utf-8")
-    f_events = open(OUT_JSONL_EVENTS, "w", encoding="utf-8")
+        current_voie = t["voie"]  # peut être None si pas sur rail
 
-    csv_frames = open(OUT_CSV_FRAMES, "w", newline="", encoding="utf-8")
-    csv_events = open(OUT_CSV_EVENTS, "w", newline="", encoding="utf-8")
+        if tid not in last_voie:
+            # première apparition
+            last_voie[tid] = current_voie
+            event_start_frame[tid] = frame_idx
+        else:
+            prev_voie = last_voie[tid]
+            if current_voie != prev_voie:
+                # on clôt l'événement précédent
+                start_f = event_start_frame.get(tid, frame_idx)
+                events.append(make_event("voie_change", tid, prev_voie, current_voie, start_f, frame_idx - 1, fps))
+
+                # nouveau segment
+                last_voie[tid] = current_voie
+                event_start_frame[tid] = frame_idx
+    return events
+
+def close_events(last_voie, event_start_frame, last_frame, fps):
+    """Événements end_of_video pour les segments encore ouverts."""
+    events = []
+    for tid, prev_voie in last_voie.items():
+        start_f = event_start_frame.get(tid, None)
+        if start_f is None:
+            continue
+        events.append(make_event("end_of_video", tid, prev_voie, None, start_f, last_frame, fps))
+    return events
 
-    frames_writer = csv.writer(csv_frames)
-    events_writer = csv.writer(csv_events)
+
+# -----------------------------
+# HISTORIQUE (EVENTS)
+# -----------------------------
+def open_writers(frames_jsonl=True):
+    """
+    Flux de sortie écrits en arrière-plan : la boucle appelle seulement .put(record).
+    frames_jsonl=False : pas de JSONL par frame (replay_occupancy.py).
+    """
+    Path(OUT_VIDEO).parent.mkdir(parents=True, exist_ok=True)
+
+    out = AsyncRecordWriter(flush_interval_s=WRITER_FLUSH_S, fsync=WRITER_FSYNC, encoder=WRITER_ENCODER,
+                            rotate_bytes=int(ROTATE_MB * 1e6) if ROTATE_MB else None,
+                            rotate_hourly=ROTATE_HOURLY)
+    frames_out = out.open_stream(OUT_JSONL_FRAMES, "jsonl") if frames_jsonl else None
+    events_out = out.open_stream(OUT_JSONL_EVENTS, "jsonl")
 
     # CSV headers
-    frames_writer.writerow(["frame", "time_s", "voie", "occupied", "train_track_ids"])
-    events_writer.writerow(["event", "track_id", "from_voie", "to_voie", "start_frame", "end_frame", "start_time_s", "end_time_s", "duration_s"])
+    frames_csv = out.open_stream(OUT_CSV_FRAMES, "csv",
+                                 header=["frame", "time_s", "voie", "occupied", "train_track_ids"])
+    events_csv = out.open_stream(OUT_CSV_EVENTS, "csv",
+                                 header=["event", "track_id", "from_voie", "to_voie", "start_frame", "end_frame", "start_time_s", "end_time_s", "duration_s"])
+
+    return out, frames_out, events_out, frames_csv, events_csv
+
+def write_frame_rows(frames_csv, frame_idx, t_s, occupancy_map):
+    for voie, ids in occupancy_map.items():
+        frames_csv.put([
+            frame_idx, f"{t_s:.3f}", voie,
+            1 if len(ids) > 0 else 0,
+            ";".join(map(str, ids))
+        ])
 
-    return f_frames, f_events, csv_frames, csv_events, frames_writer, events_writer
+def write_event(event, events_out, events_csv):
+    events_out.put(event)
+    metrics.inc("events_total", event=event["event"])
+    events_csv.put([
+        event["event"], event["track_id"],
+        event["from_voie"], event["to_voie"],
+        event["start_frame"], event["end_frame"],
+        f"{event['start_time_s']:.3f}", f"{event['end_time_s']:.3f}", f"{event['duration_s']:.3f}"
+    ])
 
 
 # -----------------------------
-# MAIN
+# PIPELINE PAR FRAME (partagé avec infer_pipeline_mp.py)
 # -----------------------------
-def main():
-    trains_model = YOLO(TRAINS_MODEL)
-    rails_model = YOLO(RAILS_MODEL)
-
-    cap = cv2.VideoCapture(SOURCE_VIDEO)
-    if not cap.isOpened():
-        raise RuntimeError(f"Impossible d'ouvrir la vidéo: {SOURCE_VIDEO}")
+def open_outputs(fps, w, h):
+    """Ouvre les sorties (vidéo, JSONL/CSV, cache) et l'état des événements."""
+    if VIDEO_MODE not in ("full", "clips", "both", "none"):
+        raise ValueError(f"VIDEO_MODE inconnu: {VIDEO_MODE!r}")
+    out, frames_out, events_out, frames_csv, events_csv = open_writers()
+    writer = None
+    if VIDEO_MODE in ("full", "both"):
+        writer = cv2.VideoWriter(OUT_VIDEO, cv2.VideoWriter_fourcc(*"mp4v"), fps, (w, h))
+    clips = None
+    if VIDEO_MODE in ("clips", "both"):
+        clips = EventClipRecorder(Path(OUT_CLIPS_DIR) / Path(SOURCE_VIDEO).stem, fps, w, h,
+                                  pre_s=CLIP_PRE_S, post_s=CLIP_POST_S, max_s=CLIP_MAX_S,
+                                  width=CLIP_WIDTH, jpeg_quality=SNAPSHOT_QUALITY)
+    renderer = OverlayRenderer(w, h, draw_rails) if writer is not None or clips is not None else None
+
+    yard = None
+    if YARD_STATE:
+        yard = YardAggregator([f"voie{i}" for i in range(1, EXPECTED_RAILS + 1)], OUT_YARD_STATE,
+                              interval_s=YARD_STATE_INTERVAL_S, start_time=YARD_START_TIME,
+                              parked_after_s=PARKED_AFTER_S, maintenance_voies=MAINTENANCE_VOIES,
+                              port=YARD_API_PORT, resume=YARD_RESUME)
+
+    det_cache = None
+    if SAVE_DET_CACHE:
+        det_cache = DetectionCacheWriter(
+            Path(OUT_DET_CACHE) / Path(SOURCE_VIDEO).stem, fps, w, h,
+            meta={"source": SOURCE_VIDEO, "trains_model": TRAINS_MODEL, "rails_model": RAILS_MODEL,
+                  "imgsz_trains": IMGSZ_TRAINS, "imgsz_rails": IMGSZ_RAILS,
+                  "conf_trains": CONF_TRAINS, "conf_rails": CONF_RAILS, "iou_trains": IOU_TRAINS,
+                  "tracker": TRACKER},
+        )
 
-    fps = cap.get(cv2.CAP_PROP_FPS) or 25.0
-    w = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
-    h = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+    return {
+        "fps": fps, "w": w, "h": h,
+        "writer": writer, "clips": clips, "renderer": renderer, "det_cache": det_cache, "yard": yard,
+        "out": out, "frames_out": frames_out, "events_out": events_out,
+        "frames_csv": frames_csv, "events_csv": events_csv,
+        # Mémoire d'événements par train (track_id)
+        # last_voie[track_id] = voie actuelle (ou None)
+        "last_voie": {},
+        # event_start_frame[track_id] = frame où la voie courante a commencé
+        "event_start_frame": {},
+        # presence[track_id] = (voie, dernière frame vue sur une voie) : arrivées / départs
+        "presence": {},
+    }
+
+def make_rail_tracker():
+    """RailTracker avec les paramètres RAIL_TRACK_* (TRACKER = "rail")."""
+    return RailTracker(gate_px=RAIL_TRACK_GATE_PX, gate_frac=RAIL_TRACK_GATE_FRAC, max_lost=RAIL_TRACK_MAX_LOST,
+                       min_hits=RAIL_TRACK_MIN_HITS, off_rail_px=RAIL_TRACK_OFF_RAIL_PX,
+                       switch_px=RAIL_TRACK_SWITCH_PX, point_offset=POINT_OFFSET_PX)
+
+def load_model(path, track=False):
+    """
+    Modèle YOLO : `.onnx` exécuté avec ONNX Runtime (OnnxYOLO, ni torch ni ultralytics importés)
+    si ONNX_RUNTIME et pas de track() Ultralytics ; sinon YOLO Ultralytics.
+    """
+    if ONNX_RUNTIME and Path(path).suffix == ".onnx" and not track and not (CASCADE or TILED):
+        from onnx_yolo import OnnxYOLO
+        return OnnxYOLO(path, cache_dir=ORT_CACHE_DIR, threads=ORT_THREADS)
+    from ultralytics import YOLO  # import local : replay_occupancy.py réutilise ce module sans torch
+    return YOLO(path)
+
+def warmup_model(model, w, h, imgsz):
+    """Inférence à vide à la taille des frames réelles (PRESCALE : frame réduite, TILED : une tuile)."""
+    from onnx_yolo import OnnxYOLO
+    if isinstance(model, OnnxYOLO):
+        model.warmup()
+        return
+    if TILED:
+        # modèle enveloppé chauffé directement : TiledModel.predict recollerait des masques vides
+        # dans le layout et compterait une frame
+        model = model.model
+        w, h = min(w, TILE_SIZE), min(h, TILE_SIZE)
+    elif PRESCALE:
+        w, h = letterbox_size(w, h, imgsz)
+    model.predict(np.zeros((h, w, 3), dtype=np.uint8), imgsz=imgsz, verbose=False)
+
+def _np(x):
+    # tenseurs Ultralytics (torch) ou tableaux numpy (OnnxYOLO)
+    return x if isinstance(x, np.ndarray) else x.cpu().numpy()
+
+def rail_masks_from_result(rr):
+    if rr.masks is not None and rr.masks.data is not None:
+        return _np(rr.masks.data)
+    return None
 
-    writer = cv2.VideoWriter(OUT_VIDEO, cv2.VideoWriter_fourcc(*"mp4v"), fps, (w, h))
-    f_frames, f_events, csv_frames, csv_events, frames_writer, events_writer = open_writers()
+def boxes_from_result(tr):
+    xyxy, confs, track_ids = np.zeros((0, 4), dtype=np.float32), np.zeros(0, dtype=np.float32), None
+    if tr.boxes is not None and len(tr.boxes) > 0:
+        xyxy = _np(tr.boxes.xyxy)
+        confs = _np(tr.boxes.conf)
+        if getattr(tr.boxes, "id", None) is not None:
+            track_ids = _np(tr.boxes.id).astype(int)
+    return xyxy, confs, track_ids
+
+def process_start_time():
+    """
+    Epoch du lancement du processus. Linux : âge lu dans /proc/self/stat (au 1/100 s ; create_time()
+    de psutil part de l'heure de boot arrondie à la seconde). Sinon psutil, sinon import de ce module.
+    """
+    try:
+        with open("/proc/self/stat", encoding="ascii") as f:
+            ticks = int(f.read().rsplit(")", 1)[1].split()[19])   # champ 22 : starttime
+        return time.time() - (time.clock_gettime(time.CLOCK_BOOTTIME) - ticks / os.sysconf("SC_CLK_TCK"))
+    except (OSError, AttributeError, ValueError):
+        pass
+    try:
+        import psutil
+        return psutil.Process().create_time()
+    except ImportError:
+        return _T_IMPORT
+
+def startup_report(startup):
+    """Durées de démarrage (s) depuis les instants relevés par main() ; None si aucune frame."""
+    if "first_result" not in startup:
+        return None
+    # premier main() du processus : depuis le lancement ; ensuite (modèles en mémoire) : depuis main()
+    t0 = process_start_time() if startup["first_run"] else startup["main"]
+    return {
+        "time_to_first_result_s": round(startup["first_result"] - t0, 3),
+        "imports_s": round(startup["main"] - t0, 3),       # interpréteur + imports jusqu'à main()
+        "models_s": round(startup["models"] - startup["main"], 3),
+        "warmup_s": round(startup["warmup"] - startup["models"], 3),
+        "first_frame_s": round(startup["first_result"] - startup["warmup"], 3),
+        "models": startup["sources"],
+        "torch_imported": "torch" in sys.modules,
+    }
+
+def postprocess_frame(ctx, frame, frame_idx, masks, mask_bin, rails_list, cc_labels, xyxy, confs, track_ids, timer):
+    """
+    Tout ce qui suit les modèles pour une frame : cache, voie par train, occupation,
+    sorties JSONL/CSV, événements, overlay et encodage.
+    """
+    fps = ctx["fps"]
+    t_s = frame_idx / float(fps)
+
+    if ctx["det_cache"] is not None:
+        ctx["det_cache"].add(xyxy, confs, track_ids, masks)
+
+    trains = trains_from_boxes(xyxy, confs, track_ids, cc_labels, rails_list)
+
+    metrics.observe("detections_per_frame", len(trains))
+
+    # Numérotation gauche->droite (train1..train6) - utile si tu en as besoin
+    trains_ranked = rank_left_to_right(
+        trains,
+        key_fn=lambda d: bbox_center_x(d["bbox"]),
+        max_slots=EXPECTED_RAILS,
+        label_prefix="train"
+    )
+
+    # 3) Construire l'occupation par voie (frame)
+    occupancy_map = occupancy_from_trains(trains_ranked)
+    if ctx["yard"] is not None:
+        ctx["yard"].update(t_s, trains_ranked, occupancy_map)
+    timer.lap("occupancy")
+
+    # Écrire le CSV par frame
+    write_frame_rows(ctx["frames_csv"], frame_idx, t_s, occupancy_map)
+
+    # Écrire le JSONL par frame (utile backend)
+    payload_frame = {
+        "frame": frame_idx,
+        "time_s": t_s,
+        "rails_detected": len(rails_list),
+        "rails": [{"rank": r["rank"], "label": r["label"], "bbox": r["bbox"]} for r in rails_list],
+        "trains": trains_ranked,
+        "occupancy": {voie: ids for voie, ids in occupancy_map.items()},
+    }
+    ctx["frames_out"].put(payload_frame)
+    timer.lap("write")
+
+    # 4) Générer des événements d'occupation (changement de voie, arrivée, départ)
+    # (mode clips : chemins du clip et du snapshot ajoutés à l'enregistrement)
+    for event in update_events(trains_ranked, frame_idx, fps, ctx["last_voie"], ctx["event_start_frame"],
+                               ctx["presence"]):
+        if ctx["clips"] is not None and event["event"] in CLIP_EVENTS:
+            # départ : snapshot de la dernière frame où le train était vu, pas DEPARTURE_AFTER_S plus tard
+            snap_f = event["end_frame"] if event["event"] == "departure" else None
+            event.update(ctx["clips"].trigger(event, frame_idx, snapshot_frame=snap_f))
+        write_event(event, ctx["events_out"], ctx["events_csv"])
+    timer.lap("events")
+
+    # 5) Overlay vidéo
+    if ctx["renderer"] is None:
+        return
+    out = ctx["renderer"].render(frame, mask_bin, rails_list)
+
+    for t in trains_ranked:
+        tid = t["track_id"]
+        voie = t["voie"] if t["voie"] is not None else "aucune"
+        txt = f"{t['lr_label']} id={tid} conf={t['conf']:.2f} -> {voie}"
+        draw_box(out, t["bbox"], txt)
+        px, py = map(int, t["point"])
+        cv2.circle(out, (px, py), 4, (0, 0, 255), -1)
+    timer.lap("overlay")
+
+    if ctx["writer"] is not None:
+        ctx["writer"].write(out)
+    if ctx["clips"] is not None:
+        ctx["clips"].push(frame_idx, out)
+    timer.lap("encode")
+
+def close_outputs(ctx, n_frames):
+    # Clôturer les événements en cours (fin vidéo)
+    for event in close_events(ctx["last_voie"], ctx["event_start_frame"], n_frames - 1, ctx["fps"]):
+        write_event(event, ctx["events_out"], ctx["events_csv"])
+
+    if ctx["writer"] is not None:
+        ctx["writer"].release()
+    if ctx["clips"] is not None:
+        ctx["clips"].close(n_frames - 1)
+    ctx["out"].close()
+    if ctx["yard"] is not None:
+        ctx["yard"].close()
+    if ctx["det_cache"] is not None:
+        ctx["det_cache"].close()
+
+def print_outputs(ctx):
+    if ctx["writer"] is not None:
+        print("📹 Overlay:", OUT_VIDEO)
+    if ctx["clips"] is not None:
+        c = ctx["clips"].summary()
+        print(f"🎬 Clips: {c['clips']} clips pour {c['events']} événements dans {ctx['clips'].dir} "
+              f"({c['frames_encoded']}/{c['frames_seen']} frames encodées, {c['encoded_ratio']:.1%}, "
+              f"anneau {c['ring_mb']:.0f} MB)")
+    print("🧾 Frames JSONL:", OUT_JSONL_FRAMES)
+    print("📊 Frames CSV  :", OUT_CSV_FRAMES)
+    print("🧾 Events JSONL:", OUT_JSONL_EVENTS)
+    print("📊 Events CSV  :", OUT_CSV_EVENTS)
+    w = ctx["out"].summary()
+    print(f"✍️ Écriture: {w['records']} records en {w['batches']} lots, file max {w['max_queue_depth']}, "
+          f"{w['stalls']} attentes, {w['fsyncs']} fsync")
+    if ctx["det_cache"] is not None:
+        print("🗃️ Cache détections:", ctx["det_cache"].dir)
+    if ctx["yard"] is not None:
+        print("🏗️ État du triage:", OUT_YARD_STATE, f"({ctx['yard'].writes} écritures)")
+        if YARD_API_PORT:
+            print(f"🌐 API dashboard: http://127.0.0.1:{YARD_API_PORT}/api/state")
 
-    # Mémoire d'événements par train (track_id)
-    # last_voie[track_id] = voie actuelle (ou None)
-    last_voie = {}
-    # event_start_frame[track_id] = frame où la voie courante a commencé
-    event_start_frame = {}
 
+# -----------------------------
+# MAIN
+# -----------------------------
+def main(timer=None):
+    # timer: StageTimer optionnel (benchmark_inference.py), sinon métriques (YARD_METRICS=1) ou aucun coût
+    global _MAIN_RUNS
+    startup = {"main": time.time(), "first_run": _MAIN_RUNS == 0}   # instants du démarrage (startup_report)
+    _MAIN_RUNS += 1
+    timer = timer or metrics.timer()
+    metrics.start(script="infer_trains_and_rails_with_history")
+    metrics.set_gauge("rails_expected", EXPECTED_RAILS)
+
+    rail_tracker = make_rail_tracker() if TRACKER == "rail" else None
+    if rail_tracker is not None and CASCADE:
+        raise ValueError('TRACKER = "rail" et CASCADE ne se combinent pas (la cascade suit avec un YAML Ultralytics)')
+    if TILED and CASCADE:
+        raise ValueError("TILED et CASCADE ne se combinent pas : choisir l'un des deux")
+
+    # décodage lancé avant le chargement des modèles : les premières frames sont prêtes quand ils le sont
+    # TILED : les tuiles sont découpées dans la frame pleine résolution, pas de réduction
+    prescale = [IMGSZ_RAILS, IMGSZ_TRAINS] if PRESCALE and not TILED else []
+    cap = FrameSource(SOURCE_VIDEO, backend=DECODER, prescale=prescale,
+                      gray_width=MOTION_WIDTH if MOTION_GATE else None, prefetch=PREFETCH)
+    fps, w, h = cap.fps, cap.w, cap.h
+
+    if CASCADE:
+        from cascade_detector import CascadeTracker
+        trains_model = CascadeTracker(TRAINS_MODEL_FAST, TRAINS_MODEL, CASCADE_CONF_LOW, CASCADE_CONF_HIGH)
+    else:
+        trains_model = load_model(TRAINS_MODEL, track=rail_tracker is None)
+    rails_model = load_model(RAILS_MODEL)
+    startup["sources"] = {"trains": getattr(trains_model, "load_source", "ultralytics"),
+                          "rails": getattr(rails_model, "load_source", "ultralytics")}
+
+    if TILED:
+        from tiled_inference import TiledModel
+        rails_model = TiledModel(rails_model, TILE_SIZE, TILE_OVERLAP)
+        trains_model = TiledModel(trains_model, TILE_SIZE, TILE_OVERLAP)
+    startup["models"] = time.time()
+
+    if WARMUP:
+        warmup_model(rails_model, w, h, IMGSZ_RAILS)
+        if not CASCADE:
+            warmup_model(trains_model, w, h, IMGSZ_TRAINS)
+    startup["warmup"] = time.time()
+
+    ctx = open_outputs(fps, w, h)
+
+    gate = None
+    if MOTION_GATE:
+        gate = MotionGate(MOTION_WIDTH, MOTION_PIXEL_THRESH, MOTION_FRAC, MOTION_MAX_SKIP)
+
+    mask_buf = np.zeros((h, w), dtype=np.uint8)
     frame_idx = 0
     print("🚀 MODELS")
     print("  trains:", TRAINS_MODEL)
     print("  rails :", RAILS_MODEL)
-    print("🎥 SOURCE:", SOURCE_VIDEO)
+    print("🎥 SOURCE:", SOURCE_VIDEO, f"(décodeur {cap.backend})")
 
     while True:
-        ret, frame = cap.read()
-        if not ret:
+        timer.start()
+        pkt = cap.read()
+        if pkt is None:
             break
+        frame_idx = pkt.idx   # index dans la vidéo (frame illisible sautée : trou, pas de décalage)
+        frame = pkt.frame
+        timer.lap("decode")
 
-        t_s = frame_idx / float(fps)
+        # 0) Motion gate : sans mouvement, on garde rr/tr et les rails de la frame précédente
+        run_models = gate is None or gate.should_run(pkt.gray)
+        if gate is not None:
+            timer.lap("gate")
+            if not run_models:
+                metrics.inc("gated_frames_total")
 
         # 1) Rails seg -> mask_bin + rails_list
-        rr = rails_model.predict(frame, imgsz=IMGSZ_RAILS, conf=CONF_RAILS, verbose=False)[0]
-        mask_bin = np.zeros((h, w), dtype=np.uint8)
-
-        if rr.masks is not None and rr.masks.data is not None:
-            masks = rr.masks.data.cpu().numpy()
-            for m in masks:
-                m_resized = cv2.resize(m, (w, h), interpolation=cv2.INTER_NEAREST)
-                mask_bin[m_resized > MASK_THRESH] = 255
-
-        rails_list, cc_labels = connected_components_rails(mask_bin, expected=EXPECTED_RAILS, min_area=MIN_AREA_RAIL)
-
-        # 2) Trains detect+track
-        tr = trains_model.track(
-            frame,
-            imgsz=IMGSZ_TRAINS,
-            conf=CONF_TRAINS,
-            iou=IOU_TRAINS,
-            tracker=TRACKER,
-            persist=True,
-            verbose=False
-        )[0]
-
-        trains = []
-        if tr.boxes is not None and len(tr.boxes) > 0:
-            xyxy = tr.boxes.xyxy.cpu().numpy()
-            confs = tr.boxes.conf.cpu().numpy()
-            track_ids = None
-            if getattr(tr.boxes, "id", None) is not None:
-                track_ids = tr.boxes.id.cpu().numpy().astype(int)
-
-            for i in range(len(xyxy)):
-                bbox = xyxy[i].tolist()
-                tid = int(track_ids[i]) if track_ids is not None else None
-
-                x1, y1, x2, y2 = bbox
-                px = (x1 + x2) / 2.0
-                py = y2 - POINT_OFFSET_PX
-
-                voie = find_rail_for_point(cc_labels, rails_list, px, py)
-
-                trains.append({
-                    "bbox": bbox,
-                    "conf": float(confs[i]),
-                    "track_id": tid,
-                    "point": [float(px), float(py)],
-                    "voie": voie
-                })
-
-        # Numérotation gauche->droite (train1..train6) - utile si tu en as besoin
-        trains_ranked = rank_left_to_right(
-            trains,
-            key_fn=lambda d: bbox_center_x(d["bbox"]),
-            max_slots=EXPECTED_RAILS,
-            label_prefix="train"
-        )
-
-        # 3) Construire l'occupation par voie (frame)
-        # occupancy_map["voie1"] = [track_id1, track_id2, ...]
-        occupancy_map = {f"voie{i}": [] for i in range(1, EXPECTED_RAILS + 1)}
-        for t in trains_ranked:
-            if t["voie"] in occupancy_map and t["track_id"] is not None:
-                occupancy_map[t["voie"]].append(t["track_id"])
-
-        # Écrire le CSV par frame
-        for voie, ids in occupancy_map.items():
-            frames_writer.writerow([
-                frame_idx, f"{t_s:.3f}", voie,
-                1 if len(ids) > 0 else 0,
-                ";".join(map(str, ids))
-            ])
-
-        # Écrire le JSONL par frame (utile backend)
-        payload_frame = {
-            "frame": frame_idx,
-            "time_s": t_s,
-            "rails_detected": len(rails_list),
-            "rails": [{"rank": r["rank"], "label": r["label"], "bbox": r["bbox"]} for r in rails_list],
-            "trains": trains_ranked,
-            "occupancy": {voie: ids for voie, ids in occupancy_map.items()},
-        }
-        f_frames.write(json.dumps(payload_frame, ensure_ascii=False) + "\n")
-
-        # 4) Générer des événements d'occupation (quand un train change de voie)
-        for t in trains_ranked:
-            tid = t["track_id"]
-            if tid is None:
-                continue
-
-            current_voie = t["voie"]  # peut être None si pas sur rail
-
-            if tid not in last_voie:
-                # première apparition
-                last_voie[tid] = current_voie
-                event_start_frame[tid] = frame_idx
+        if run_models:
+            rr = rails_model.predict(pkt.model_input(IMGSZ_RAILS), imgsz=IMGSZ_RAILS, conf=CONF_RAILS, verbose=False)[0]
+            timer.lap("rail_predict")
+            masks = rail_masks_from_result(rr)
+            mask_bin = union_rail_masks(masks if masks is not None else [], w, h, out=mask_buf)
+            timer.lap("mask_union")
+
+            rails_list, cc_labels = connected_components_rails(mask_bin, expected=EXPECTED_RAILS, min_area=MIN_AREA_RAIL)
+            timer.lap("connected_components")
+            if gate is not None:
+                gate.set_roi(mask_bin)
+            if TILED:
+                trains_model.set_layout(mask_bin)
+        metrics.set_gauge("rails_detected", len(rails_list))
+        if len(rails_list) != EXPECTED_RAILS:
+            metrics.inc("rails_mismatch_total")
+
+        # 2) Trains detect+track (tracker "rail" : détection seule, suivi le long des voies ensuite)
+        if run_models:
+            if rail_tracker is None:
+                tr = trains_model.track(
+                    pkt.model_input(IMGSZ_TRAINS),
+                    imgsz=IMGSZ_TRAINS,
+                    conf=CONF_TRAINS,
+                    iou=IOU_TRAINS,
+                    tracker=TRACKER,
+                    persist=True,
+                    verbose=False
+                )[0]
             else:
-                prev_voie = last_voie[tid]
-                if current_voie != prev_voie:
-                    # on clôt l'événement précédent
-                    start_f = event_start_frame.get(tid, frame_idx)
-                    end_f = frame_idx - 1
-                    start_t = start_f / float(fps)
-                    end_t = end_f / float(fps)
-                    dur = max(0.0, end_t - start_t)
-
-                    event = {
-                        "event": "voie_change",
-                        "track_id": tid,
-                        "from_voie": prev_voie,
-                        "to_voie": current_voie,
-                        "start_frame": start_f,
-                        "end_frame": end_f,
-                        "start_time_s": start_t,
-                        "end_time_s": end_t,
-                        "duration_s": dur,
-                    }
-                    f_events.write(json.dumps(event, ensure_ascii=False) + "\n")
-                    events_writer.writerow([
-                        event["event"], tid,
-                        prev_voie, current_voie,
-                        start_f, end_f,
-                        f"{start_t:.3f}", f"{end_t:.3f}", f"{dur:.3f}"
-                    ])
-
-                    # nouveau segment
-                    last_voie[tid] = current_voie
-                    event_start_frame[tid] = frame_idx
-
-        # 5) Overlay vidéo
-        out = overlay_mask(frame, mask_bin)
-        for r in rails_list:
-            draw_rail_bbox(out, r)
-
-        for t in trains_ranked:
-            tid = t["track_id"]
-            voie = t["voie"] if t["voie"] is not None else "aucune"
-            txt = f"{t['lr_label']} id={tid} conf={t['conf']:.2f} -> {voie}"
-            draw_box(out, t["bbox"], txt)
-            px, py = map(int, t["point"])
-            cv2.circle(out, (px, py), 4, (0, 0, 255), -1)
-
-        writer.write(out)
+                # TILED : TiledModel.detect (predict() y est le chemin segmentation, masques recollés)
+                detect = trains_model.detect if TILED else trains_model.predict
+                tr = detect(pkt.model_input(IMGSZ_TRAINS), imgsz=IMGSZ_TRAINS,
+                            conf=CONF_TRAINS, iou=IOU_TRAINS, verbose=False)[0]
+            timer.lap("track")
+        xyxy, confs, track_ids = boxes_from_result(tr)
+        xyxy = pkt.to_full(xyxy, IMGSZ_TRAINS)
+        if rail_tracker is not None:
+            # frame sans appel modèle (motion gate) : on reprend les IDs de la frame précédente
+            if run_models:
+                rail_out = rail_tracker.update(frame_idx, xyxy, confs, cc_labels, rails_list)
+                timer.lap("rail_track")
+            xyxy, confs, track_ids = rail_out
+
+        # 3) à 5) occupation, sorties, événements, overlay
+        postprocess_frame(ctx, frame, frame_idx, masks, mask_bin, rails_list, cc_labels,
+                          xyxy, confs, track_ids, timer)
+        timer.end_frame()
+        if "first_result" not in startup:
+            startup["first_result"] = time.time()
+            st = startup_report(startup)
+            metrics.set_gauge("time_to_first_result_seconds", st["time_to_first_result_s"])
+            print(f"⏱️ Premier résultat {st['time_to_first_result_s']:.3f} s après le lancement "
+                  f"(imports {st['imports_s']:.3f} s, modèles {st['models_s']:.3f} s {st['models']}, "
+                  f"warm-up {st['warmup_s']:.3f} s, 1re frame {st['first_frame_s']:.3f} s)")
 
         frame_idx += 1
         if frame_idx % 50 == 0:
             print(f"Processed {frame_idx} frames...")
 
-    # Clôturer les événements en cours (fin vidéo)
-    last_frame = frame_idx - 1
-    for tid, prev_voie in last_voie.items():
-        start_f = event_start_frame.get(tid, None)
-        if start_f is None:
-            continue
-        end_f = last_frame
-        start_t = start_f / float(fps)
-        end_t = end_f / float(fps)
-        dur = max(0.0, end_t - start_t)
-        event = {
-            "event": "end_of_video",
-            "track_id": tid,
-            "from_voie": prev_voie,
-            "to_voie": None,
-            "start_frame": start_f,
-            "end_frame": end_f,
-            "start_time_s": start_t,
-            "end_time_s": end_t,
-            "duration_s": dur,
-        }
-        f_events.write(json.dumps(event, ensure_ascii=False) + "\n")
-        events_writer.writerow([
-            event["event"], tid, prev_voie, None,
-            start_f, end_f, f"{start_t:.3f}", f"{end_t:.3f}", f"{dur:.3f}"
-        ])
-
     cap.release()
-    writer.release()
-    f_frames.close()
-    f_events.close()
-    csv_frames.close()
-    csv_events.close()
-
+    close_outputs(ctx, frame_idx)
+
+    if gate is not None:
+        g = gate.summary()
+        print(f"🚦 Motion gate: {g['skipped']}/{g['frames']} frames sans appel modèle ({g['skip_ratio']:.1%})")
+    if CASCADE:
+        c = trains_model.summary()
+        print(f"🪜 Cascade: {c['escalated']}/{c['frames']} frames vers le modèle complet "
+              f"({c['escalation_ratio']:.1%}) {c['reasons']}")
+    if rail_tracker is not None:
+        r = rail_tracker.summary()
+        print(f"🛤️ Tracker rail: {r['tracks']} IDs, {r['rails']} voies, {r['recovered']} reprises après occultation, "
+              f"{r['switch_transfers']} changements de voie à un aiguillage")
+    if TILED:
+        t = rails_model.summary()
+        print(f"🧩 Tuiles rails sautées: {t['tiles_skipped']}/{t['tiles_run'] + t['tiles_skipped']} ({t['skip_ratio']:.1%})")
+        t = trains_model.summary()
+        print(f"🧩 Tuiles trains sautées: {t['tiles_skipped']}/{t['tiles_run'] + t['tiles_skipped']} ({t['skip_ratio']:.1%})")
     print("✅ Done.")
-    print("📹 Overlay:", OUT_VIDEO)
-    print("🧾 Frames JSONL:", OUT_JSONL_FRAMES)
-    print("📊 Frames CSV  :", OUT_CSV_FRAMES)
-    print("🧾 Events JSONL:", OUT_JSONL_EVENTS)
-    print("📊 Events CSV  :", OUT_CSV_EVENTS)
+    print_outputs(ctx)
+    return startup_report(startup)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,329 @@
+import heapq
+import json
+import time
+from pathlib import Path
+
+import cv2
+import numpy as np
+
+import infer_trains_and_rails_with_history as pipeline
+from frame_source import FrameSource
+from motion_gate import MotionGate
+
+
+# -----------------------------
+# CONFIG
+# -----------------------------
+VIDEOS = [Path("1_datasets/tracking_videos")]   # fichiers vidéo ou dossiers
+VIDEO_EXTS = {".mp4", ".avi", ".mov", ".mkv"}
+
+TRAINS_MODEL = pipeline.TRAINS_MODEL
+RAILS_MODEL = pipeline.RAILS_MODEL
+IMGSZ = 640
+CONF_LOW = 0.10           # seuil de prédiction bas : les détections incertaines doivent sortir
+TRACKER = pipeline.TRACKER if pipeline.TRACKER != "rail" else "botsort.yaml"   # YAML Ultralytics (flicker)
+EXPECTED_RAILS = pipeline.EXPECTED_RAILS
+
+OUT_DIR = Path("0_raw")                       # frames retenues, à annoter
+MANIFEST = OUT_DIR / "mined_frames.jsonl"     # une ligne par frame retenue (tous les runs)
+
+TOP_K = 200               # frames gardées par run
+MEMORY_MB = 512           # budget des candidates en mémoire (JPEG encodés)
+JPEG_QUALITY = 95
+
+# Débit : frames analysées par seconde de vidéo (les autres sont seulement décodées),
+# et frames sans mouvement sautées (motion gate sur la frame réduite)
+SAMPLE_FPS = 2.0
+MOTION_GATE = True
+MOTION_WIDTH = 320
+DECODER = "auto"
+PREFETCH = 8
+
+# Score d'incertitude = somme pondérée de composantes dans [0, 1]
+WEIGHTS = {
+    "conf": 1.0,          # détection proche de 0.5 (max sur les boîtes de la frame)
+    "rails": 1.0,         # |rails_detected - EXPECTED_RAILS| / EXPECTED_RAILS
+    "flicker": 0.25,      # IDs apparus/disparus depuis la frame analysée précédente (bruité : frames espacées)
+    "disagreement": 1.0,  # désaccord entre la passe normale et une passe miroir (flip horizontal)
+}
+MIN_SCORE = 0.3
+
+# Diversité
+PHASH_DIST = 8            # distance de Hamming (sur 64 bits) en dessous de laquelle deux frames sont des doublons
+MIN_GAP_S = 2.0           # écart minimal entre deux frames gardées d'une même vidéo
+
+
+# -----------------------------
+# HASH PERCEPTUEL
+# -----------------------------
+def phash(gray):
+    """pHash 64 bits : DCT du 32x32, bits = coefficients 8x8 basse fréquence > médiane."""
+    small = cv2.resize(gray, (32, 32), interpolation=cv2.INTER_AREA).astype(np.float32)
+    low = cv2.dct(small)[:8, :8].flatten()
+    bits = low > np.median(low[1:])
+    return int.from_bytes(np.packbits(bits).tobytes(), "big")
+
+
+# -----------------------------
+# INCERTITUDE
+# -----------------------------
+def conf_uncertainty(confs):
+    if len(confs) == 0:
+        return 0.0
+    return float(np.max(1.0 - np.abs(2.0 * confs - 1.0)))
+
+
+def rails_uncertainty(rr, w, h, full_area):
+    """Écart au nombre de voies attendu, composantes calculées à la taille du modèle."""
+    masks = pipeline.rail_masks_from_result(rr)
+    mask_bin = pipeline.union_rail_masks(masks if masks is not None else [], w, h)
+    min_area = pipeline.MIN_AREA_RAIL * (w * h) / float(full_area)
+    rails_list, _ = pipeline.connected_components_rails(mask_bin, expected=EXPECTED_RAILS, min_area=min_area)
+    return min(1.0, abs(len(rails_list) - EXPECTED_RAILS) / float(EXPECTED_RAILS)), len(rails_list)
+
+
+def make_tracker(frame_rate):
+    """
+    Tracker Ultralytics (même construction que cascade_detector.py) à la cadence des frames analysées :
+    son tampon de tracks perdues (track_buffer x frame_rate / 30 frames) garde ainsi la même durée
+    en secondes de vidéo qu'en ligne, au lieu de 30x plus à SAMPLE_FPS = 2.
+    """
+    import yaml
+    from ultralytics.trackers.track import TRACKER_MAP
+    from ultralytics.utils import IterableSimpleNamespace
+    from ultralytics.utils.checks import check_yaml
+
+    cfg = IterableSimpleNamespace(**yaml.safe_load(Path(check_yaml(TRACKER)).read_text(encoding="utf-8")))
+    return TRACKER_MAP[cfg.tracker_type](args=cfg, frame_rate=max(1, int(round(frame_rate))))
+
+
+def tracked_ids(tracker, tr, img):
+    """IDs des tracks de la frame ; frame sans détection : tracker non appelé (comme YOLO.track())."""
+    if tr.boxes is None or len(tr.boxes) == 0:
+        return set()
+    tracks = tracker.update(tr.boxes.cpu().numpy(), img)
+    return set(tracks[:, 4].astype(int).tolist()) if len(tracks) else set()
+
+
+def flicker(ids, prev_ids):
+    union = ids | prev_ids
+    return len(ids ^ prev_ids) / len(union) if union else 0.0
+
+
+def iou_matrix(a, b):
+    x1 = np.maximum(a[:, None, 0], b[None, :, 0])
+    y1 = np.maximum(a[:, None, 1], b[None, :, 1])
+    x2 = np.minimum(a[:, None, 2], b[None, :, 2])
+    y2 = np.minimum(a[:, None, 3], b[None, :, 3])
+    inter = np.clip(x2 - x1, 0, None) * np.clip(y2 - y1, 0, None)
+    area_a = (a[:, 2] - a[:, 0]) * (a[:, 3] - a[:, 1])
+    area_b = (b[:, 2] - b[:, 0]) * (b[:, 3] - b[:, 1])
+    return inter / np.maximum(area_a[:, None] + area_b[None, :] - inter, 1e-9)
+
+
+def disagreement(model, img, xyxy):
+    """Passe miroir : 1 - part des boîtes appariées (IoU >= 0.5) entre les deux passes."""
+    w = img.shape[1]
+    flipped = model.predict(cv2.flip(img, 1), imgsz=IMGSZ, conf=CONF_LOW, verbose=False)[0]
+    fx, _, _ = pipeline.boxes_from_result(flipped)
+    if len(fx):
+        fx = np.stack([w - fx[:, 2], fx[:, 1], w - fx[:, 0], fx[:, 3]], axis=1)
+    n = len(xyxy) + len(fx)
+    if n == 0:
+        return 0.0
+    if len(xyxy) == 0 or len(fx) == 0:
+        return 1.0
+    iou = iou_matrix(np.asarray(xyxy, dtype=np.float64), fx.astype(np.float64))
+    matched = 0
+    while iou.size and iou.max() >= 0.5:
+        i, j = np.unravel_index(np.argmax(iou), iou.shape)
+        matched += 1
+        iou[i, :] = 0
+        iou[:, j] = 0
+    return 1.0 - 2.0 * matched / n
+
+
+def score_of(parts):
+    return sum(WEIGHTS[k] * v for k, v in parts.items())
+
+
+# -----------------------------
+# TOP-K DIVERSIFIÉ
+# -----------------------------
+class TopK:
+    """
+    Meilleures frames par score, mémoire bornée (`k` frames et `budget` octets de JPEG).
+    Une candidate proche (pHash ou même vidéo à moins de MIN_GAP_S) d'une frame gardée
+    la remplace si son score est plus haut, sinon elle est ignorée.
+    """
+
+    def __init__(self, k, budget_bytes, prior_hashes=()):
+        self.k = k
+        self.budget = budget_bytes
+        self.prior = list(prior_hashes)    # frames déjà minées lors des runs précédents
+        self.items = {}                    # seq -> entrée
+        self.heap = []                     # (score, seq), suppression paresseuse
+        self.bytes = 0
+        self.seq = 0
+        self.replaced = 0
+        self.duplicates = 0
+
+    def full(self):
+        return len(self.items) >= self.k or self.bytes >= self.budget
+
+    def min_score(self):
+        while self.heap and self.heap[0][1] not in self.items:
+            heapq.heappop(self.heap)
+        return self.heap[0][0] if self.heap else 0.0
+
+    def _near(self, entry):
+        h = entry["phash"]
+        return [s for s, it in self.items.items()
+                if (it["phash"] ^ h).bit_count() <= PHASH_DIST
+                or (it["video"] == entry["video"] and abs(it["time_s"] - entry["time_s"]) < MIN_GAP_S)]
+
+    def _remove(self, seq):
+        self.bytes -= len(self.items.pop(seq)["jpeg"])
+
+    def offer(self, entry, frame):
+        h = entry["phash"]
+        if any((p ^ h).bit_count() <= PHASH_DIST for p in self.prior):
+            self.duplicates += 1
+            return False
+        near = self._near(entry)
+        if any(self.items[s]["score"] >= entry["score"] for s in near):
+            self.duplicates += 1
+            return False
+        for s in near:
+            self._remove(s)
+            self.replaced += 1
+
+        ok, buf = cv2.imencode(".jpg", frame, [cv2.IMWRITE_JPEG_QUALITY, JPEG_QUALITY])
+        if not ok:
+            return False
+        entry["jpeg"] = buf.tobytes()
+        self.seq += 1
+        self.items[self.seq] = entry
+        self.bytes += len(entry["jpeg"])
+        heapq.heappush(self.heap, (entry["score"], self.seq))
+
+        while len(self.items) > self.k or self.bytes > self.budget:
+            self.min_score()
+            _, seq = heapq.heappop(self.heap)
+            self._remove(seq)
+        return True
+
+    def sorted(self):
+        return sorted(self.items.values(), key=lambda e: -e["score"])
+
+
+# -----------------------------
+# MAIN
+# -----------------------------
+def list_videos():
+    videos = []
+    for p in VIDEOS:
+        p = Path(p)
+        if p.is_dir():
+            videos += sorted(f for f in p.iterdir() if f.suffix.lower() in VIDEO_EXTS)
+        elif p.exists():
+            videos.append(p)
+    return videos
+
+
+def load_prior_hashes():
+    if not MANIFEST.exists():
+        return []
+    with open(MANIFEST, encoding="utf-8") as f:
+        return [int(json.loads(line)["phash"], 16) for line in f if line.strip()]
+
+
+def mine_video(path: Path, trains_model, rails_model, top):
+    stats = {"video": str(path), "decoded": 0, "analysed": 0, "gated": 0, "tta": 0}
+    probe = cv2.VideoCapture(str(path))
+    fps = probe.get(cv2.CAP_PROP_FPS) or 25.0
+    probe.release()
+    stride = max(1, int(round(fps / SAMPLE_FPS)))
+    cap = FrameSource(path, backend=DECODER, prescale=[IMGSZ],
+                      gray_width=MOTION_WIDTH if MOTION_GATE else None, prefetch=PREFETCH, stride=stride)
+    gate = MotionGate(MOTION_WIDTH) if MOTION_GATE else None
+    tracker = make_tracker(fps / stride)   # un tracker neuf par vidéo
+    prev_ids = set()
+
+    t0 = time.perf_counter()
+    for pkt in cap:
+        stats["decoded"] += 1
+        if gate is not None and not gate.should_run(pkt.gray):
+            stats["gated"] += 1
+            continue
+        stats["analysed"] += 1
+        img = pkt.model_input(IMGSZ)
+        sh, sw = img.shape[:2]
+
+        tr = trains_model.predict(img, imgsz=IMGSZ, conf=CONF_LOW, verbose=False)[0]
+        xyxy, confs, _ = pipeline.boxes_from_result(tr)
+        rr = rails_model.predict(img, imgsz=IMGSZ, conf=pipeline.CONF_RAILS, verbose=False)[0]
+
+        ids = tracked_ids(tracker, tr, img)
+        parts = {"conf": conf_uncertainty(confs), "flicker": flicker(ids, prev_ids)}
+        prev_ids = ids
+        parts["rails"], n_rails = rails_uncertainty(rr, sw, sh, cap.w * cap.h)
+
+        # passe miroir seulement si elle peut faire entrer la frame dans le top-K
+        bound = score_of(parts) + WEIGHTS["disagreement"]
+        if bound < MIN_SCORE or (top.full() and bound <= top.min_score()):
+            continue
+        parts["disagreement"] = disagreement(trains_model, img, xyxy)
+        stats["tta"] += 1
+        score = score_of(parts)
+        if score < MIN_SCORE or (top.full() and score <= top.min_score()):
+            continue
+
+        gray = pkt.gray if pkt.gray is not None else cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
+        entry = {"video": str(path), "frame": pkt.idx, "time_s": round(pkt.idx / fps, 3),
+                 "score": round(score, 4), "parts": {k: round(v, 4) for k, v in parts.items()},
+                 "detections": len(confs), "rails_detected": n_rails, "phash": phash(gray)}
+        top.offer(entry, pkt.frame)
+    cap.release()
+
+    el = time.perf_counter() - t0
+    stats["video_s"] = round(stats["decoded"] * stride / fps, 1)
+    stats["speed_x"] = round(stats["video_s"] / el, 1) if el else None
+    return stats
+
+
+def main():
+    from ultralytics import YOLO
+
+    videos = list_videos()
+    if not videos:
+        raise SystemExit(f"\n❌ Aucune vidéo dans {VIDEOS}\n")
+
+    top = TopK(TOP_K, MEMORY_MB * 1024 * 1024, load_prior_hashes())
+    print(f"⛏️ {len(videos)} vidéos, top {TOP_K} frames, {len(top.prior)} frames déjà minées")
+
+    trains_model = YOLO(TRAINS_MODEL)
+    rails_model = YOLO(RAILS_MODEL)
+    all_stats = []
+    for path in videos:
+        s = mine_video(path, trains_model, rails_model, top)
+        all_stats.append(s)
+        print(f"🎥 {path.name}: {s['video_s']} s de vidéo, {s['analysed']} frames analysées "
+              f"({s['gated']} sans mouvement, {s['tta']} passes miroir), x{s['speed_x']} temps réel")
+
+    OUT_DIR.mkdir(parents=True, exist_ok=True)
+    kept = top.sorted()
+    run = time.strftime("%Y-%m-%dT%H:%M:%S")
+    with open(MANIFEST, "a", encoding="utf-8") as f:
+        for e in kept:
+            name = f"{Path(e['video']).stem}_f{e['frame']:07d}.jpg"
+            (OUT_DIR / name).write_bytes(e.pop("jpeg"))
+            e.update({"file": name, "phash": f"{e['phash']:016x}", "run": run})
+            f.write(json.dumps(e, ensure_ascii=False) + "\n")
+
+    print(f"✅ {len(kept)} frames écrites dans {OUT_DIR} ({top.duplicates} doublons écartés, {top.replaced} remplacées)")
+    print("🧾 Manifest:", MANIFEST)
+
+
+if __name__ == "__main__":
+    main()
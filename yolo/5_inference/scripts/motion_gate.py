@@ -0,0 +1,87 @@
+import cv2
+import numpy as np
+
+
+# -----------------------------
+# MOTION GATE
+# -----------------------------
+class MotionGate:
+    """
+    Décide si une frame justifie un appel aux modèles.
+
+    La frame est réduite (largeur `width`, niveaux de gris, flou léger) puis comparée
+    à la dernière frame pour laquelle les modèles ont tourné, uniquement dans la ROI
+    des rails (masque rails dilaté). Si la part de pixels qui changent reste sous
+    `motion_frac`, la frame est "sautée" : le script réutilise les sorties précédentes.
+    Au plus `max_skip` frames consécutives sont sautées (sécurité).
+
+    La comparaison se fait avec la frame de référence (dernier appel modèle) et non la
+    frame précédente : une dérive lente (lumière, train très lent) finit par déclencher.
+    """
+
+    def __init__(self, width=320, pixel_thresh=18, motion_frac=0.002, max_skip=50, roi_dilate_px=15):
+        self.width = width
+        self.pixel_thresh = pixel_thresh
+        self.motion_frac = motion_frac
+        self.max_skip = max_skip
+        self.roi_dilate_px = roi_dilate_px
+
+        self.ref = None
+        self.roi = None          # bool (gh, gw), None = toute l'image
+        self.roi_count = 0
+        self.skipped_in_row = 0
+        self.frames = 0
+        self.skipped = 0
+        self.last_motion = 0.0
+
+    def _small(self, frame):
+        h, w = frame.shape[:2]
+        gh = max(1, round(h * self.width / w))
+        small = cv2.resize(frame, (self.width, gh), interpolation=cv2.INTER_AREA)
+        if small.ndim == 3:
+            small = cv2.cvtColor(small, cv2.COLOR_BGR2GRAY)
+        return cv2.GaussianBlur(small, (5, 5), 0)
+
+    def set_roi(self, mask_bin):
+        """ROI = masque rails (pleine résolution) réduit et dilaté ; masque vide -> toute l'image."""
+        if mask_bin is None or not mask_bin.any():
+            self.roi, self.roi_count = None, 0
+            return
+        h, w = mask_bin.shape[:2]
+        gh = max(1, round(h * self.width / w))
+        roi = cv2.resize(mask_bin, (self.width, gh), interpolation=cv2.INTER_NEAREST)
+        r = max(1, round(self.roi_dilate_px * self.width / w))
+        roi = cv2.dilate(roi, cv2.getStructuringElement(cv2.MORPH_ELLIPSE, (2 * r + 1, 2 * r + 1)))
+        self.roi = roi > 0
+        self.roi_count = int(self.roi.sum())
+
+    def should_run(self, frame):
+        self.frames += 1
+        small = self._small(frame)
+
+        if self.ref is not None and self.ref.shape == small.shape and self.skipped_in_row < self.max_skip:
+            moving = cv2.absdiff(small, self.ref) > self.pixel_thresh
+            if self.roi is not None:
+                self.last_motion = np.count_nonzero(moving & self.roi) / max(1, self.roi_count)
+            else:
+                self.last_motion = np.count_nonzero(moving) / moving.size
+            if self.last_motion < self.motion_frac:
+                self.skipped_in_row += 1
+                self.skipped += 1
+                return False
+
+        self.ref = small
+        self.skipped_in_row = 0
+        return True
+
+    @property
+    def skip_ratio(self):
+        return self.skipped / self.frames if self.frames else 0.0
+
+    def summary(self):
+        return {
+            "frames": self.frames,
+            "skipped": self.skipped,
+            "skip_ratio": round(self.skip_ratio, 4),
+            "max_skip": self.max_skip,
+        }
@@ -0,0 +1,200 @@
+import ast
+import hashlib
+import os
+import platform
+import time
+from pathlib import Path
+
+import cv2
+import numpy as np
+
+
+# Sessions déjà ouvertes dans ce processus (plusieurs main() d'affilée : évaluation, benchmarks)
+_SESSIONS = {}
+
+
+# -----------------------------
+# SESSIONS
+# -----------------------------
+def load_session(path, cache_dir=None, threads=None):
+    """
+    Session ONNX Runtime (CPU), mise en cache :
+      - en mémoire : un seul chargement par (modèle, threads) et par processus ;
+      - sur disque (`cache_dir`) : graphe optimisé écrit au premier chargement, rechargé ensuite
+        sans repasser par les fusions. Clé = chemin, taille, mtime du modèle + version d'ORT + machine.
+    Retourne (session, secondes de chargement, "memory" | "disk" | "built").
+    """
+    import onnxruntime as ort  # import local : seul module lourd de ce chemin (ni torch ni ultralytics)
+
+    path = Path(path).resolve()
+    key = (str(path), threads)
+    if key in _SESSIONS:
+        return _SESSIONS[key], 0.0, "memory"
+
+    t0 = time.perf_counter()
+    so = ort.SessionOptions()
+    if threads:
+        so.intra_op_num_threads = threads
+    providers = ["CPUExecutionProvider"]
+    source = "built"
+    if cache_dir is None:
+        so.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        sess = ort.InferenceSession(str(path), so, providers=providers)
+    else:
+        st = path.stat()
+        tag = f"{path}|{st.st_size}|{st.st_mtime_ns}|{ort.__version__}|{platform.machine()}"
+        opt = Path(cache_dir) / f"{path.stem}.{hashlib.sha1(tag.encode()).hexdigest()[:16]}.onnx"
+        if not opt.exists():
+            # graphe écrit au niveau EXTENDED (fusions, constantes repliées) : portable d'un CPU à l'autre,
+            # contrairement aux transformations de layout de ORT_ENABLE_ALL, refaites (peu coûteuses) au chargement
+            opt.parent.mkdir(parents=True, exist_ok=True)
+            tmp = opt.with_suffix(f".{os.getpid()}.tmp")
+            build = ort.SessionOptions()
+            build.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_EXTENDED
+            build.optimized_model_filepath = str(tmp)
+            ort.InferenceSession(str(path), build, providers=providers)
+            os.replace(tmp, opt)   # workers parallèles : le dernier écrit gagne, jamais de fichier partiel
+        else:
+            source = "disk"
+        so.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        sess = ort.InferenceSession(str(opt), so, providers=providers)
+    _SESSIONS[key] = sess
+    return sess, time.perf_counter() - t0, source
+
+
+# -----------------------------
+# RÉSULTATS (mêmes attributs que ceux lus par le pipeline sur les Results Ultralytics)
+# -----------------------------
+class OnnxBoxes:
+    __slots__ = ("xyxy", "conf", "cls", "id")
+
+    def __init__(self, xyxy, conf, cls):
+        self.xyxy = xyxy
+        self.conf = conf
+        self.cls = cls
+        self.id = None
+
+    def __len__(self):
+        return len(self.xyxy)
+
+
+class OnnxMasks:
+    __slots__ = ("data",)
+
+    def __init__(self, data):
+        self.data = data
+
+
+class OnnxResult:
+    __slots__ = ("boxes", "masks")
+
+    def __init__(self, boxes, masks=None):
+        self.boxes = boxes
+        self.masks = masks
+
+
+# -----------------------------
+# MODÈLE
+# -----------------------------
+class OnnxYOLO:
+    """
+    Modèle YOLO exporté en ONNX (Ultralytics, détection ou segmentation) exécuté directement
+    avec ONNX Runtime, avec predict() au sens du pipeline :
+      - letterbox centré (padding 114) vers l'entrée du modèle, comme l'exporteur ;
+      - NMS par classe (cv2.dnn.NMSBoxes), boîtes renvoyées dans le repère de l'image donnée ;
+      - segmentation : masques prototypes -> sigmoïde, découpe à la boîte, agrandissement bilinéaire,
+        seuil 0.5 ; renvoyés sur la zone utile (sans le padding), à l'échelle de l'entrée du modèle.
+    Pas de track() : le suivi se fait avec TRACKER = "rail" (rail_tracker.py).
+    """
+
+    MAX_WH = 7680   # décalage par classe pour la NMS (comme ultralytics.utils.ops)
+    MAX_DET = 300
+
+    def __init__(self, path, cache_dir=None, threads=None):
+        self.path = str(path)
+        self.session, self.load_s, self.load_source = load_session(path, cache_dir, threads)
+        inp = self.session.get_inputs()[0]
+        self.input_name = inp.name
+        meta = self.session.get_modelmeta().custom_metadata_map
+        imgsz = ast.literal_eval(meta["imgsz"]) if "imgsz" in meta else [640, 640]
+        h, w = inp.shape[2], inp.shape[3]
+        self.in_h = h if isinstance(h, int) else int(imgsz[0])
+        self.in_w = w if isinstance(w, int) else int(imgsz[1])
+        self.names = ast.literal_eval(meta["names"]) if "names" in meta else {}
+        self.segment = len(self.session.get_outputs()) > 1
+        self.nc = len(self.names) or None
+
+    # -- pré/post-traitement --
+    def _letterbox(self, img):
+        h, w = img.shape[:2]
+        r = min(self.in_h / h, self.in_w / w)
+        nw, nh = int(round(w * r)), int(round(h * r))
+        if (nw, nh) != (w, h):
+            img = cv2.resize(img, (nw, nh), interpolation=cv2.INTER_LINEAR)
+        dw, dh = (self.in_w - nw) / 2, (self.in_h - nh) / 2
+        top, bottom = int(round(dh - 0.1)), int(round(dh + 0.1))
+        left, right = int(round(dw - 0.1)), int(round(dw + 0.1))
+        img = cv2.copyMakeBorder(img, top, bottom, left, right, cv2.BORDER_CONSTANT, value=(114, 114, 114))
+        blob = cv2.dnn.blobFromImage(img, 1 / 255.0, swapRB=True)   # NCHW float32 RGB
+        return blob, r, left, top, nw, nh
+
+    def _nms(self, pred, conf, iou, n_coef):
+        # pred : (N, 4 + nc + n_coef), boîtes cx, cy, w, h dans l'entrée du modèle
+        nc = pred.shape[1] - 4 - n_coef
+        scores = pred[:, 4:4 + nc]
+        cls = scores.argmax(axis=1)
+        best = scores[np.arange(len(pred)), cls]
+        keep = best > conf
+        pred, cls, best = pred[keep], cls[keep], best[keep]
+        if len(pred) == 0:
+            return pred, cls, best
+        xywh = pred[:, :4].copy()
+        xywh[:, 0] -= xywh[:, 2] / 2
+        xywh[:, 1] -= xywh[:, 3] / 2
+        shifted = xywh.copy()
+        shifted[:, :2] += cls[:, None] * self.MAX_WH
+        idx = cv2.dnn.NMSBoxes(shifted.tolist(), best.tolist(), conf, iou, top_k=self.MAX_DET)
+        idx = np.asarray(idx, dtype=int).reshape(-1)
+        return pred[idx], cls[idx], best[idx]
+
+    def _masks(self, coef, proto, xyxy_in, left, top, nw, nh):
+        c, mh, mw = proto.shape
+        m = 1.0 / (1.0 + np.exp(-(coef @ proto.reshape(c, -1)))).reshape(-1, mh, mw)
+        # découpe à la boîte (repère des prototypes)
+        sx, sy = mw / self.in_w, mh / self.in_h
+        xs = np.arange(mw, dtype=np.float32)[None, None, :]
+        ys = np.arange(mh, dtype=np.float32)[None, :, None]
+        b = xyxy_in * np.array([sx, sy, sx, sy], dtype=np.float32)
+        inside = ((xs >= b[:, 0, None, None]) & (xs < b[:, 2, None, None]) &
+                  (ys >= b[:, 1, None, None]) & (ys < b[:, 3, None, None]))
+        m = m * inside
+        out = np.empty((len(m), nh, nw), dtype=np.float32)
+        for i in range(len(m)):
+            up = cv2.resize(m[i], (self.in_w, self.in_h), interpolation=cv2.INTER_LINEAR)
+            out[i] = up[top:top + nh, left:left + nw] > 0.5
+        return out
+
+    # -- API --
+    def predict(self, img, imgsz=None, conf=0.25, iou=0.7, verbose=False):
+        blob, r, left, top, nw, nh = self._letterbox(img)
+        outs = self.session.run(None, {self.input_name: blob})
+        proto = outs[1][0] if self.segment else None
+        n_coef = proto.shape[0] if proto is not None else 0
+        pred, cls, score = self._nms(outs[0][0].T, conf, iou, n_coef)
+
+        xyxy_in = np.empty((len(pred), 4), dtype=np.float32)
+        xyxy_in[:, :2] = pred[:, :2] - pred[:, 2:4] / 2
+        xyxy_in[:, 2:] = pred[:, :2] + pred[:, 2:4] / 2
+        xyxy = (xyxy_in - np.array([left, top, left, top], dtype=np.float32)) / r
+        h, w = img.shape[:2]
+        xyxy[:, [0, 2]] = xyxy[:, [0, 2]].clip(0, w)
+        xyxy[:, [1, 3]] = xyxy[:, [1, 3]].clip(0, h)
+
+        masks = None
+        if self.segment and len(pred):
+            masks = OnnxMasks(self._masks(pred[:, 4 + (pred.shape[1] - 4 - n_coef):], proto, xyxy_in, left, top, nw, nh))
+        return [OnnxResult(OnnxBoxes(xyxy, score.astype(np.float32), cls.astype(np.float32)), masks)]
+
+    def warmup(self):
+        """Une inférence à vide : allocations et noyaux d'ORT faits avant la première frame."""
+        self.session.run(None, {self.input_name: np.zeros((1, 3, self.in_h, self.in_w), dtype=np.float32)})
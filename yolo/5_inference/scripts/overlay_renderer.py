@@ -0,0 +1,82 @@
+import cv2
+import numpy as np
+
+
+# -----------------------------
+# RENDU OVERLAY
+# -----------------------------
+class OverlayRenderer:
+    """
+    Même image que overlay_mask(frame, mask_bin) + dessin des boîtes rails, sans allouer
+    de frame à chaque appel :
+      - teinte : addWeighted(frame, 0.65, couleur, 0.35) calculé seulement sur la bande de
+        lignes qui contient le masque, dans un buffer préalloué, puis recopié sous le masque
+        (hors masque, addWeighted(f, 0.65, f, 0.35) == f : la frame est recopiée telle quelle) ;
+      - calque statique : boîtes et libellés des rails dessinés une fois dans un calque,
+        reconstruit seulement quand la liste des rails (bbox + libellé) change ;
+      - le résultat est écrit dans `self.out`, réutilisé d'une frame à l'autre : l'appelant
+        y dessine ensuite les éléments dynamiques (trains) avant l'encodage.
+    `draw_static(img, rails_list)` dessine le calque. Si ce dessin est anti-aliasé (pixels
+    partiellement couverts), il est refait directement sur `self.out` à chaque frame.
+    """
+
+    def __init__(self, w, h, draw_static, color=(0, 255, 0), frame_weight=0.65, tint_weight=0.35):
+        self.draw_static = draw_static
+        self.frame_weight = frame_weight
+        self.tint_weight = tint_weight
+
+        self.out = np.empty((h, w, 3), dtype=np.uint8)
+        self._blend = np.empty((h, w, 3), dtype=np.uint8)
+        self._tint = np.empty((h, w, 3), dtype=np.uint8)
+        self._tint[:] = color
+
+        self._layer = np.zeros((h, w, 3), dtype=np.uint8)
+        self._layer_mask = np.zeros((h, w), dtype=np.uint8)
+        self._layer_rows = None
+        self._layer_key = None
+        self.layer_cached = True
+
+        self.frames = 0
+        self.layer_builds = 0
+
+    def _build_layer(self, rails_list, key):
+        # pixels dessinés = identiques sur fond noir et sur fond blanc
+        self._layer.fill(0)
+        self.draw_static(self._layer, rails_list)
+        white = np.full_like(self._layer, 255)
+        self.draw_static(white, rails_list)
+        opaque = np.all(self._layer == white, axis=2)
+        untouched = np.all(self._layer == 0, axis=2) & np.all(white == 255, axis=2)
+        # texte anti-aliasé (putText d'OpenCV 5) : le résultat dépend de la frame dessous,
+        # le calque n'est pas réutilisable -> on redessine à chaque frame comme avant
+        self.layer_cached = bool((opaque | untouched).all())
+        self._layer_mask[:] = opaque * np.uint8(255)
+        _, y, _, bh = cv2.boundingRect(self._layer_mask)
+        self._layer_rows = slice(y, y + bh) if bh else None
+        self._layer_key = key
+        self.layer_builds += 1
+
+    def render(self, frame, mask_bin, rails_list):
+        self.frames += 1
+        np.copyto(self.out, frame)
+
+        # bandes de lignes : vues contiguës, OpenCV écrit dedans sans copie
+        _, y, _, bh = cv2.boundingRect(mask_bin)
+        if bh:
+            rows = slice(y, y + bh)
+            cv2.addWeighted(frame[rows], self.frame_weight, self._tint[rows], self.tint_weight, 0,
+                            dst=self._blend[rows])
+            cv2.copyTo(self._blend[rows], mask_bin[rows], self.out[rows])
+
+        key = tuple((tuple(r["bbox"]), r["label"]) for r in rails_list)
+        if key != self._layer_key:
+            self._build_layer(rails_list, key)
+        if not self.layer_cached:
+            self.draw_static(self.out, rails_list)
+        elif self._layer_rows is not None:
+            rows = self._layer_rows
+            cv2.copyTo(self._layer[rows], self._layer_mask[rows], self.out[rows])
+        return self.out
+
+    def summary(self):
+        return {"frames": self.frames, "layer_builds": self.layer_builds, "layer_cached": self.layer_cached}
@@ -0,0 +1,308 @@
+import numpy as np
+
+
+# -----------------------------
+# CENTRELIGNE D'UNE VOIE
+# -----------------------------
+class RailLine:
+    """
+    Centreligne d'une composante rail (connected_components_rails) :
+    axe principal (ACP) des pixels + écart perpendiculaire ajusté par un polynôme
+    de degré 2 le long de l'axe (voies légèrement courbes).
+      s : abscisse le long de l'axe (px), orientée vers le bas de l'image (ou vers la droite)
+      d : écart à la centreligne (px)
+    """
+
+    MAX_FIT_POINTS = 5000
+
+    def __init__(self, xs, ys, bbox, cx, cy):
+        self.bbox = bbox
+        self.cx, self.cy = cx, cy
+        pts = np.column_stack([xs, ys]).astype(np.float64)
+        pts = pts[::max(1, len(pts) // self.MAX_FIT_POINTS)]
+        self.origin = pts.mean(axis=0)
+        c = pts - self.origin
+        _, _, vt = np.linalg.svd(c, full_matrices=False)
+        axis = vt[0]
+        if (axis[1] < 0) if abs(axis[1]) >= abs(axis[0]) else (axis[0] < 0):
+            axis = -axis
+        self.axis = axis
+        self.normal = np.array([-axis[1], axis[0]])
+        s, d = c @ self.axis, c @ self.normal
+        self.s_min, self.s_max = float(s.min()), float(s.max())
+        self.coef = np.polyfit(s, d, 2) if self.s_max - self.s_min > 1.0 else np.array([0.0, 0.0, float(d.mean())])
+
+    def project(self, pts):
+        """pts (n, 2) -> (s, d)."""
+        c = pts - self.origin
+        s = c @ self.axis
+        return s, c @ self.normal - np.polyval(self.coef, s)
+
+    def points(self, s):
+        """Points image (n, 2) de la centreligne aux abscisses s."""
+        d = np.polyval(self.coef, s)
+        return self.origin + np.outer(s, self.axis) + np.outer(d, self.normal)
+
+
+class _Track:
+    __slots__ = ("id", "line", "s", "v", "length", "last", "hits", "lost")
+
+    def __init__(self, line, s, length, frame_idx):
+        self.id = None          # attribué à la confirmation
+        self.line = line        # clé de la voie (RailLine) ou None hors voie
+        self.s = s
+        self.v = 0.0            # px / frame le long de la voie
+        self.length = length
+        self.last = frame_idx
+        self.hits = 1
+        self.lost = 0           # frames manquées depuis la dernière association
+
+
+# -----------------------------
+# TRACKER
+# -----------------------------
+class RailTracker:
+    """
+    Suivi 1D contraint aux voies, alternative à BoT-SORT pour une caméra fixe :
+      - les voies segmentées sont gardées comme centrelignes persistantes (RailLine), appariées
+        d'une frame à l'autre par leur centroïde et réajustées seulement si leur bbox bouge ;
+      - l'état d'un train est sa position s et sa vitesse le long de sa voie (filtre alpha-bêta) ;
+      - une détection est rattachée à la voie sous son point bas-centre (comme trains_from_boxes),
+        sinon à la centreligne la plus proche (voie masquée par le train), sinon au groupe "hors voie" ;
+      - association par voie avec un coût 1D |s_détection - s_prédit| ;
+      - un train perdu reste prédit `max_lost` frames (occultation) et ne peut réapparaître sur une
+        autre voie qu'au niveau d'un aiguillage (centrelignes à moins de `switch_px`).
+    Comme Ultralytics track(), seules les détections d'un track confirmé sont renvoyées.
+    """
+
+    def __init__(self, gate_px=80.0, gate_frac=0.5, max_lost=30, min_hits=2, off_rail_px=40.0,
+                 switch_px=15.0, switch_radius_px=80.0, rail_match_px=60.0, refit_px=8,
+                 rail_forget=300, alpha=0.6, beta=0.2, point_offset=2):
+        self.gate_px = gate_px
+        self.gate_frac = gate_frac
+        self.max_lost = max_lost
+        self.min_hits = min_hits
+        self.off_rail_px = off_rail_px
+        self.switch_px = switch_px
+        self.switch_radius_px = switch_radius_px
+        self.rail_match_px = rail_match_px
+        self.refit_px = refit_px
+        self.rail_forget = rail_forget
+        self.alpha = alpha
+        self.beta = beta
+        self.point_offset = point_offset
+
+        self.lines = {}          # clé -> RailLine
+        self.line_seen = {}      # clé -> dernière frame où la composante a été vue
+        self.switches = {}       # (clé_a, clé_b) -> [(s_a, s_b), ...]
+        self._next_line = 0
+        self.tracks = []
+        self._next_id = 1
+        self.frames = 0
+        self.stats = {"refits": 0, "recovered": 0, "switch_transfers": 0}
+
+    # -- voies --
+    def _sync_rails(self, frame_idx, cc_labels, rails_list):
+        """Composantes de la frame -> voies persistantes ; retourne {comp_id: clé}."""
+        comp_to_line = {}
+        free = set(self.lines)
+        changed = False
+        for r in rails_list:
+            key = None
+            best = self.rail_match_px
+            for k in free:
+                ln = self.lines[k]
+                dist = np.hypot(ln.cx - r["cx"], ln.cy - r["cy"])
+                if dist < best:
+                    key, best = k, dist
+            if key is not None:
+                free.discard(key)
+                moved = max(abs(a - b) for a, b in zip(self.lines[key].bbox, r["bbox"]))
+                if moved > self.refit_px:
+                    old = self.lines[key]
+                    self.lines[key] = self._fit(cc_labels, r)
+                    self._reproject(key, old, self.lines[key])
+                    self.stats["refits"] += 1
+                    changed = True
+            else:
+                key = self._next_line
+                self._next_line += 1
+                self.lines[key] = self._fit(cc_labels, r)
+                changed = True
+            self.line_seen[key] = frame_idx
+            comp_to_line[r["comp_id"]] = key
+
+        # voie absente depuis longtemps (caméra déplacée) : oubliée
+        for k in [k for k, f in self.line_seen.items() if frame_idx - f > self.rail_forget]:
+            del self.lines[k], self.line_seen[k]
+            changed = True
+        if changed:
+            self._find_switches()
+        return comp_to_line
+
+    def _reproject(self, key, old, new):
+        """Voie réajustée : abscisse et vitesse des tracks ramenées dans le repère de la nouvelle centreligne."""
+        for t in self.tracks:
+            if t.line != key:
+                continue
+            s = new.project(old.points([t.s, t.s + t.v]))[0]
+            t.s, t.v = float(s[0]), float(s[1] - s[0])
+
+    @staticmethod
+    def _fit(cc_labels, r):
+        x0, y0, x1, y1 = r["bbox"]
+        ys, xs = np.nonzero(cc_labels[y0:y1, x0:x1] == r["comp_id"])
+        return RailLine(xs + x0, ys + y0, r["bbox"], r["cx"], r["cy"])
+
+    def _find_switches(self, n=64):
+        self.switches = {}
+        samples = {}
+        for k, ln in self.lines.items():
+            s = np.linspace(ln.s_min, ln.s_max, n)
+            samples[k] = (s, ln.points(s))
+        keys = sorted(self.lines)
+        for i, a in enumerate(keys):
+            for b in keys[i + 1:]:
+                sa, pa = samples[a]
+                sb, pb = samples[b]
+                dist = np.linalg.norm(pa[:, None, :] - pb[None, :, :], axis=2)
+                rows = np.nonzero(dist.min(axis=1) < self.switch_px)[0]
+                if len(rows) == 0:
+                    continue
+                pairs = [(float(sa[i_]), float(sb[int(dist[i_].argmin())])) for i_ in rows]
+                self.switches[(a, b)] = pairs
+                self.switches[(b, a)] = [(q, p) for p, q in pairs]
+
+    def _at_switch(self, line_a, s_a, line_b, s_b):
+        for pa, pb in self.switches.get((line_a, line_b), ()):
+            if abs(s_a - pa) <= self.switch_radius_px and abs(s_b - pb) <= self.switch_radius_px:
+                return True
+        return False
+
+    # -- détections --
+    def _locate(self, xyxy, cc_labels, comp_to_line):
+        """Par détection : (clé de voie ou None, s, longueur le long de la voie)."""
+        h, w = cc_labels.shape[:2]
+        out = []
+        for x1, y1, x2, y2 in xyxy:
+            px, py = (x1 + x2) / 2.0, y2 - self.point_offset
+            comp = int(cc_labels[int(np.clip(py, 0, h - 1)), int(np.clip(px, 0, w - 1))])
+            key = comp_to_line.get(comp) if comp else None
+            pt = np.array([[px, py]])
+            if key is None:
+                # point hors masque (voie cachée par le train) : centreligne la plus proche
+                best = self.off_rail_px
+                for k, ln in self.lines.items():
+                    s, d = ln.project(pt)
+                    if ln.s_min - self.gate_px <= s[0] <= ln.s_max + self.gate_px and abs(d[0]) < best:
+                        key, best = k, abs(d[0])
+            if key is None:
+                out.append((None, float(px), float(x2 - x1)))
+                continue
+            ln = self.lines[key]
+            s, _ = ln.project(np.array([[px, py], [x1, y1], [x2, y1], [x1, y2], [x2, y2]]))
+            out.append((key, float(s[0]), float(s[1:].max() - s[1:].min())))
+        return out
+
+    # -- boucle --
+    def update(self, frame_idx, xyxy, confs, cc_labels, rails_list):
+        """
+        Détections de la frame (repère pleine résolution) -> (xyxy, confs, track_ids)
+        restreints aux détections associées à un track confirmé.
+        """
+        first = self.frames == 0
+        self.frames += 1
+        comp_to_line = self._sync_rails(frame_idx, cc_labels, rails_list)
+        dets = self._locate(xyxy, cc_labels, comp_to_line)
+        assigned = {}                                          # index détection -> track
+
+        # 1) association 1D voie par voie (coûts triés, appariement glouton)
+        by_line = {}
+        for i, (key, _, _) in enumerate(dets):
+            by_line.setdefault(key, []).append(i)
+        for key, idx in by_line.items():
+            cands = [t for t in self.tracks if t.line == key]
+            pairs = []
+            for t in cands:
+                dt = frame_idx - t.last
+                pred = t.s + t.v * dt
+                gate = max(self.gate_px, self.gate_frac * t.length) + abs(t.v) * max(0, dt - 1)
+                for i in idx:
+                    cost = abs(dets[i][1] - pred)
+                    if cost <= gate:
+                        pairs.append((cost, i, t))
+            used = set()
+            for cost, i, t in sorted(pairs, key=lambda p: p[0]):
+                if i in assigned or id(t) in used:
+                    continue
+                assigned[i] = t
+                used.add(id(t))
+
+        # 2) détections restantes : train perdu sur une autre voie, repris seulement à un aiguillage
+        matched = {id(t) for t in assigned.values()}
+        for i, (key, s, _) in enumerate(dets):
+            if i in assigned or key is None:
+                continue
+            best, best_t = None, None
+            for t in self.tracks:
+                if id(t) in matched or t.id is None or t.line is None or t.line == key:
+                    continue
+                pred = t.s + t.v * (frame_idx - t.last)
+                if self._at_switch(t.line, pred, key, s):
+                    gap = frame_idx - t.last
+                    if best is None or gap < best:
+                        best, best_t = gap, t
+            if best_t is not None:
+                best_t.line, best_t.s, best_t.v = key, s, 0.0
+                best_t.last = frame_idx - 1
+                assigned[i] = best_t
+                matched.add(id(best_t))
+                self.stats["switch_transfers"] += 1
+
+        # 3) mise à jour des tracks associés
+        for i, t in assigned.items():
+            _, s, length = dets[i]
+            dt = max(1, frame_idx - t.last)
+            pred = t.s + t.v * dt
+            r = s - pred
+            t.s = pred + self.alpha * r
+            t.v = t.v + self.beta * r / dt
+            t.length = 0.8 * t.length + 0.2 * length
+            if t.lost:
+                self.stats["recovered"] += 1
+            t.last, t.lost = frame_idx, 0
+            t.hits += 1
+            if t.id is None and t.hits >= self.min_hits:
+                t.id = self._next_id
+                self._next_id += 1
+
+        # 4) tracks non associés : perdus (gardés max_lost frames) ; tentatives supprimées
+        kept = []
+        matched = {id(t) for t in assigned.values()}
+        for t in self.tracks:
+            if id(t) not in matched:
+                if t.id is None:
+                    continue
+                t.lost += 1
+                if t.lost > self.max_lost:
+                    continue
+            kept.append(t)
+        self.tracks = kept
+
+        # 5) nouveaux tracks (confirmés d'emblée sur la première frame, comme ByteTrack/BoT-SORT)
+        for i, (key, s, length) in enumerate(dets):
+            if i in assigned:
+                continue
+            t = _Track(key, s, length, frame_idx)
+            if first or self.min_hits <= 1:
+                t.id = self._next_id
+                self._next_id += 1
+            self.tracks.append(t)
+            assigned[i] = t
+
+        keep = [i for i in range(len(dets)) if assigned[i].id is not None]
+        ids = np.array([assigned[i].id for i in keep], dtype=int)
+        return xyxy[keep], confs[keep], ids
+
+    def summary(self):
+        return {"frames": self.frames, "tracks": self._next_id - 1, "rails": len(self.lines), **self.stats}
@@ -0,0 +1,289 @@
+import csv
+import io
+import json
+import os
+import queue
+import threading
+import time
+from pathlib import Path
+
+import yard_metrics as metrics
+
+try:
+    import orjson  # encodeur JSON rapide (optionnel)
+except ImportError:
+    orjson = None
+
+
+FSYNC_POLICIES = ("never", "batch", "close")
+
+
+def json_encoder(name="auto"):
+    """
+    "json"  : json.dumps(ensure_ascii=False), mêmes octets que l'ancien code
+    "orjson": orjson (si installé), JSON compact, nettement plus rapide
+    "auto"  : orjson si disponible, sinon json (les octets dépendent alors de l'environnement)
+    """
+    if name == "orjson" or (name == "auto" and orjson is not None):
+        if orjson is None:
+            raise ImportError("orjson n'est pas installé (pip install orjson)")
+        return lambda rec: orjson.dumps(rec, option=orjson.OPT_SERIALIZE_NUMPY).decode("utf-8")
+    return lambda rec: json.dumps(rec, ensure_ascii=False)
+
+
+# -----------------------------
+# FICHIER SEGMENTÉ
+# -----------------------------
+class _SegmentedFile:
+    """
+    Fichier de sortie d'un flux. Sans rotation : écrit `path` tel quel.
+    Avec rotation (taille et/ou heure) : segments <stem>.0000<suffix>, <stem>.0001<suffix>...
+    et un index <nom>.segments.json (chemin, heures d'ouverture/fermeture, records, octets).
+    Les CSV répètent l'en-tête dans chaque segment.
+    """
+
+    def __init__(self, path, header_text, rotate_bytes, rotate_hourly, fsync):
+        self.path = Path(path)
+        self.header_text = header_text
+        self.rotate_bytes = rotate_bytes
+        self.rotate_hourly = rotate_hourly
+        self.fsync = fsync
+        self.rotating = bool(rotate_bytes or rotate_hourly)
+
+        self.segments = []
+        self.f = None
+        self._open(time.time())
+
+    def _segment_path(self, n):
+        if not self.rotating:
+            return self.path
+        return self.path.with_name(f"{self.path.stem}.{n:04d}{self.path.suffix}")
+
+    def _open(self, now):
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        seg = {"segment": len(self.segments), "path": str(self._segment_path(len(self.segments))),
+               "opened": time.strftime("%Y-%m-%dT%H:%M:%S", time.localtime(now)),
+               "closed": None, "records": 0, "bytes": 0}
+        self.segments.append(seg)
+        self.f = open(seg["path"], "w", newline="", encoding="utf-8")
+        self.hour = time.localtime(now)[:4]
+        if self.header_text:
+            self._write(self.header_text, 0)
+        if self.rotating:
+            self._write_index()
+
+    def _write(self, text, n_records):
+        self.f.write(text)
+        seg = self.segments[-1]
+        seg["records"] += n_records
+        seg["bytes"] += len(text.encode("utf-8")) if not text.isascii() else len(text)
+
+    def _close_segment(self, now):
+        self.flush(sync=self.fsync in ("batch", "close"))
+        self.f.close()
+        self.segments[-1]["closed"] = time.strftime("%Y-%m-%dT%H:%M:%S", time.localtime(now))
+
+    def _write_index(self):
+        index = self.path.with_name(f"{self.path.name}.segments.json")
+        index.write_text(json.dumps({"stream": str(self.path), "segments": self.segments},
+                                    indent=2, ensure_ascii=False), encoding="utf-8")
+
+    def write(self, text, n_records, now):
+        seg = self.segments[-1]
+        if self.rotating and seg["records"] > 0:
+            if (self.rotate_bytes and seg["bytes"] + len(text) > self.rotate_bytes) or \
+                    (self.rotate_hourly and time.localtime(now)[:4] != self.hour):
+                self._close_segment(now)
+                self._open(now)
+        self._write(text, n_records)
+
+    def flush(self, sync=False):
+        self.f.flush()
+        if sync:
+            os.fsync(self.f.fileno())
+
+    def close(self):
+        now = time.time()
+        self._close_segment(now)
+        if self.rotating:
+            self._write_index()
+
+
+# -----------------------------
+# FLUX
+# -----------------------------
+class RecordStream:
+    """Un fichier logique (JSONL ou CSV) ; put() met le record en file et rend la main."""
+
+    def __init__(self, writer, path, kind, header):
+        self.writer = writer
+        self.path = str(path)
+        self.kind = kind
+        self.header = header
+        self.file = None      # _SegmentedFile, ouvert par open_stream(), écrit par le thread
+
+    def put(self, record):
+        """JSONL : dict (sérialisé dans le thread) ; CSV : liste de valeurs (une ligne)."""
+        self.writer._enqueue(self, record)
+
+    def serialize(self, records, encode):
+        if self.kind == "jsonl":
+            return "".join(encode(r) + "\n" for r in records)
+        buf = io.StringIO()
+        csv.writer(buf).writerows(records)
+        return buf.getvalue()
+
+    def header_text(self):
+        if self.kind != "csv" or not self.header:
+            return ""
+        buf = io.StringIO()
+        csv.writer(buf).writerow(self.header)
+        return buf.getvalue()
+
+
+# -----------------------------
+# ÉCRIVAIN ASYNCHRONE
+# -----------------------------
+class AsyncRecordWriter:
+    """
+    Sorties JSONL/CSV écrites par un thread dédié : la boucle de frames ne fait que
+    mettre des records en file (put), la sérialisation et les écritures disque se font
+    par lots. Un disque lent ne bloque la boucle que si la file (`max_queue` records)
+    est pleine.
+
+    - flush des buffers fichier toutes les `flush_interval_s` s ou dès `flush_records`
+      records en attente ;
+    - fsync : "never" (laissé à l'OS), "batch" (après chaque flush), "close" (à la fermeture) ;
+    - rotation : `rotate_bytes` (taille max d'un segment) et/ou `rotate_hourly`
+      (nouveau segment à chaque heure), avec un index des segments par flux.
+    """
+
+    def __init__(self, flush_records=512, flush_interval_s=1.0, fsync="never",
+                 rotate_bytes=None, rotate_hourly=False, max_queue=100_000, encoder="json"):
+        if fsync not in FSYNC_POLICIES:
+            raise ValueError(f"fsync doit être dans {FSYNC_POLICIES}: {fsync!r}")
+        self.flush_records = flush_records
+        self.flush_interval_s = flush_interval_s
+        self.fsync = fsync
+        self.rotate_bytes = rotate_bytes
+        self.rotate_hourly = rotate_hourly
+        self.encode = json_encoder(encoder)
+
+        self.streams = []
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._error = None
+        self._thread = None
+
+        self.records = 0
+        self.batches = 0
+        self.fsyncs = 0
+        self.stalls = 0
+        self.max_depth = 0
+
+    def open_stream(self, path, kind="jsonl", header=None):
+        if self._thread is not None:
+            raise RuntimeError("open_stream() doit être appelé avant le premier put()")
+        stream = RecordStream(self, path, kind, header)
+        stream.file = _SegmentedFile(path, stream.header_text(), self.rotate_bytes, self.rotate_hourly, self.fsync)
+        self.streams.append(stream)
+        return stream
+
+    # -- côté boucle de frames --
+    def _enqueue(self, stream, record):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="record_writer", daemon=True)
+            self._thread.start()
+        if self._error is not None:
+            raise RuntimeError("Thread d'écriture arrêté") from self._error
+        try:
+            self._queue.put_nowait((stream, record))
+        except queue.Full:
+            self.stalls += 1
+            self._put((stream, record))
+
+    def _put(self, item, poll_s=0.5):
+        # file pleine : attente par paliers, sans bloquer indéfiniment si le thread d'écriture est mort
+        while True:
+            try:
+                self._queue.put(item, timeout=poll_s)
+                return
+            except queue.Full:
+                if self._error is not None or not self._thread.is_alive():
+                    raise RuntimeError("Thread d'écriture arrêté, file pleine") from self._error
+
+    # -- thread d'écriture --
+    def _write_batch(self, batch, sync):
+        now = time.time()
+        by_stream = {}
+        for stream, record in batch:
+            by_stream.setdefault(stream, []).append(record)
+        for stream, records in by_stream.items():
+            stream.file.write(stream.serialize(records, self.encode), len(records), now)
+        for stream in self.streams:
+            stream.file.flush(sync=sync)
+        if sync:
+            self.fsyncs += 1
+        self.records += len(batch)
+        self.batches += 1
+
+    def _run(self):
+        batch = []
+        last_flush = time.monotonic()
+        try:
+            while True:
+                timeout = max(0.0, self.flush_interval_s - (time.monotonic() - last_flush))
+                try:
+                    item = self._queue.get(timeout=timeout)
+                except queue.Empty:
+                    item = ()
+                if item is None:
+                    break
+                if item:
+                    batch.append(item)
+                    # vider ce qui est déjà en file sans attendre
+                    while len(batch) < self.flush_records:
+                        try:
+                            item = self._queue.get_nowait()
+                        except queue.Empty:
+                            break
+                        if item is None:
+                            self._write_batch(batch, sync=self.fsync == "batch")
+                            return
+                        batch.append(item)
+                depth = self._queue.qsize()
+                self.max_depth = max(self.max_depth, depth)
+                if len(batch) >= self.flush_records or time.monotonic() - last_flush >= self.flush_interval_s:
+                    if batch:
+                        self._write_batch(batch, sync=self.fsync == "batch")
+                        metrics.set_gauge("queue_depth", depth, queue="record_writer")
+                        batch = []
+                    last_flush = time.monotonic()
+            if batch:
+                self._write_batch(batch, sync=self.fsync == "batch")
+        except Exception as e:  # remonté à la boucle au prochain put() / close()
+            self._error = e
+
+    def close(self):
+        if self._thread is not None:
+            if self._thread.is_alive():
+                try:
+                    self._put(None)
+                except RuntimeError:
+                    pass   # thread mort : son erreur est remontée plus bas
+            self._thread.join()
+        for stream in self.streams:
+            stream.file.close()
+        if self.fsync == "close":
+            self.fsyncs += 1
+        if self._error is not None:
+            raise RuntimeError("Erreur dans le thread d'écriture") from self._error
+
+    def summary(self):
+        return {
+            "records": self.records,
+            "batches": self.batches,
+            "fsyncs": self.fsyncs,
+            "stalls": self.stalls,
+            "max_queue_depth": self.max_depth,
+            "segments": {s.path: len(s.file.segments) for s in self.streams},
+        }
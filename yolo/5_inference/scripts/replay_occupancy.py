@@ -0,0 +1,162 @@
+import itertools
+import json
+import time
+from pathlib import Path
+
+import numpy as np
+
+import infer_trains_and_rails_with_history as pipeline
+from detection_cache import DetectionCache
+from evaluate_occupancy import score_video
+
+
+# -----------------------------
+# CONFIG
+# -----------------------------
+# Cache écrit par infer_trains_and_rails_with_history.py (SAVE_DET_CACHE = True)
+CACHE_DIR = Path("7_outputs/cache/video")
+OUT_DIR = Path("7_outputs/replay")       # un sous-dossier par combinaison de paramètres
+
+# Vérité terrain optionnelle (format evaluate_occupancy.py) pour classer les combinaisons
+GT_CSV = None  # ex: Path("1_datasets/tracking_videos/video_gt.csv")
+
+# Grille de paramètres : chaque combinaison est rejouée sur tout le cache.
+# Paramètres propres à un mode de RAIL_ASSIGN ignorés dans l'autre (combinaisons identiques rejouées une fois).
+# Pas de MASK_THRESH : les masques du cache sont déjà binaires (voir detection_cache.py).
+SWEEP = {
+    "MIN_AREA_RAIL": [800, 1200, 2000],
+    "EXPECTED_RAILS": [6],
+    "RAIL_ASSIGN": ["point", "strip"],
+    "STRIP_FRAC": [0.1, 0.15, 0.25],
+    "STRIP_WIDTH_FRAC": [0.3, 0.5, 0.8],
+}
+MODE_PARAMS = {
+    "point": ("POINT_OFFSET_PX",),
+    "strip": ("STRIP_FRAC", "STRIP_MIN_PX", "STRIP_WIDTH_FRAC", "MIN_RAIL_OVERLAP"),
+}
+
+REPORT = Path("6_evaluation/reports/replay_sweep.json")
+
+
+# -----------------------------
+# REPLAY
+# -----------------------------
+def sweep_combos(sweep):
+    """Produit cartésien de la grille, sans les paramètres sans effet pour le RAIL_ASSIGN de la combinaison."""
+    keys = list(sweep)
+    combos, seen = [], set()
+    for values in itertools.product(*(sweep[k] for k in keys)):
+        params = dict(zip(keys, values))
+        mode = params.get("RAIL_ASSIGN", pipeline.RAIL_ASSIGN)
+        unused = {k for m, ks in MODE_PARAMS.items() if m != mode for k in ks}
+        params = {k: v for k, v in params.items() if k not in unused}
+        key = tuple(sorted(params.items()))
+        if key not in seen:
+            seen.add(key)
+            combos.append(params)
+    return combos
+
+
+def set_params(params):
+    # les fonctions du pipeline lisent leurs constantes au niveau du module
+    for k, v in params.items():
+        setattr(pipeline, k, v)
+
+
+def replay(cache, out_dir: Path, retrack=None):
+    """
+    Rejoue masques -> composantes -> voie par train -> occupation -> événements,
+    sans modèle. Écrit les mêmes CSV/JSONL que le pipeline (sans vidéo ni JSONL par frame).
+    retrack(frame_idx, xyxy, confs, cc_labels, rails_list) -> (xyxy, confs, track_ids) :
+    suivi rejoué sur les détections du cache à la place des IDs enregistrés (benchmark_tracker.py).
+    """
+    out_dir.mkdir(parents=True, exist_ok=True)
+    pipeline.OUT_CSV_FRAMES = str(out_dir / "occupancy_per_frame.csv")
+    pipeline.OUT_JSONL_EVENTS = str(out_dir / "occupancy_events.jsonl")
+    pipeline.OUT_CSV_EVENTS = str(out_dir / "occupancy_events.csv")
+    pipeline.OUT_VIDEO = str(out_dir / "unused.mp4")
+
+    out, _, events_out, frames_csv, events_csv = pipeline.open_writers(frames_jsonl=False)
+
+    fps, w, h = cache.fps, cache.w, cache.h
+    empty_mask = np.zeros((h, w), dtype=np.uint8)
+    last_voie, event_start_frame, presence = {}, {}, {}
+
+    # caméra fixe : le même blob de masque se répète, on ne recalcule les composantes qu'au changement
+    prev_blob, rails_list, cc_labels = None, None, None
+    for frame_idx in range(cache.n_frames):
+        blob = int(cache.mask_blob[frame_idx])
+        if blob != prev_blob:
+            q = cache.mask(blob)
+            if q is None:
+                mask_bin = empty_mask
+            else:
+                mask_bin = pipeline.union_rail_masks([q.astype(np.float32) / 255.0], w, h)
+            rails_list, cc_labels = pipeline.connected_components_rails(
+                mask_bin, expected=pipeline.EXPECTED_RAILS, min_area=pipeline.MIN_AREA_RAIL)
+            prev_blob = blob
+
+        xyxy, confs, track_ids = cache.detections(frame_idx)
+        if retrack is not None:
+            xyxy, confs, track_ids = retrack(frame_idx, xyxy, confs, cc_labels, rails_list)
+        trains = pipeline.trains_from_boxes(xyxy, confs, track_ids, cc_labels, rails_list)
+        trains_ranked = pipeline.rank_left_to_right(
+            trains,
+            key_fn=lambda d: pipeline.bbox_center_x(d["bbox"]),
+            max_slots=pipeline.EXPECTED_RAILS,
+            label_prefix="train"
+        )
+        occupancy_map = pipeline.occupancy_from_trains(trains_ranked)
+        pipeline.write_frame_rows(frames_csv, frame_idx, frame_idx / float(fps), occupancy_map)
+        for event in pipeline.update_events(trains_ranked, frame_idx, fps, last_voie, event_start_frame,
+                                              presence):
+            pipeline.write_event(event, events_out, events_csv)
+
+    for event in pipeline.close_events(last_voie, event_start_frame, cache.n_frames - 1, fps):
+        pipeline.write_event(event, events_out, events_csv)
+
+    out.close()
+
+
+# -----------------------------
+# MAIN
+# -----------------------------
+def main():
+    if not (CACHE_DIR / "meta.json").exists():
+        raise SystemExit(f"\n❌ Cache introuvable: {CACHE_DIR} (lance d'abord le pipeline avec SAVE_DET_CACHE = True)\n")
+
+    cache = DetectionCache(CACHE_DIR)
+    print(f"🗃️ Cache: {CACHE_DIR} ({cache.n_frames} frames, {cache.meta.get('mask_blobs')} masques distincts)")
+
+    combos = sweep_combos(SWEEP)
+    results = []
+    for i, params in enumerate(combos):
+        set_params(params)
+        out_dir = OUT_DIR / f"combo_{i:03d}"
+        t0 = time.perf_counter()
+        replay(cache, out_dir)
+        dt = time.perf_counter() - t0
+
+        res = {"combo": i, "params": params, "out_dir": str(out_dir),
+               "seconds": round(dt, 3), "fps": round(cache.n_frames / dt, 1) if dt else None}
+        if GT_CSV is not None:
+            res["score"] = score_video(out_dir, Path(GT_CSV))
+        results.append(res)
+
+        line = f"▶️ {i:03d} {params}  {res['fps']} frames/s"
+        if "score" in res:
+            line += f"  F1={res['score']['occupancy']['f1']}  idsw={res['score']['id_switches']}"
+        print(line)
+
+    if GT_CSV is not None:
+        results.sort(key=lambda r: (-r["score"]["occupancy"]["f1"], r["score"]["id_switches"]))
+        print(f"\n🏆 Meilleure combinaison: {results[0]['params']}")
+
+    REPORT.parent.mkdir(parents=True, exist_ok=True)
+    REPORT.write_text(json.dumps({"cache": str(CACHE_DIR), "frames": cache.n_frames, "results": results},
+                                 indent=2, ensure_ascii=False), encoding="utf-8")
+    print(f"🧾 Rapport: {REPORT}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+import bisect
+import time
+from collections import defaultdict
+
+
+# -----------------------------
+# TIMING PAR ÉTAPE
+# -----------------------------
+class StageTimer:
+    """
+    Chronomètre "au tour" pour la boucle de frames :
+        timer.start()          # début de frame
+        ...; timer.lap("decode")
+        ...; timer.lap("track")
+        timer.end_frame()      # enregistre aussi la durée totale "frame"
+    Chaque lap mesure le temps écoulé depuis le lap précédent (ms).
+    """
+
+    def __init__(self):
+        self.samples = defaultdict(list)
+        self.frames = 0
+        self._t_frame = None
+        self._t = None
+
+    def start(self):
+        self._t_frame = self._t = time.perf_counter()
+
+    def lap(self, stage):
+        now = time.perf_counter()
+        self.samples[stage].append((now - self._t) * 1000.0)
+        self._t = now
+
+    def end_frame(self):
+        now = time.perf_counter()
+        self.samples["frame"].append((now - self._t_frame) * 1000.0)
+        self.frames += 1
+
+
+class NullTimer:
+    """Timer désactivé : appels vides, coût négligeable dans la boucle."""
+
+    frames = 0
+
+    def start(self):
+        pass
+
+    def lap(self, stage):
+        pass
+
+    def end_frame(self):
+        pass
+
+
+NULL_TIMER = NullTimer()
+
+
+# -----------------------------
+# STATISTIQUES
+# -----------------------------
+# Bornes des histogrammes (ms), dernière case = +inf
+HIST_EDGES_MS = [0.1, 0.25, 0.5, 1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000]
+
+
+def percentile(sorted_vals, q):
+    if not sorted_vals:
+        return None
+    k = min(len(sorted_vals) - 1, max(0, int(round(q / 100.0 * (len(sorted_vals) - 1)))))
+    return sorted_vals[k]
+
+
+def histogram(vals, edges=HIST_EDGES_MS):
+    counts = [0] * (len(edges) + 1)
+    for v in vals:
+        counts[bisect.bisect_left(edges, v)] += 1
+    return {"edges_ms": edges, "counts": counts}
+
+
+def summarize(samples):
+    """
+    samples: {stage: [ms, ...]} -> {stage: {count, mean, p50, p90, p99, max, total, hist}}
+    """
+    out = {}
+    for stage, vals in samples.items():
+        s = sorted(vals)
+        total = sum(s)
+        out[stage] = {
+            "count": len(s),
+            "mean_ms": round(total / len(s), 4) if s else None,
+            "p50_ms": round(percentile(s, 50), 4) if s else None,
+            "p90_ms": round(percentile(s, 90), 4) if s else None,
+            "p99_ms": round(percentile(s, 99), 4) if s else None,
+            "max_ms": round(s[-1], 4) if s else None,
+            "total_ms": round(total, 3),
+            "hist": histogram(s),
+        }
+    return out
@@ -0,0 +1,194 @@
+from pathlib import Path
+
+import cv2
+import numpy as np
+import torch
+import yaml
+from ultralytics.engine.results import Boxes, Results
+from ultralytics.trackers.track import TRACKER_MAP
+from ultralytics.utils import IterableSimpleNamespace
+from ultralytics.utils.checks import check_yaml
+
+from cascade_detector import iou_matrix
+
+
+# -----------------------------
+# TUILES
+# -----------------------------
+def make_tiles(w, h, tile, overlap):
+    """Tuiles (x0, y0, x1, y1) de côté `tile` avec recouvrement, la dernière collée au bord."""
+    def starts(size):
+        if size <= tile:
+            return [0]
+        step = max(1, int(tile * (1.0 - overlap)))
+        s = list(range(0, size - tile, step))
+        return s + [size - tile]
+    return [(x, y, min(x + tile, w), min(y + tile, h)) for y in starts(h) for x in starts(w)]
+
+
+def merge_tile_boxes(xyxy, conf, cls, iou_thr=0.5, ios_thr=0.6):
+    """
+    NMS inter-tuiles : par confiance décroissante, une boîte qui recouvre une boîte gardée
+    de même classe (IoU > iou_thr, ou intersection / plus petite aire > ios_thr pour un
+    wagon coupé par un bord de tuile) est fusionnée dans celle-ci (union des coordonnées).
+    """
+    order = np.argsort(-conf)
+    kept_xyxy, kept_conf, kept_cls = [], [], []
+    for i in order:
+        b = xyxy[i]
+        merged = False
+        if kept_xyxy:
+            kx = np.asarray(kept_xyxy)
+            same = np.asarray(kept_cls) == cls[i]
+            iou = iou_matrix(b[None], kx)[0]
+            x1, y1 = np.maximum(b[0], kx[:, 0]), np.maximum(b[1], kx[:, 1])
+            x2, y2 = np.minimum(b[2], kx[:, 2]), np.minimum(b[3], kx[:, 3])
+            inter = np.clip(x2 - x1, 0, None) * np.clip(y2 - y1, 0, None)
+            area_b = (b[2] - b[0]) * (b[3] - b[1])
+            area_k = (kx[:, 2] - kx[:, 0]) * (kx[:, 3] - kx[:, 1])
+            ios = inter / np.maximum(np.minimum(area_b, area_k), 1e-9)
+            hit = np.flatnonzero(same & ((iou > iou_thr) | (ios > ios_thr)))
+            if len(hit):
+                j = hit[np.argmax(iou[hit])]
+                k = kept_xyxy[j]
+                kept_xyxy[j] = np.array([min(k[0], b[0]), min(k[1], b[1]), max(k[2], b[2]), max(k[3], b[3])])
+                merged = True
+        if not merged:
+            kept_xyxy.append(b.copy())
+            kept_conf.append(conf[i])
+            kept_cls.append(cls[i])
+    if not kept_xyxy:
+        return np.zeros((0, 4), np.float32), np.zeros(0, np.float32), np.zeros(0, np.float32)
+    return np.asarray(kept_xyxy, np.float32), np.asarray(kept_conf, np.float32), np.asarray(kept_cls, np.float32)
+
+
+# -----------------------------
+# MODÈLE TUILÉ
+# -----------------------------
+class TiledModel:
+    """
+    Enveloppe un YOLO (détection ou segmentation) et expose predict()/track() comme lui
+    (plus detect() : détection tuilée sans tracker),
+    mais en inférant des tuiles recouvrantes en un seul batch :
+      - détection : boîtes ramenées en coordonnées frame (+ passe plein cadre optionnelle)
+        puis fusionnées (merge_tile_boxes), suivi avec le même tracker que YOLO.track() ;
+      - segmentation : masques recollés dans un masque frame (résolution x mask_scale).
+    Les tuiles sans pixel de rail dans le "layout" (dernier masque rails connu) sont sautées.
+    Pour la segmentation, le layout est rafraîchi en entier toutes les `layout_refresh` frames.
+    """
+
+    def __init__(self, model, tile=1280, overlap=0.2, full_frame_pass=True,
+                 layout_refresh=100, mask_scale=0.5):
+        self.model = model
+        self.tile = tile
+        self.overlap = overlap
+        self.full_frame_pass = full_frame_pass
+        self.layout_refresh = layout_refresh
+        self.mask_scale = mask_scale
+
+        self.layout = None           # masque rails pleine résolution (uint8), None = toutes les tuiles
+        self.tracker = None
+        self.frames = 0
+        self.tiles_run = 0
+        self.tiles_skipped = 0
+
+    # -- tuiles actives --
+    def set_layout(self, mask_bin):
+        self.layout = mask_bin if mask_bin is not None and mask_bin.any() else None
+
+    def _active_tiles(self, w, h, use_layout=True):
+        tiles = make_tiles(w, h, self.tile, self.overlap)
+        if not use_layout or self.layout is None or self.layout.shape[:2] != (h, w):
+            return tiles
+        active = [t for t in tiles if self.layout[t[1]:t[3], t[0]:t[2]].any()]
+        self.tiles_skipped += len(tiles) - len(active)
+        return active
+
+    def _run(self, frame, tiles, imgsz, conf, iou, verbose, full_frame=False, **kwargs):
+        crops = [frame[y0:y1, x0:x1] for x0, y0, x1, y1 in tiles]
+        offsets = list(tiles)
+        if full_frame:
+            # passe plein cadre (letterbox) pour les wagons proches, plus grands qu'une tuile
+            crops.append(frame)
+            offsets.append((0, 0, frame.shape[1], frame.shape[0]))
+        self.tiles_run += len(tiles)
+        if not crops:
+            return [], []
+        return self.model.predict(crops, imgsz=imgsz, conf=conf, iou=iou, verbose=verbose, **kwargs), offsets
+
+    # -- détection --
+    def _detect(self, frame, imgsz, conf, iou, verbose):
+        h, w = frame.shape[:2]
+        results, offsets = self._run(frame, self._active_tiles(w, h), imgsz, conf, iou, verbose,
+                                     full_frame=self.full_frame_pass)
+        all_xyxy, all_conf, all_cls = [], [], []
+        for r, (x0, y0, _, _) in zip(results, offsets):
+            if r.boxes is None or len(r.boxes) == 0:
+                continue
+            b = r.boxes.cpu().numpy()
+            all_xyxy.append(b.xyxy + np.array([x0, y0, x0, y0], np.float32))
+            all_conf.append(b.conf)
+            all_cls.append(b.cls)
+        if not all_xyxy:
+            return np.zeros((0, 6), np.float32)
+        xyxy, confs, cls = merge_tile_boxes(np.concatenate(all_xyxy), np.concatenate(all_conf),
+                                            np.concatenate(all_cls), iou_thr=iou)
+        return np.concatenate([xyxy, confs[:, None], cls[:, None]], axis=1)
+
+    def track(self, frame, imgsz=640, conf=0.25, iou=0.45, tracker="botsort.yaml", persist=True, verbose=False):
+        if self.tracker is None or not persist:
+            cfg = IterableSimpleNamespace(**yaml.safe_load(Path(check_yaml(tracker)).read_text(encoding="utf-8")))
+            self.tracker = TRACKER_MAP[cfg.tracker_type](args=cfg, frame_rate=30)
+        self.frames += 1
+        h, w = frame.shape[:2]
+        det = self._detect(frame, imgsz, conf, iou, verbose)
+        result = Results(frame, path="", names=self.model.names, boxes=torch.as_tensor(det))
+        if len(det) == 0:
+            return [result]
+        tracks = self.tracker.update(Boxes(det, (h, w)), frame)
+        if len(tracks) == 0:
+            return [result]
+        result.update(boxes=torch.as_tensor(tracks[:, :-1]))
+        return [result]
+
+    def detect(self, frame, imgsz=640, conf=0.25, iou=0.45, verbose=False):
+        """Détection seule, sans tracker (TRACKER = "rail" : suivi fait ensuite le long des voies)."""
+        self.frames += 1
+        det = self._detect(frame, imgsz, conf, iou, verbose)
+        return [Results(frame, path="", names=self.model.names, boxes=torch.as_tensor(det))]
+
+    # -- segmentation --
+    def predict(self, frame, imgsz=640, conf=0.25, iou=0.7, verbose=False):
+        self.frames += 1
+        h, w = frame.shape[:2]
+        refresh = self.layout_refresh and (self.frames - 1) % self.layout_refresh == 0
+        tiles = self._active_tiles(w, h, use_layout=not refresh)
+        # retina_masks : masques à la résolution de la tuile (pas de décalage dû au letterbox)
+        results, offsets = self._run(frame, tiles, imgsz, conf, iou, verbose, retina_masks=True)
+
+        s = self.mask_scale
+        mh, mw = max(1, round(h * s)), max(1, round(w * s))
+        stitched = np.zeros((mh, mw), np.float32)
+        for r, (x0, y0, x1, y1) in zip(results, offsets):
+            if r.masks is None or r.masks.data is None:
+                continue
+            m = r.masks.data.cpu().numpy().max(axis=0)
+            tx0, ty0 = round(x0 * s), round(y0 * s)
+            tw, th = max(1, round(x1 * s) - tx0), max(1, round(y1 * s) - ty0)
+            m = cv2.resize(m, (tw, th), interpolation=cv2.INTER_NEAREST)
+            region = stitched[ty0:ty0 + th, tx0:tx0 + tw]
+            np.maximum(region, m[:region.shape[0], :region.shape[1]], out=region)
+
+        # layout pour les frames suivantes (et pour le détecteur tuilé via set_layout)
+        self.set_layout(cv2.resize((stitched > 0.5).astype(np.uint8) * 255, (w, h), interpolation=cv2.INTER_NEAREST))
+        masks = torch.as_tensor(stitched[None]) if stitched.any() else None
+        return [Results(frame, path="", names=self.model.names, masks=masks)]
+
+    def summary(self):
+        total = self.tiles_run + self.tiles_skipped
+        return {
+            "frames": self.frames,
+            "tiles_run": self.tiles_run,
+            "tiles_skipped": self.tiles_skipped,
+            "skip_ratio": round(self.tiles_skipped / total, 4) if total else 0.0,
+        }
@@ -0,0 +1,229 @@
+import json
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+
+HOURS = 24
+STALE_TRACK_S = 3600.0     # un track_id absent depuis plus longtemps est oublié
+
+
+# -----------------------------
+# AGRÉGATS DU TRIAGE
+# -----------------------------
+class YardAggregator:
+    """
+    Agrégats du dashboard (src/services/smartYardApi.js) tenus à jour frame par frame,
+    sans relire occupancy_per_frame.csv :
+      - 24 cases horaires tournantes (index = heure % 24) : frames, frames occupées par voie,
+        arrivées sur voie ; une case est remise à zéro quand son heure revient ;
+      - état courant par voie et par train (voie, depuis quand).
+    update() coûte O(voies + trains) par frame ; les sorties JSON ne sont construites qu'au
+    moment de persister (toutes les `interval_s` secondes) et servies telles quelles.
+
+    Temps : `start_time` (epoch) + temps vidéo ; par défaut l'heure de lancement.
+    Arrivée : un train apparaît sur une voie différente de la dernière voie où il a été vu.
+    Trains : en maintenance (voie de `maintenance_voies`), disponibles (stationnés sur la même
+    voie depuis `parked_after_s`), actifs (les autres trains visibles).
+    """
+
+    def __init__(self, voies, path, interval_s=5.0, start_time=None, parked_after_s=300.0,
+                 maintenance_voies=(), port=0, host="127.0.0.1", resume=False):
+        self.voies = list(voies)
+        self.path = Path(path)
+        self.interval_s = interval_s
+        self.start_time = time.time() if start_time is None else float(start_time)
+        self.parked_after_s = parked_after_s
+        self.maintenance = set(maintenance_voies)
+
+        n = len(self.voies)
+        self.slot_hour = [-1] * HOURS
+        self.frames = [0] * HOURS
+        self.arrivals = [0] * HOURS
+        self.occupied = [[0] * n for _ in range(HOURS)]
+        self.hour = None
+
+        self.tracks = {}                    # track_id -> [voie, depuis (s), vu pour la dernière fois (s)]
+        self.current = {v: [] for v in self.voies}
+        self.now = self.start_time
+
+        self.payload = None
+        self._last_write = time.monotonic()
+        self.writes = 0
+
+        if resume and self.path.exists():
+            self._load_state(json.loads(self.path.read_text(encoding="utf-8")).get("state", {}))
+
+        self.server = None
+        if port:
+            self.server = ThreadingHTTPServer((host, port), _handler(self))
+            threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    # -- boucle de frames --
+    def _advance(self, hour):
+        # cases des heures écoulées remises à zéro (au plus 24)
+        start = hour - HOURS + 1 if self.hour is None else max(self.hour + 1, hour - HOURS + 1)
+        for h in range(start, hour + 1):
+            s = h % HOURS
+            if self.slot_hour[s] != h:
+                self.slot_hour[s] = h
+                self.frames[s] = 0
+                self.arrivals[s] = 0
+                self.occupied[s] = [0] * len(self.voies)
+        self.hour = hour
+
+    def update(self, t_s, trains, occupancy_map):
+        """trains : trains de la frame (track_id, voie) ; occupancy_map : voie -> [track_id]."""
+        now = self.start_time + t_s
+        self.now = now
+        hour = int(now // 3600)
+        if hour != self.hour:
+            self._advance(hour)
+        s = hour % HOURS
+
+        self.frames[s] += 1
+        occ = self.occupied[s]
+        for i, voie in enumerate(self.voies):
+            if occupancy_map.get(voie):
+                occ[i] += 1
+        self.current = occupancy_map
+
+        for t in trains:
+            tid, voie = t["track_id"], t["voie"]
+            if tid is None:
+                continue
+            state = self.tracks.get(tid)
+            if state is None:
+                state = self.tracks[tid] = [None, now, now]
+            if voie is not None and voie != state[0]:
+                self.arrivals[s] += 1
+                state[0], state[1] = voie, now
+            state[2] = now
+
+        if time.monotonic() - self._last_write >= self.interval_s:
+            self.persist()
+
+    # -- sorties --
+    def _window(self):
+        """Cases des 24 dernières heures, de la plus ancienne à l'heure courante."""
+        cur = self.hour if self.hour is not None else int(self.now // 3600)
+        for h in range(cur - HOURS + 1, cur + 1):
+            s = h % HOURS
+            yield h, (s if self.slot_hour[s] == h else None)
+
+    def utilization(self):
+        frames = sum(self.frames[s] for _, s in self._window() if s is not None)
+        occ = [0] * len(self.voies)
+        for _, s in self._window():
+            if s is not None:
+                for i, v in enumerate(self.occupied[s]):
+                    occ[i] += v
+        return [round(100.0 * o / frames) if frames else 0 for o in occ]
+
+    def statistics(self):
+        visible = [(tid, st) for tid, st in self.tracks.items() if st[2] == self.now]
+        maintenance = sum(1 for _, st in visible if st[0] in self.maintenance)
+        available = sum(1 for _, st in visible
+                        if st[0] is not None and st[0] not in self.maintenance
+                        and self.now - st[1] >= self.parked_after_s)
+        hours = [self.arrivals[s] for _, s in self._window() if s is not None and self.frames[s]]
+        return {
+            "activeTrains": len(visible) - maintenance - available,
+            "maintenanceTrains": maintenance,
+            "availableTrains": available,
+            "availableTracks": sum(1 for v in self.voies if not self.current.get(v) and v not in self.maintenance),
+            "averageTraffic": round(sum(hours) / len(hours), 1) if hours else 0,
+        }
+
+    def traffic_data(self):
+        labels, values = [], []
+        for h, s in self._window():
+            labels.append(f"{time.localtime(h * 3600).tm_hour}h")
+            values.append(self.arrivals[s] if s is not None else 0)
+        return {"labels": labels, "values": values}
+
+    def track_utilization(self):
+        return {"labels": [f"Voie {i}" for i in range(1, len(self.voies) + 1)], "values": self.utilization()}
+
+    def track_list(self):
+        out = []
+        for i, (voie, load) in enumerate(zip(self.voies, self.utilization()), start=1):
+            ids = self.current.get(voie) or []
+            status = "maintenance" if voie in self.maintenance else ("occupied" if ids else "available")
+            out.append({"id": i, "status": status, "capacity": 100, "currentLoad": load,
+                        "trainId": str(ids[0]) if ids else None})
+        return out
+
+    def build(self):
+        """Même forme que subscribeToUpdates() de smartYardApi.js (+ horodatage et état brut)."""
+        return {
+            "statistics": self.statistics(),
+            "trafficData": self.traffic_data(),
+            "trackUtilization": self.track_utilization(),
+            "tracks": self.track_list(),
+            "updated": time.strftime("%Y-%m-%dT%H:%M:%S", time.localtime(self.now)),
+            "state": {"voies": self.voies, "slot_hour": self.slot_hour, "frames": self.frames,
+                      "arrivals": self.arrivals, "occupied": self.occupied},
+        }
+
+    def persist(self):
+        # oubli des trains disparus depuis longtemps
+        for tid in [tid for tid, st in self.tracks.items() if self.now - st[2] > STALE_TRACK_S]:
+            del self.tracks[tid]
+        self.payload = self.build()
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self.path.with_suffix(self.path.suffix + ".tmp")
+        tmp.write_text(json.dumps(self.payload, ensure_ascii=False), encoding="utf-8")
+        os.replace(tmp, self.path)  # remplacement atomique : le dashboard ne lit jamais un fichier partiel
+        self._last_write = time.monotonic()
+        self.writes += 1
+
+    def _load_state(self, state):
+        if state.get("voies") != self.voies:
+            return
+        self.slot_hour = state["slot_hour"]
+        self.frames = state["frames"]
+        self.arrivals = state["arrivals"]
+        self.occupied = state["occupied"]
+
+    def close(self):
+        self.persist()
+        if self.server is not None:
+            self.server.shutdown()
+
+
+# -----------------------------
+# ENDPOINT
+# -----------------------------
+ROUTES = {
+    "/api/state": None,
+    "/api/statistics": "statistics",
+    "/api/traffic": "trafficData",
+    "/api/track-utilization": "trackUtilization",
+    "/api/tracks": "tracks",
+}
+
+
+def _handler(agg):
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            route = self.path.split("?")[0].rstrip("/")
+            if route not in ROUTES or agg.payload is None:
+                self.send_error(404 if route not in ROUTES else 503)
+                return
+            key = ROUTES[route]
+            data = agg.payload if key is None else agg.payload[key]
+            body = json.dumps(data, ensure_ascii=False).encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Access-Control-Allow-Origin", "*")   # dashboard Vite sur un autre port
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    return Handler
@@ -0,0 +1,234 @@
+import atexit
+import bisect
+import json
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+from stage_timer import HIST_EDGES_MS, NULL_TIMER
+
+
+# -----------------------------
+# CONFIG
+# -----------------------------
+# Lues UNE FOIS à l'import : si YARD_METRICS != "1", inc/observe/set_gauge/timer
+# sont des fonctions vides et le coût dans la boucle de frames est négligeable.
+#   YARD_METRICS=1                   active les métriques
+#   YARD_METRICS_PORT=9108           endpoint local /metrics (Prometheus) et /metrics.json, 0 = pas de serveur
+#   YARD_METRICS_SNAPSHOT=path.json  snapshot JSON périodique (optionnel)
+#   YARD_METRICS_INTERVAL_S=10       période des snapshots
+ENABLED = os.environ.get("YARD_METRICS", "0") == "1"
+HOST = "127.0.0.1"
+PORT = int(os.environ.get("YARD_METRICS_PORT", "9108"))
+SNAPSHOT_PATH = os.environ.get("YARD_METRICS_SNAPSHOT", "")
+SNAPSHOT_INTERVAL_S = float(os.environ.get("YARD_METRICS_INTERVAL_S", "10"))
+
+PREFIX = "yard_"
+
+COUNT_BUCKETS = [0, 1, 2, 3, 4, 5, 6, 8, 10, 15, 20]
+
+# Étapes (voir stage_timer) qui correspondent à un appel modèle
+MODEL_STAGES = {"rail_predict": "rails", "track": "trains"}
+
+# name -> (type, aide, buckets)
+DEFINITIONS = {
+    "frames_total": ("counter", "Frames traitées", None),
+    "dropped_frames_total": ("counter", "Frames illisibles sautées par le décodeur (reason=read_failure)", None),
+    "gated_frames_total": ("counter", "Frames sans appel modèle (motion gate)", None),
+    "cascade_escalations_total": ("counter", "Frames envoyées au modèle complet (cascade)", None),
+    "events_total": ("counter", "Événements d'occupation émis", None),
+    "rails_mismatch_total": ("counter", "Frames où rails_detected != EXPECTED_RAILS", None),
+    "rails_detected": ("gauge", "Voies détectées sur la dernière frame", None),
+    "rails_expected": ("gauge", "EXPECTED_RAILS", None),
+    "queue_depth": ("gauge", "Profondeur des files internes", None),
+    "time_to_first_result_seconds": ("gauge", "Lancement du processus -> première frame écrite (s)", None),
+    "frame_latency_ms": ("histogram", "Latence totale par frame (ms)", HIST_EDGES_MS),
+    "stage_latency_ms": ("histogram", "Latence par étape (ms)", HIST_EDGES_MS),
+    "model_latency_ms": ("histogram", "Latence des appels modèle (ms)", HIST_EDGES_MS),
+    "detections_per_frame": ("histogram", "Trains détectés par frame", COUNT_BUCKETS),
+}
+
+
+# -----------------------------
+# REGISTRE
+# -----------------------------
+_lock = threading.Lock()
+_series = {name: {} for name in DEFINITIONS}   # name -> {labels(tuple): valeur | [counts, sum, count]}
+_const_labels = {}
+_started = False
+
+
+def _key(labels):
+    return tuple(sorted(labels.items())) if labels else ()
+
+
+def _inc(name, value=1, **labels):
+    s = _series[name]
+    k = _key(labels)
+    s[k] = s.get(k, 0) + value
+
+
+def _set_gauge(name, value, **labels):
+    _series[name][_key(labels)] = value
+
+
+def _observe(name, value, **labels):
+    s = _series[name]
+    k = _key(labels)
+    h = s.get(k)
+    if h is None:
+        buckets = DEFINITIONS[name][2]
+        h = s[k] = [[0] * (len(buckets) + 1), 0.0, 0]
+        # h = [compte par case (non cumulé), somme, total]
+    h[0][bisect.bisect_left(DEFINITIONS[name][2], value)] += 1
+    h[1] += value
+    h[2] += 1
+
+
+class MetricsTimer:
+    """
+    Même interface que StageTimer : chaque lap alimente stage_latency_ms
+    (et model_latency_ms pour les étapes modèle), end_frame alimente frame_latency_ms.
+    """
+
+    def __init__(self):
+        self._t_frame = self._t = time.perf_counter()
+
+    def start(self):
+        self._t_frame = self._t = time.perf_counter()
+
+    def lap(self, stage):
+        now = time.perf_counter()
+        ms = (now - self._t) * 1000.0
+        self._t = now
+        _observe("stage_latency_ms", ms, stage=stage)
+        model = MODEL_STAGES.get(stage)
+        if model is not None:
+            _observe("model_latency_ms", ms, model=model)
+
+    def end_frame(self):
+        _observe("frame_latency_ms", (time.perf_counter() - self._t_frame) * 1000.0)
+        _inc("frames_total")
+
+
+def _timer():
+    return MetricsTimer()
+
+
+def _noop(*args, **kwargs):
+    pass
+
+
+def _null_timer():
+    return NULL_TIMER
+
+
+# API publique : figée à l'import selon ENABLED
+if ENABLED:
+    inc, set_gauge, observe, timer = _inc, _set_gauge, _observe, _timer
+else:
+    inc = set_gauge = observe = _noop
+    timer = _null_timer
+
+
+# -----------------------------
+# EXPOSITION
+# -----------------------------
+def _fmt_labels(labels, extra=None):
+    items = list(_const_labels.items()) + list(labels) + (extra or [])
+    if not items:
+        return ""
+    return "{" + ",".join(f'{k}="{v}"' for k, v in items) + "}"
+
+
+def render_prometheus():
+    lines = []
+    with _lock:
+        for name, (mtype, help_txt, buckets) in DEFINITIONS.items():
+            full = PREFIX + name
+            lines.append(f"# HELP {full} {help_txt}")
+            lines.append(f"# TYPE {full} {mtype}")
+            for labels, v in list(_series[name].items()):
+                if mtype != "histogram":
+                    lines.append(f"{full}{_fmt_labels(labels)} {v}")
+                    continue
+                counts, total, n = v
+                cum = 0
+                for edge, c in zip(buckets + ["+Inf"], counts):
+                    cum += c
+                    lines.append(f"{full}_bucket{_fmt_labels(labels, [('le', edge)])} {cum}")
+                lines.append(f"{full}_sum{_fmt_labels(labels)} {total}")
+                lines.append(f"{full}_count{_fmt_labels(labels)} {n}")
+    return "\n".join(lines) + "\n"
+
+
+def snapshot():
+    out = {"time": time.time(), "labels": dict(_const_labels), "metrics": {}}
+    with _lock:
+        for name, (mtype, _, buckets) in DEFINITIONS.items():
+            series = []
+            for labels, v in list(_series[name].items()):
+                entry = {"labels": dict(labels)}
+                if mtype == "histogram":
+                    entry.update({"buckets": buckets, "counts": list(v[0]), "sum": v[1], "count": v[2]})
+                else:
+                    entry["value"] = v
+                series.append(entry)
+            out["metrics"][name] = {"type": mtype, "series": series}
+    return out
+
+
+def write_snapshot(path=None):
+    path = Path(path or SNAPSHOT_PATH)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_suffix(path.suffix + ".tmp")
+    tmp.write_text(json.dumps(snapshot(), ensure_ascii=False), encoding="utf-8")
+    os.replace(tmp, path)  # remplacement atomique : un lecteur ne voit jamais un fichier partiel
+
+
+class _Handler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.startswith("/metrics.json"):
+            body, ctype = json.dumps(snapshot()).encode("utf-8"), "application/json"
+        elif self.path.startswith("/metrics"):
+            body, ctype = render_prometheus().encode("utf-8"), "text/plain; version=0.0.4"
+        else:
+            self.send_error(404)
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", ctype)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass  # pas de log par requête dans la console des scripts
+
+
+def _snapshot_loop():
+    while True:
+        time.sleep(SNAPSHOT_INTERVAL_S)
+        write_snapshot()
+
+
+def start(**const_labels):
+    """
+    Démarre l'endpoint HTTP et/ou les snapshots (threads daemon). Sans effet si désactivé.
+    const_labels: labels ajoutés à toutes les séries (ex: script="infer_rails").
+    """
+    global _started
+    if not ENABLED or _started:
+        return
+    _started = True
+    _const_labels.update(const_labels)
+
+    if PORT:
+        server = ThreadingHTTPServer((HOST, PORT), _Handler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        print(f"📈 Métriques: http://{HOST}:{PORT}/metrics")
+    if SNAPSHOT_PATH:
+        threading.Thread(target=_snapshot_loop, daemon=True).start()
+        atexit.register(write_snapshot)
+        print(f"📈 Snapshots: {SNAPSHOT_PATH} (toutes les {SNAPSHOT_INTERVAL_S:g} s)")
@@ -0,0 +1,188 @@
+import json
+import math
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import cv2
+import numpy as np
+import yaml
+from tqdm import tqdm
+
+
+# -------------------------
+# CONFIG (modifie si besoin)
+# -------------------------
+DATA_YAML = Path("2_configs/yolo/data_trains.yaml")
+IMGSZ = 640
+SPLITS = ["train", "val", "test"]
+
+# Dossier de sortie : <path du dataset>/cache/imgsz<IMGSZ>/
+CACHE_DIRNAME = "cache"
+
+# Décodage en parallèle (cv2 relâche le GIL pendant imread/resize)
+NUM_THREADS = 8
+
+# Valeur de padding utilisée par Ultralytics pour le letterbox
+PAD_VALUE = 114
+
+IMG_EXTS = {".jpg", ".jpeg", ".png", ".bmp", ".webp"}
+
+
+def die(msg: str):
+    raise SystemExit(f"\n❌ {msg}\n")
+
+
+def load_data_yaml(data_yaml: Path):
+    """
+    Lit un YAML de dataset Ultralytics et retourne (racine, {split: dossier images}).
+    """
+    cfg = yaml.safe_load(data_yaml.read_text(encoding="utf-8"))
+    root = Path(cfg["path"])
+    split_dirs = {}
+    for split in SPLITS:
+        if cfg.get(split):
+            split_dirs[split] = root / cfg[split]
+    return root, split_dirs
+
+
+def cache_dir_for(root: Path, imgsz: int):
+    return root / CACHE_DIRNAME / f"imgsz{imgsz}"
+
+
+def list_images(folder: Path):
+    if not folder.exists():
+        return []
+    return sorted(p for p in folder.iterdir() if p.suffix.lower() in IMG_EXTS)
+
+
+def resize_long_side(im, imgsz: int):
+    """
+    Même redimensionnement que BaseDataset.load_image (rect_mode=True) d'Ultralytics :
+    côté long ramené à imgsz, ratio conservé.
+    """
+    h0, w0 = im.shape[:2]
+    r = imgsz / max(h0, w0)
+    if r != 1:
+        w = min(math.ceil(w0 * r), imgsz)
+        h = min(math.ceil(h0 * r), imgsz)
+        im = cv2.resize(im, (w, h), interpolation=cv2.INTER_LINEAR)
+    return im
+
+
+def letterbox_into(slot, im):
+    """
+    Copie l'image redimensionnée en haut à gauche du slot (imgsz, imgsz, 3)
+    et remplit le reste avec PAD_VALUE.
+    Le padding est à droite/en bas pour que slot[:h, :w] redonne exactement
+    l'image attendue par Ultralytics (les labels normalisés restent valides).
+    """
+    h, w = im.shape[:2]
+    slot[:h, :w] = im
+    slot[h:, :] = PAD_VALUE
+    slot[:h, w:] = PAD_VALUE
+
+
+def store_paths(cache_dir: Path, split: str):
+    return cache_dir / f"{split}.u8", cache_dir / f"{split}.json"
+
+
+def file_signature(p: Path):
+    st = p.stat()
+    return [st.st_size, int(st.st_mtime)]
+
+
+def is_up_to_date(index_path: Path, images, imgsz: int):
+    if not index_path.exists():
+        return False
+    index = json.loads(index_path.read_text(encoding="utf-8"))
+    if index.get("imgsz") != imgsz or len(index.get("files", {})) != len(images):
+        return False
+    for img in images:
+        entry = index["files"].get(img.name)
+        if entry is None or entry["sig"] != file_signature(img):
+            return False
+    return True
+
+
+def build_split(images, cache_dir: Path, split: str, imgsz: int):
+    """
+    Décode chaque image une seule fois, la letterboxe à imgsz et l'écrit
+    dans un tableau uint8 memory-mappé (n, imgsz, imgsz, 3).
+    L'index JSON associe chaque fichier à son slot et à ses tailles (h0,w0) / (h,w).
+    """
+    data_path, index_path = store_paths(cache_dir, split)
+    shape = (len(images), imgsz, imgsz, 3)
+    store = np.memmap(data_path, mode="w+", dtype=np.uint8, shape=shape)
+
+    files = {}
+
+    def work(k):
+        img = images[k]
+        im = cv2.imread(str(img))
+        if im is None:
+            return k, img, None, None
+        h0, w0 = im.shape[:2]
+        im = resize_long_side(im, imgsz)
+        letterbox_into(store[k], im)
+        return k, img, (h0, w0), im.shape[:2]
+
+    skipped = []
+    with ThreadPoolExecutor(max_workers=NUM_THREADS) as pool:
+        for k, img, hw0, hw in tqdm(pool.map(work, range(len(images))), total=len(images),
+                                    desc=f"Cache {split}", unit="img"):
+            if hw0 is None:
+                skipped.append(img.name)
+                continue
+            files[img.name] = {"slot": k, "hw0": list(hw0), "hw": list(hw), "sig": file_signature(img)}
+
+    store.flush()   # données sur disque avant l'index (qui rend le cache valide)
+
+    index = {"imgsz": imgsz, "shape": list(shape), "dtype": "uint8", "files": files}
+    index_path.write_text(json.dumps(index, ensure_ascii=False), encoding="utf-8")
+    return len(files), skipped
+
+
+def open_split(cache_dir: Path, split: str):
+    """
+    Ouvre un store en lecture seule. Retourne (tableau memmap, index) ou (None, None).
+    """
+    data_path, index_path = store_paths(cache_dir, split)
+    if not data_path.exists() or not index_path.exists():
+        return None, None
+    index = json.loads(index_path.read_text(encoding="utf-8"))
+    store = np.memmap(data_path, mode="r", dtype=np.uint8, shape=tuple(index["shape"]))
+    return store, index
+
+
+def main():
+    if not DATA_YAML.exists():
+        die(f"YAML introuvable: {DATA_YAML}")
+
+    root, split_dirs = load_data_yaml(DATA_YAML)
+    cache_dir = cache_dir_for(root, IMGSZ)
+    cache_dir.mkdir(parents=True, exist_ok=True)
+
+    print(f"\n📦 Dataset: {root}  (imgsz={IMGSZ})")
+    total_bytes = 0
+    for split, folder in split_dirs.items():
+        images = list_images(folder)
+        if not images:
+            print(f"⚠️ {split}: aucune image dans {folder}")
+            continue
+
+        _, index_path = store_paths(cache_dir, split)
+        if is_up_to_date(index_path, images, IMGSZ):
+            print(f"✅ {split}: cache à jour ({len(images)} images)")
+        else:
+            n, skipped = build_split(images, cache_dir, split, IMGSZ)
+            print(f"✅ {split}: {n} images écrites")
+            if skipped:
+                print(f"⚠️ {split}: illisibles: {len(skipped)} (ex: {skipped[:5]})")
+        total_bytes += len(images) * IMGSZ * IMGSZ * 3
+
+    print(f"\n💾 Taille du cache: {total_bytes / 1e6:.1f} MB")
+    print(f"📁 Cache: {cache_dir}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,305 @@
+import json
+import os
+import shutil
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import cv2
+import yaml
+from ultralytics import YOLO
+
+from ingest_raw_images import PhashIndex, hash_file
+
+
+# -------------------------
+# CONFIG (modifie si besoin)
+# -------------------------
+# Modèles "teacher" actuels (yolo11s, imgsz 640) et YAML de données annotées
+TEACHERS = {
+    "detect": {"run": Path("runs/detect/train5"), "data": Path("2_configs/yolo/data_trains.yaml")},
+    "segment": {"run": Path("runs/segment/train2"), "data": Path("2_configs/yolo/data_rails_1class.yaml")},
+}
+
+# Élèves candidats : poids de départ x tailles d'entrée
+STUDENTS = {
+    "detect": ["yolo11n.pt"],
+    "segment": ["yolo11n-seg.pt"],
+}
+IMGSZ_CANDIDATES = [640, 480, 320]
+
+# Distillation : le teacher pseudo-annote des images NON annotées (frames extraites des
+# vidéos de la gare, ex. 0_raw) qui s'ajoutent au split train annoté.
+EXTRA_IMAGES = [Path("0_raw")]
+IMG_EXTS = {".jpg", ".jpeg", ".png", ".bmp"}
+TEACHER_CONF = 0.40
+# Fuite vers val/test : une image de EXTRA_IMAGES identique (sha256) ou quasi identique (pHash)
+# à une image d'un split annoté n'est pas pseudo-annotée. Hashs lus dans l'index d'ingestion.
+RAW_INDEX = Path("0_raw/raw_index.json")
+LEAK_PHASH_BITS = 4       # distance de Hamming pHash max (comme NEAR_DUP_BITS de ingest_raw_images.py)
+HASH_WORKERS = os.cpu_count() or 4
+
+DISTILL_ROOT = Path("1_datasets/distill")      # datasets GT + pseudo-labels (un par tâche)
+PROJECT = "3_training/runs/distill"
+
+EPOCHS = 60
+BATCH = 8
+DEVICE = "cpu"
+WORKERS = 8
+PATIENCE = 20
+
+EXPORT_DIR = Path("4_models/exports")
+EXPORT_FORMAT = "onnx"
+
+# Mesures CPU sur le split test
+LATENCY_IMAGES = 50
+LATENCY_WARMUP = 5
+TARGET_FPS = 25.0     # détection + segmentation ensemble, sur la box edge (CPU)
+
+OUT_REPORT = Path("6_evaluation/reports/distill_report.json")
+
+
+def die(msg: str):
+    raise SystemExit(f"\n❌ {msg}\n")
+
+
+# -------------------------
+# DATASET DISTILLÉ
+# -------------------------
+def teacher_weights(run_dir: Path):
+    for name in ["best.pt", "best.onnx"]:
+        p = run_dir / "weights" / name
+        if p.exists():
+            return p
+    return None
+
+
+def link_or_copy(src: Path, dst: Path):
+    if dst.exists():
+        return
+    dst.parent.mkdir(parents=True, exist_ok=True)
+    try:
+        os.link(src, dst)  # pas de copie si même disque
+    except OSError:
+        shutil.copy2(src, dst)
+
+
+def list_images(folder: Path):
+    if not folder.exists():
+        return []
+    return sorted(p for p in folder.rglob("*") if p.suffix.lower() in IMG_EXTS)
+
+
+def split_hashes(images):
+    """sha256 et PhashIndex des images annotées (tous splits confondus)."""
+    shas, phashes = set(), PhashIndex()
+    with ThreadPoolExecutor(max_workers=HASH_WORKERS) as pool:
+        for img, (sha, ph) in zip(images, pool.map(hash_file, images)):
+            shas.add(sha)
+            if ph is not None:
+                phashes.add(ph, img.as_posix())
+    return shas, phashes
+
+
+def raw_hashes(img: Path, raw_files):
+    """(sha256, pHash) d'une image extra : depuis raw_index.json si elle y est, sinon recalculés."""
+    e = raw_files.get(img.name)
+    if e is not None:
+        return e["sha256"], (int(e["phash"], 16) if e.get("phash") else None)
+    return hash_file(img)
+
+
+def pseudo_label_lines(result, task):
+    lines = []
+    if task == "segment":
+        if result.masks is None:
+            return lines
+        for cls, poly in zip(result.boxes.cls.tolist(), result.masks.xyn):
+            if len(poly) < 3:
+                continue
+            coords = " ".join(f"{v:.6f}" for v in poly.reshape(-1))
+            lines.append(f"{int(cls)} {coords}")
+    else:
+        for cls, (x, y, w, h) in zip(result.boxes.cls.tolist(), result.boxes.xywhn.tolist()):
+            lines.append(f"{int(cls)} {x:.6f} {y:.6f} {w:.6f} {h:.6f}")
+    return lines
+
+
+def build_distill_dataset(task, teacher, data_yaml: Path):
+    """
+    DISTILL_ROOT/<task>/ : splits annotés (liens) + images de EXTRA_IMAGES
+    pseudo-annotées par le teacher dans train (préfixe pl_). Incrémental :
+    une image déjà pseudo-annotée n'est pas re-prédite. Les images extra déjà
+    présentes dans un split (sha256 ou pHash) sont exclues, et retirées si un
+    run précédent les avait pseudo-annotées.
+    """
+    cfg = yaml.safe_load(data_yaml.read_text(encoding="utf-8"))
+    src_root = Path(cfg["path"])
+    out_root = DISTILL_ROOT / task
+
+    annotated = []
+    for split in ["train", "val", "test"]:
+        if not cfg.get(split):
+            continue
+        for img in list_images(src_root / cfg[split]):
+            annotated.append(img)
+            rel = img.relative_to(src_root / cfg[split])
+            link_or_copy(img, out_root / "images" / split / rel)
+            lbl = src_root / "labels" / split / rel.with_suffix(".txt")
+            if lbl.exists():
+                link_or_copy(lbl, out_root / "labels" / split / rel.with_suffix(".txt"))
+
+    shas, phashes = split_hashes(annotated)
+    raw_files = json.loads(RAW_INDEX.read_text(encoding="utf-8"))["files"] if RAW_INDEX.exists() else {}
+
+    n_pl, n_leak = 0, 0
+    for folder in EXTRA_IMAGES:
+        for img in list_images(folder):
+            name = f"pl_{img.stem}"
+            lbl = out_root / "labels" / "train" / f"{name}.txt"
+            sha, ph = raw_hashes(img, raw_files)
+            if sha in shas or (ph is not None and phashes.nearest(ph)[1] <= LEAK_PHASH_BITS):
+                lbl.unlink(missing_ok=True)
+                (out_root / "images" / "train" / f"{name}{img.suffix.lower()}").unlink(missing_ok=True)
+                n_leak += 1
+                continue
+            if lbl.exists():
+                continue
+            r = teacher.predict(str(img), conf=TEACHER_CONF, device=DEVICE, verbose=False)[0]
+            link_or_copy(img, out_root / "images" / "train" / f"{name}{img.suffix.lower()}")
+            lbl.parent.mkdir(parents=True, exist_ok=True)
+            lbl.write_text("\n".join(pseudo_label_lines(r, task)) + "\n", encoding="utf-8")
+            n_pl += 1
+
+    out_yaml = out_root / "data.yaml"
+    out_cfg = {"path": str(out_root), "train": "images/train", "val": "images/val",
+               "test": "images/test", "names": cfg["names"]}
+    out_yaml.write_text(yaml.safe_dump(out_cfg, sort_keys=False, allow_unicode=True), encoding="utf-8")
+    print(f"🏷️ {task}: {n_pl} nouvelles images pseudo-annotées -> {out_root} "
+          f"({n_leak} exclues : déjà dans un split annoté)")
+    return out_yaml
+
+
+# -------------------------
+# MESURES
+# -------------------------
+def load_test_frames(data_yaml: Path, n):
+    cfg = yaml.safe_load(data_yaml.read_text(encoding="utf-8"))
+    imgs = list_images(Path(cfg["path"]) / cfg.get("test", cfg["val"]))[:n]
+    return [cv2.imread(str(p)) for p in imgs]
+
+
+def measure(weights: Path, task, imgsz, data_yaml: Path, frames):
+    """
+    mAP50-95 (split test, données annotées), temps de chargement jusqu'au 1er résultat,
+    latence CPU par image (p50 / moyenne), taille du fichier.
+    """
+    t0 = time.perf_counter()
+    model = YOLO(str(weights), task=task)
+    model.predict(frames[0], imgsz=imgsz, device="cpu", verbose=False)
+    load_s = time.perf_counter() - t0
+
+    for f in frames[:LATENCY_WARMUP]:
+        model.predict(f, imgsz=imgsz, device="cpu", verbose=False)
+    times = []
+    for f in frames:
+        t = time.perf_counter()
+        model.predict(f, imgsz=imgsz, device="cpu", verbose=False)
+        times.append((time.perf_counter() - t) * 1000.0)
+    times.sort()
+
+    metrics = model.val(data=str(data_yaml), split="test", imgsz=imgsz, device="cpu", plots=False, verbose=False)
+    m = metrics.seg if task == "segment" else metrics.box
+    return {
+        "map50_95": round(float(m.map), 4),
+        "map50": round(float(m.map50), 4),
+        "load_s": round(load_s, 3),
+        "cpu_ms_p50": round(times[len(times) // 2], 2),
+        "cpu_ms_mean": round(sum(times) / len(times), 2),
+        "size_mb": round(weights.stat().st_size / 1e6, 2),
+    }
+
+
+def export(weights: Path, imgsz, out_name):
+    exported = Path(YOLO(str(weights)).export(format=EXPORT_FORMAT, imgsz=imgsz, device="cpu"))
+    EXPORT_DIR.mkdir(parents=True, exist_ok=True)
+    dst = EXPORT_DIR / f"{out_name}{exported.suffix}"
+    shutil.copyfile(exported, dst)
+    shutil.copyfile(weights, EXPORT_DIR / f"{out_name}.pt")
+    return dst
+
+
+# -------------------------
+# MAIN
+# -------------------------
+def run_task(task):
+    spec = TEACHERS[task]
+    weights = teacher_weights(spec["run"])
+    if weights is None:
+        die(f"Poids teacher introuvables dans {spec['run']}/weights")
+    teacher = YOLO(str(weights), task=task)
+    distill_yaml = build_distill_dataset(task, teacher, spec["data"])
+    frames = load_test_frames(spec["data"], LATENCY_IMAGES)
+    if not frames:
+        die(f"Aucune image de test pour {spec['data']}")
+
+    rows = []
+    # référence : le teacher exporté dans le même format
+    ref_name = f"{task}_teacher_{spec['run'].name}_640"
+    exported = export(weights, 640, ref_name) if weights.suffix == ".pt" else weights
+    rows.append({"task": task, "name": ref_name, "student": None, "imgsz": 640,
+                 "weights": str(exported), **measure(exported, task, 640, spec["data"], frames)})
+
+    for student in STUDENTS[task]:
+        for imgsz in IMGSZ_CANDIDATES:
+            name = f"{task}_{Path(student).stem}_{imgsz}"
+            print(f"\n🚀 Distillation {name}")
+            model = YOLO(student)
+            model.train(data=str(distill_yaml), imgsz=imgsz, epochs=EPOCHS, batch=BATCH, device=DEVICE,
+                        workers=WORKERS, patience=PATIENCE, project=PROJECT, name=name, exist_ok=True)
+            best = Path(model.trainer.best)
+            exported = export(best, imgsz, name)
+            row = {"task": task, "name": name, "student": student, "imgsz": imgsz, "weights": str(exported)}
+            row.update(measure(exported, task, imgsz, spec["data"], frames))
+            rows.append(row)
+            print(f"📊 {name}: mAP50-95={row['map50_95']}  {row['cpu_ms_p50']} ms  {row['size_mb']} MB")
+    return rows
+
+
+def pairs_meeting_target(rows):
+    det = [r for r in rows if r["task"] == "detect"]
+    seg = [r for r in rows if r["task"] == "segment"]
+    pairs = []
+    for d in det:
+        for s in seg:
+            fps = 1000.0 / (d["cpu_ms_p50"] + s["cpu_ms_p50"])
+            pairs.append({"detect": d["name"], "segment": s["name"], "fps": round(fps, 1),
+                          "map_sum": round(d["map50_95"] + s["map50_95"], 4), "ok": fps >= TARGET_FPS})
+    pairs.sort(key=lambda p: (not p["ok"], -p["map_sum"]))
+    return pairs
+
+
+def main():
+    rows = []
+    for task in TEACHERS:
+        rows.extend(run_task(task))
+    pairs = pairs_meeting_target(rows)
+
+    OUT_REPORT.parent.mkdir(parents=True, exist_ok=True)
+    report = {"target_fps": TARGET_FPS, "export_format": EXPORT_FORMAT, "candidates": rows, "pairs": pairs}
+    OUT_REPORT.write_text(json.dumps(report, indent=2, ensure_ascii=False), encoding="utf-8")
+
+    print("\n📊 Candidats:")
+    for r in rows:
+        print(f"  {r['name']:<32} mAP50-95={r['map50_95']:<7} p50={r['cpu_ms_p50']:>7} ms  "
+              f"charge={r['load_s']} s  {r['size_mb']} MB")
+    ok = [p for p in pairs if p["ok"]]
+    if ok:
+        print(f"🏆 Meilleure paire >= {TARGET_FPS:g} FPS: {ok[0]['detect']} + {ok[0]['segment']} ({ok[0]['fps']} FPS)")
+    else:
+        print(f"⚠️ Aucune paire n'atteint {TARGET_FPS:g} FPS")
+    print(f"🧾 Rapport: {OUT_REPORT}")
+
+
+if __name__ == "__main__":
+    main()
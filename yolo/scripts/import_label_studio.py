@@ -0,0 +1,312 @@
+import hashlib
+import json
+import shutil
+import tempfile
+import time
+import zipfile
+from pathlib import Path
+
+
+# -------------------------
+# CONFIG (modifie si besoin)
+# -------------------------
+# Export YOLO de Label Studio : dossier ou .zip contenant images/, labels/, notes.json
+EXPORT = Path("0_raw/label_studio_export.zip")
+TASK = "trains"              # "trains" | "rails"
+
+DRY_RUN = False              # True : affiche le diff sans rien écrire
+DELETE_MISSING = False       # True : retire du dataset les images absentes de l'export
+
+# Répartition des NOUVELLES images (les images déjà placées gardent leur split)
+TRAIN_RATIO = 0.80
+VAL_RATIO   = 0.10
+TEST_RATIO  = 0.10
+
+IMG_EXTS = {".jpg", ".jpeg", ".png", ".bmp", ".webp"}
+
+# Chaîne de dérivation par tâche (mêmes étapes que les scripts historiques) :
+#   trains : labels (seg) -> labels_det (convert_seg_to_det.py) -> labels_1class (remap_labels_to_one_class.py)
+#            -> 1_datasets/detection_trains (split_yolo_detection.py)
+#   rails  : labels (seg) -> labels_1class (remap_rails_seg_to_one_class.py)
+#            -> 1_datasets/segmentation_rails (split_yolo_seg_rails.py)
+TASKS = {
+    "trains": {"data": Path("data_trains"), "det": True, "split": Path("1_datasets/detection_trains")},
+    "rails": {"data": Path("data_rails"), "det": False, "split": Path("1_datasets/segmentation_rails")},
+}
+SPLITS = ("train", "val", "test")
+MANIFEST_NAME = "import_manifest.json"
+
+
+def die(msg: str):
+    raise SystemExit(f"\n❌ {msg}\n")
+
+
+# -------------------------
+# CONVERSIONS (identiques aux scripts historiques)
+# -------------------------
+def clamp(v):
+    return max(0.0, min(1.0, v))
+
+
+def seg_to_det(text):
+    """convert_seg_to_det.py : polygone -> bbox englobante (cls xc yc w h)."""
+    out_lines = []
+    for line in text.strip().splitlines():
+        parts = line.strip().split()
+        if len(parts) < 7:
+            continue
+        coords = list(map(float, parts[1:]))
+        xs, ys = coords[0::2], coords[1::2]
+        xmin, xmax = min(xs), max(xs)
+        ymin, ymax = min(ys), max(ys)
+        out_lines.append(
+            f"{parts[0]} {clamp((xmin + xmax) / 2):.6f} {clamp((ymin + ymax) / 2):.6f} "
+            f"{clamp(xmax - xmin):.6f} {clamp(ymax - ymin):.6f}"
+        )
+    return "\n".join(out_lines) + ("\n" if out_lines else "")
+
+
+def to_one_class(text, det):
+    """remap_labels_to_one_class.py (det) / remap_rails_seg_to_one_class.py (seg) : classe -> 0."""
+    new_lines = []
+    for line in text.strip().splitlines():
+        parts = line.strip().split()
+        if (len(parts) != 5) if det else (len(parts) < 7):
+            continue
+        parts[0] = "0"
+        new_lines.append(" ".join(parts))
+    return "\n".join(new_lines) + ("\n" if new_lines else "")
+
+
+def remap_classes(text, id_map):
+    """Ids de classe de l'export -> ids du dataset (appariés par nom de catégorie)."""
+    out = []
+    for line in text.splitlines():
+        parts = line.strip().split()
+        if not parts:
+            continue
+        parts[0] = str(id_map[int(parts[0])])
+        out.append(" ".join(parts))
+    return "\n".join(out) + ("\n" if out else "")
+
+
+# -------------------------
+# EXPORT / DATASET
+# -------------------------
+def sha256(data: bytes):
+    return hashlib.sha256(data).hexdigest()
+
+
+def file_sha256(path: Path):
+    with open(path, "rb") as f:
+        return hashlib.file_digest(f, "sha256").hexdigest()
+
+
+def categories(notes: Path):
+    if not notes.exists():
+        return None
+    return {c["id"]: c["name"] for c in json.loads(notes.read_text(encoding="utf-8"))["categories"]}
+
+
+def class_map(export_root: Path, data_dir: Path):
+    src = categories(export_root / "notes.json")
+    dst = categories(data_dir / "notes.json")
+    if src is None or dst is None:
+        return None   # pas de notes.json : ids supposés identiques
+    by_name = {name: i for i, name in dst.items()}
+    unknown = sorted(set(src.values()) - set(by_name))
+    if unknown:
+        die(f"Catégories inconnues du dataset {data_dir}: {unknown} (mets à jour {data_dir / 'notes.json'})")
+    id_map = {i: by_name[name] for i, name in src.items()}
+    return None if all(i == j for i, j in id_map.items()) else id_map
+
+
+def scan_export(root: Path):
+    """stem -> (image, label ou None) de l'export."""
+    img_dir, lbl_dir = root / "images", root / "labels"
+    if not img_dir.exists():
+        die(f"Pas de dossier images/ dans l'export: {root}")
+    items = {}
+    for img in sorted(img_dir.iterdir()):
+        if img.suffix.lower() in IMG_EXTS:
+            lbl = lbl_dir / f"{img.stem}.txt"
+            items[img.stem] = (img, lbl if lbl.exists() else None)
+    return items
+
+
+def find_splits(split_root: Path):
+    """stem -> split d'après 1_datasets/<...>/labels/{train,val,test}."""
+    where = {}
+    for split in SPLITS:
+        d = split_root / "labels" / split
+        if d.exists():
+            for p in d.glob("*.txt"):
+                where[p.stem] = split
+    return where
+
+
+def bootstrap_manifest(data_dir: Path, where):
+    """Premier import : le dataset actuel sert de référence (provenance "initial")."""
+    manifest = {}
+    img_dir, lbl_dir = data_dir / "images", data_dir / "labels"
+    if not img_dir.exists():
+        return manifest
+    for img in sorted(img_dir.iterdir()):
+        if img.suffix.lower() not in IMG_EXTS:
+            continue
+        lbl = lbl_dir / f"{img.stem}.txt"
+        manifest[img.stem] = {
+            "image": img.name,
+            "image_sha256": file_sha256(img),
+            "label_sha256": file_sha256(lbl) if lbl.exists() else None,
+            "source": "initial",
+            "imported": None,
+            "split": where.get(img.stem),
+        }
+    return manifest
+
+
+def assign_split(stem):
+    """Split stable d'une nouvelle image : fonction de son nom, pas de l'ordre d'import."""
+    u = int(hashlib.sha256(stem.encode("utf-8")).hexdigest()[:8], 16) / 0xFFFFFFFF
+    if u < TRAIN_RATIO:
+        return "train"
+    return "val" if u < TRAIN_RATIO + VAL_RATIO else "test"
+
+
+def write_text(path: Path, text):
+    # octets exacts (pas de conversion \n -> \r\n sous Windows) : les hashes restent comparables
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_bytes(text.encode("utf-8"))
+
+
+def unlink(path: Path):
+    if path.exists():
+        path.unlink()
+
+
+# -------------------------
+# IMPORT
+# -------------------------
+def import_export(root: Path, task):
+    cfg = TASKS[task]
+    data_dir, det, split_root = cfg["data"], cfg["det"], cfg["split"]
+    manifest_path = data_dir / MANIFEST_NAME
+
+    where = find_splits(split_root)
+    if manifest_path.exists():
+        manifest = json.loads(manifest_path.read_text(encoding="utf-8"))
+    else:
+        print(f"🧾 Pas de manifeste : indexation du dataset actuel ({data_dir})")
+        manifest = bootstrap_manifest(data_dir, where)
+
+    id_map = class_map(root, data_dir)
+    export = scan_export(root)
+    print(f"📦 Export: {len(export)} images | Dataset: {len(manifest)} images")
+    if id_map:
+        print(f"🔁 Ids de classe remappés: {id_map}")
+
+    added, changed, unchanged, removed = [], [], [], []
+    touched_splits = set()
+    now = time.strftime("%Y-%m-%dT%H:%M:%S")
+
+    for stem, (img, lbl) in export.items():
+        img_bytes = img.read_bytes()
+        raw = lbl.read_bytes().decode("utf-8", errors="ignore") if lbl else ""
+        label = remap_classes(raw, id_map) if id_map else raw
+        img_sha = sha256(img_bytes)
+        lbl_sha = sha256(label.encode("utf-8"))
+
+        entry = manifest.get(stem)
+        if entry and entry["image_sha256"] == img_sha and entry["label_sha256"] == lbl_sha:
+            unchanged.append(stem)
+            continue
+        (changed if entry else added).append(stem)
+        if DRY_RUN:
+            continue
+
+        split = where.get(stem) or (entry or {}).get("split") or assign_split(stem)
+        # image renommée côté export (extension) : l'ancienne disparaît partout
+        if entry and entry["image"] != img.name:
+            unlink(data_dir / "images" / entry["image"])
+            unlink(split_root / "images" / split / entry["image"])
+
+        shutil.copyfile(img, data_dir / "images" / img.name)
+        write_text(data_dir / "labels" / f"{stem}.txt", label)
+        if det:
+            label = seg_to_det(label)
+            write_text(data_dir / "labels_det" / f"{stem}.txt", label)
+        one = to_one_class(label, det)
+        write_text(data_dir / "labels_1class" / f"{stem}.txt", one)
+
+        (split_root / "images" / split).mkdir(parents=True, exist_ok=True)
+        shutil.copyfile(img, split_root / "images" / split / img.name)
+        write_text(split_root / "labels" / split / f"{stem}.txt", one)
+        touched_splits.add(split)
+
+        manifest[stem] = {
+            "image": img.name,
+            "image_sha256": img_sha,
+            "label_sha256": lbl_sha,
+            "source": str(EXPORT),
+            "imported": now,
+            "split": split,
+        }
+
+    for stem in sorted(set(manifest) - set(export)):
+        removed.append(stem)
+        if DRY_RUN or not DELETE_MISSING:
+            continue
+        entry = manifest.pop(stem)
+        unlink(data_dir / "images" / entry["image"])
+        for sub in ("labels", "labels_det", "labels_1class"):
+            unlink(data_dir / sub / f"{stem}.txt")
+        split = where.get(stem) or entry.get("split")
+        if split:
+            unlink(split_root / "images" / split / entry["image"])
+            unlink(split_root / "labels" / split / f"{stem}.txt")
+            touched_splits.add(split)
+
+    if not DRY_RUN:
+        # le cache de labels Ultralytics est indexé sur la taille des fichiers : on l'invalide
+        for split in touched_splits:
+            unlink(split_root / "labels" / f"{split}.cache")
+        write_text(manifest_path, json.dumps(dict(sorted(manifest.items())), indent=2, ensure_ascii=False))
+
+    print(f"\n➕ Nouvelles : {len(added)}" + (f" (ex: {added[:5]})" if added else ""))
+    print(f"✏️ Modifiées : {len(changed)}" + (f" (ex: {changed[:5]})" if changed else ""))
+    print(f"✅ Inchangées: {len(unchanged)}")
+    if removed:
+        action = "retirées" if DELETE_MISSING and not DRY_RUN else "absentes de l'export (gardées)"
+        print(f"➖ {len(removed)} {action} (ex: {removed[:5]})")
+    if DRY_RUN:
+        print("\n🔎 DRY_RUN : rien n'a été écrit.")
+    else:
+        print(f"\n🧾 Manifeste: {manifest_path}")
+
+
+def main():
+    if TASK not in TASKS:
+        die(f"TASK inconnue: {TASK} (attendu: {', '.join(TASKS)})")
+    if abs(TRAIN_RATIO + VAL_RATIO + TEST_RATIO - 1.0) > 1e-9:
+        die("Les ratios doivent faire 1.0.")
+    if not EXPORT.exists():
+        die(f"Export introuvable: {EXPORT}")
+
+    if EXPORT.suffix.lower() == ".zip":
+        with tempfile.TemporaryDirectory() as tmp:
+            with zipfile.ZipFile(EXPORT) as z:
+                z.extractall(tmp)
+            root = Path(tmp)
+            # zip avec un dossier racine unique
+            if not (root / "images").exists():
+                subs = [p for p in root.iterdir() if p.is_dir()]
+                if len(subs) == 1:
+                    root = subs[0]
+            import_export(root, TASK)
+    else:
+        import_export(EXPORT, TASK)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,180 @@
+import hashlib
+import json
+import os
+import shutil
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import cv2
+import numpy as np
+from tqdm import tqdm
+
+
+# -------------------------
+# CONFIG (modifie si besoin)
+# -------------------------
+SRC_DIRS = [Path("trains_images")]   # dossiers d'images brutes à ingérer (récursif)
+PREFIX = "trains"                    # nom stocké : <PREFIX>_<sha256[:16]><ext>
+OUT_DIR = Path("0_raw")
+INDEX_PATH = OUT_DIR / "raw_index.json"
+
+WORKERS = os.cpu_count() or 4        # threads de hash (hashlib et cv2 relâchent le GIL)
+NEAR_DUP_BITS = 4                    # distance de Hamming pHash max pour un quasi-doublon (0 = désactivé)
+MOVE = False                         # True : déplace les fichiers au lieu de les copier
+SAVE_EVERY = 500                     # index réécrit toutes les N images stockées (reprise après arrêt)
+
+IMG_EXTS = {".jpg", ".jpeg", ".png", ".bmp", ".tiff", ".webp"}
+
+
+def die(msg: str):
+    raise SystemExit(f"\n❌ {msg}\n")
+
+
+# -------------------------
+# HASH
+# -------------------------
+def phash(gray):
+    """pHash 64 bits : DCT du 32x32, bits = coefficients 8x8 basse fréquence > médiane (comme mine_frames.py)."""
+    small = cv2.resize(gray, (32, 32), interpolation=cv2.INTER_AREA).astype(np.float32)
+    low = cv2.dct(small)[:8, :8].flatten()
+    bits = low > np.median(low[1:])
+    return int.from_bytes(np.packbits(bits).tobytes(), "big")
+
+
+def hash_file(path: Path):
+    """(sha256, pHash ou None si l'image est illisible) ; une seule lecture du fichier."""
+    data = path.read_bytes()
+    sha = hashlib.sha256(data).hexdigest()
+    # décodage JPEG réduit : le pHash ne regarde qu'un 32x32
+    gray = cv2.imdecode(np.frombuffer(data, dtype=np.uint8), cv2.IMREAD_REDUCED_GRAYSCALE_2)
+    return sha, (phash(gray) if gray is not None else None)
+
+
+class PhashIndex:
+    """pHash des images stockées ; recherche du plus proche vectorisée (xor + popcount)."""
+
+    def __init__(self):
+        self.hashes = np.zeros(1024, dtype=np.uint64)
+        self.names = []
+
+    def add(self, h, name):
+        n = len(self.names)
+        if n == len(self.hashes):
+            self.hashes = np.concatenate([self.hashes, np.zeros_like(self.hashes)])
+        self.hashes[n] = h
+        self.names.append(name)
+
+    def nearest(self, h):
+        n = len(self.names)
+        if n == 0:
+            return None, 64
+        d = np.bitwise_count(self.hashes[:n] ^ np.uint64(h))
+        i = int(np.argmin(d))
+        return self.names[i], int(d[i])
+
+
+# -------------------------
+# INDEX
+# -------------------------
+def load_index():
+    if INDEX_PATH.exists():
+        index = json.loads(INDEX_PATH.read_text(encoding="utf-8"))
+    else:
+        index = {}
+    index.setdefault("files", {})            # nom stocké -> sha256, phash, sources, date
+    index.setdefault("near_duplicates", {})  # source -> image stockée la plus proche, distance
+    index.setdefault("seen", {})             # source -> [taille, mtime_ns, sha256]
+    return index
+
+
+def save_index(index):
+    OUT_DIR.mkdir(parents=True, exist_ok=True)
+    tmp = INDEX_PATH.with_suffix(".json.tmp")
+    tmp.write_text(json.dumps(index, indent=2, ensure_ascii=False), encoding="utf-8")
+    os.replace(tmp, INDEX_PATH)
+
+
+def list_sources():
+    files = []
+    for d in SRC_DIRS:
+        if not d.exists():
+            die(f"Dossier introuvable: {d}")
+        files += [p for p in d.rglob("*") if p.is_file() and p.suffix.lower() in IMG_EXTS]
+    return sorted(files)
+
+
+def stored_name(sha, ext):
+    ext = ".jpg" if ext.lower() == ".jpeg" else ext.lower()
+    return f"{PREFIX}_{sha[:16]}{ext}"
+
+
+def main():
+    index = load_index()
+    files, near, seen = index["files"], index["near_duplicates"], index["seen"]
+    by_sha = {e["sha256"]: name for name, e in files.items()}
+    phashes = PhashIndex()
+    for name, e in files.items():
+        if e.get("phash"):
+            phashes.add(int(e["phash"], 16), name)
+
+    # -- fichiers déjà ingérés (même chemin, taille, mtime) : ni relus ni hashés --
+    todo = []
+    sources = list_sources()
+    for p in sources:
+        st = p.stat()
+        prev = seen.get(p.as_posix())
+        if prev is None or prev[0] != st.st_size or prev[1] != st.st_mtime_ns:
+            todo.append((p, st))
+    print(f"📦 Sources: {len(sources)} | déjà ingérées: {len(sources) - len(todo)} | à traiter: {len(todo)}")
+    if not todo:
+        return
+
+    OUT_DIR.mkdir(parents=True, exist_ok=True)
+    stored, exact, near_dups, unreadable = 0, 0, 0, []
+    now = time.strftime("%Y-%m-%dT%H:%M:%S")
+    transfer = shutil.move if MOVE else shutil.copyfile
+
+    with ThreadPoolExecutor(max_workers=WORKERS) as pool:
+        # map() rend les résultats dans l'ordre des sources : dédoublonnage déterministe
+        results = pool.map(lambda item: hash_file(item[0]), todo)
+        for (p, st), (sha, ph) in tqdm(zip(todo, results), total=len(todo), desc="Ingest", unit="img"):
+            src = p.as_posix()
+            seen[src] = [st.st_size, st.st_mtime_ns, sha]
+
+            if sha in by_sha:                                 # doublon exact
+                entry = files[by_sha[sha]]
+                if src not in entry["sources"]:
+                    entry["sources"].append(src)
+                exact += 1
+                continue
+            if ph is None:
+                unreadable.append(src)
+                continue
+            if NEAR_DUP_BITS:
+                other, dist = phashes.nearest(ph)
+                if dist <= NEAR_DUP_BITS:                     # quasi-doublon : pas stocké
+                    near[src] = {"of": other, "distance": dist, "sha256": sha}
+                    near_dups += 1
+                    continue
+
+            name = stored_name(sha, p.suffix)
+            transfer(p, OUT_DIR / name)
+            files[name] = {"sha256": sha, "phash": f"{ph:016x}", "sources": [src], "ingested": now}
+            by_sha[sha] = name
+            phashes.add(ph, name)
+            stored += 1
+            if stored % SAVE_EVERY == 0:
+                save_index(index)
+
+    save_index(index)
+    print(f"\n✅ Stockées      : {stored}")
+    print(f"🔁 Doublons exacts: {exact}")
+    print(f"≈ Quasi-doublons : {near_dups} (distance pHash <= {NEAR_DUP_BITS})")
+    if unreadable:
+        print(f"⚠️ Illisibles     : {len(unreadable)} (ex: {unreadable[:5]})")
+    print(f"🧾 Index: {INDEX_PATH} ({len(files)} images)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,376 @@
+import csv
+import json
+import math
+import time
+from functools import lru_cache
+from pathlib import Path
+
+import cv2
+import numpy as np
+
+
+# -------------------------
+# CONFIG (modifie si besoin)
+# -------------------------
+RAILS_DIR = Path("data_rails")     # fonds + polygones des voies (labels seg YOLO)
+TRAINS_DIR = Path("data_trains")   # crops de trains (polygones des labels seg YOLO)
+BACKGROUND = None                  # stem d'une image de data_rails ; None = celle qui a le plus de voies annotées
+
+OUT_DIR = Path("1_datasets/tracking_videos")   # lu par evaluate_occupancy.py
+NAME = "synthetic_yard_1080p"
+WIDTH, HEIGHT = 1920, 1080         # 3840, 2160 pour la 4K
+FPS = 25
+DURATION_S = 600                   # durée simulée (plusieurs heures possibles : rien n'est gardé en mémoire)
+SEED = 0
+
+# Trains : un trajet par voie à la fois (entrée depuis le bout lointain, arrêt, stationnement, sortie)
+N_SPRITES = 40                     # crops de trains chargés
+SPRITE_MAX_SIDE = 1024             # taille max d'un crop en mémoire (à 1080p, proportionnel à la résolution)
+TRAIN_HEIGHT_FACTOR = 1.5          # hauteur du train = facteur x largeur de la voie au point d'ancrage
+MOVE_S = (8, 20)                   # durée de l'entrée et de la sortie
+DWELL_S = (30, 300)                # stationnement
+GAP_S = (10, 120)                  # voie libre entre deux trains
+STOP_RANGE = (0.15, 0.6)           # position d'arrêt le long de la voie (0 = bout proche de la caméra, 1 = bout lointain)
+POINT_OFFSET_PX = 2                # même décalage que le pipeline : point bas-centre = y2 - 2px
+
+# Perturbations (motion gate, robustesse)
+NOISE_STD = 2.0                    # bruit capteur (0 = aucun)
+NOISE_FRAMES = 8                   # motifs de bruit précalculés, tournants
+LIGHT_DRIFT = 0.08                 # variation de luminosité (+/- 8 %)
+LIGHT_PERIOD_S = 900
+
+FOURCC = "mp4v"
+SPRITE_CACHE = 512                 # crops redimensionnés gardés (LRU, clés = hauteur arrondie à 4 px)
+
+IMG_EXTS = {".jpg", ".jpeg", ".png", ".bmp", ".webp"}
+
+
+def die(msg: str):
+    raise SystemExit(f"\n❌ {msg}\n")
+
+
+# -------------------------
+# DONNÉES SOURCES
+# -------------------------
+def find_image(images_dir: Path, stem: str):
+    for ext in IMG_EXTS:
+        p = images_dir / f"{stem}{ext}"
+        if p.exists():
+            return p
+    return None
+
+
+def read_polygons(label_path: Path, w: int, h: int):
+    """Labels seg YOLO -> [(cls, points px int32 (N,2))]."""
+    polys = []
+    for line in label_path.read_text(encoding="utf-8", errors="ignore").splitlines():
+        parts = line.split()
+        if len(parts) < 7:
+            continue
+        pts = np.array(parts[1:], dtype=np.float64).reshape(-1, 2) * [w, h]
+        polys.append((int(parts[0]), np.round(pts).astype(np.int32)))
+    return polys
+
+
+def pick_background():
+    labels_dir = RAILS_DIR / "labels"
+    if BACKGROUND:
+        label = labels_dir / f"{BACKGROUND}.txt"
+    else:
+        labels = sorted(labels_dir.glob("*.txt"))
+        if not labels:
+            die(f"Aucun label dans {labels_dir}")
+        # le plus de classes de voies distinctes
+        label = max(labels, key=lambda p: len({l.split()[0] for l in p.read_text(encoding="utf-8").splitlines()
+                                                if len(l.split()) >= 7}))
+    img = find_image(RAILS_DIR / "images", label.stem)
+    if img is None or not label.exists():
+        die(f"Image ou label introuvable pour {label.stem}")
+    return img, label
+
+
+def load_rails(img_path: Path, label_path: Path):
+    """
+    Fond à la résolution de sortie + un masque par voie (polygones de même classe fusionnés),
+    numérotés gauche->droite par centroïde comme connected_components_rails du pipeline.
+    """
+    bg = cv2.imread(str(img_path))
+    if bg is None:
+        die(f"Image illisible: {img_path}")
+    bg = cv2.resize(bg, (WIDTH, HEIGHT), interpolation=cv2.INTER_AREA)
+
+    masks = {}
+    for cls, pts in read_polygons(label_path, WIDTH, HEIGHT):
+        m = masks.setdefault(cls, np.zeros((HEIGHT, WIDTH), dtype=np.uint8))
+        cv2.fillPoly(m, [pts], 255)
+    if not masks:
+        die(f"Aucun polygone de voie dans {label_path}")
+
+    rails = []
+    for m in masks.values():
+        geom = rail_geometry(m)
+        if geom is not None:
+            rails.append((float(np.nonzero(m)[1].mean()), m, geom))
+    rails.sort(key=lambda r: r[0])
+    return bg, [{"voie": f"voie{i}", "mask": m, "geom": g} for i, (_, m, g) in enumerate(rails, start=1)]
+
+
+def rail_geometry(mask, n_bins=64):
+    """
+    Ligne médiane d'une voie (axe principal du masque, découpé en tranches) et largeur par tranche.
+    Retour : {"s": abscisse 0..1, "xy": (N,2), "width": (N,)}, du bout proche (large) au bout lointain.
+    """
+    ys, xs = np.nonzero(mask)
+    if len(xs) < 50:
+        return None
+    pts = np.stack([xs, ys], axis=1).astype(np.float64)
+    mean = pts.mean(axis=0)
+    _, vecs = np.linalg.eigh(np.cov((pts - mean).T))
+    axis, normal = vecs[:, 1], vecs[:, 0]
+    proj = (pts - mean) @ axis
+    perp = (pts - mean) @ normal
+
+    edges = np.linspace(proj.min(), proj.max(), n_bins + 1)
+    idx = np.clip(np.digitize(proj, edges) - 1, 0, n_bins - 1)
+    xy, width = [], []
+    for b in range(n_bins):
+        sel = idx == b
+        if sel.sum() < 5:
+            continue
+        p, q = proj[sel], perp[sel]
+        c = mean + p.mean() * axis + np.median(q) * normal
+        xy.append(c)
+        width.append(np.percentile(q, 95) - np.percentile(q, 5))
+    if len(xy) < 4:
+        return None
+    xy = np.array(xy)
+    width = np.array(width)
+
+    # lissage léger, puis orientation bout proche -> bout lointain (la voie rétrécit en s'éloignant)
+    k = np.ones(3) / 3.0
+    xy[1:-1, 0] = np.convolve(xy[:, 0], k, mode="valid")
+    xy[1:-1, 1] = np.convolve(xy[:, 1], k, mode="valid")
+    half = len(width) // 2
+    if width[:half].mean() < width[-half:].mean():
+        xy, width = xy[::-1], width[::-1]
+
+    # les points doivent rester sur le masque (voies courbes)
+    inside = mask[np.clip(xy[:, 1].astype(int), 0, mask.shape[0] - 1),
+                  np.clip(xy[:, 0].astype(int), 0, mask.shape[1] - 1)] > 0
+    xy, width = xy[inside], width[inside]
+    if len(xy) < 4:
+        return None
+
+    seg = np.linalg.norm(np.diff(xy, axis=0), axis=1)
+    s = np.concatenate([[0.0], np.cumsum(seg)])
+    return {"s": s / s[-1], "xy": xy, "width": width}
+
+
+def point_on_rail(geom, s):
+    x = float(np.interp(s, geom["s"], geom["xy"][:, 0]))
+    y = float(np.interp(s, geom["s"], geom["xy"][:, 1]))
+    return x, y, float(np.interp(s, geom["s"], geom["width"]))
+
+
+def load_sprites(rng):
+    """Crops de trains détourés (polygone) : [(bgr, mask)], taille bornée."""
+    labels = sorted((TRAINS_DIR / "labels").glob("*.txt"))
+    rng.shuffle(labels)
+    max_side = int(SPRITE_MAX_SIDE * HEIGHT / 1080)
+    sprites = []
+    for label in labels:
+        if len(sprites) >= N_SPRITES:
+            break
+        img_path = find_image(TRAINS_DIR / "images", label.stem)
+        if img_path is None:
+            continue
+        img = cv2.imread(str(img_path))
+        if img is None:
+            continue
+        h, w = img.shape[:2]
+        for _, pts in read_polygons(label, w, h):
+            x, y, bw, bh = cv2.boundingRect(pts)
+            if bw < 40 or bh < 40:
+                continue
+            mask = np.zeros((bh, bw), dtype=np.uint8)
+            cv2.fillPoly(mask, [pts - [x, y]], 255)
+            crop = img[y:y + bh, x:x + bw].copy()
+            scale = min(1.0, max_side / max(bw, bh))
+            if scale < 1.0:
+                size = (max(1, int(bw * scale)), max(1, int(bh * scale)))
+                crop = cv2.resize(crop, size, interpolation=cv2.INTER_AREA)
+                mask = cv2.resize(mask, size, interpolation=cv2.INTER_NEAREST)
+            sprites.append((crop, mask))
+            if len(sprites) >= N_SPRITES:
+                break
+    if not sprites:
+        die(f"Aucun crop de train exploitable dans {TRAINS_DIR}")
+    return sprites
+
+
+# -------------------------
+# SCÉNARIO
+# -------------------------
+def make_schedule(rails, n_sprites, rng):
+    """
+    Trajets par voie, tirés à l'avance (quelques entrées par heure simulée).
+    Vérité terrain : la voie est occupée de l'apparition du train à sa disparition.
+    """
+    trips = []
+    for rail in rails:
+        t = rng.uniform(0, GAP_S[1])
+        k = 0
+        while t < DURATION_S:
+            move_in = rng.uniform(*MOVE_S)
+            dwell = rng.uniform(*DWELL_S)
+            move_out = rng.uniform(*MOVE_S)
+            k += 1
+            trips.append({
+                "voie": rail["voie"], "geom": rail["geom"], "gt_id": f"{rail['voie']}_{k:04d}",
+                "sprite": int(rng.integers(n_sprites)), "s_stop": rng.uniform(*STOP_RANGE),
+                "t0": t, "t_arrived": t + move_in, "t_leave": t + move_in + dwell,
+                "t_end": t + move_in + dwell + move_out,
+            })
+            t += move_in + dwell + move_out + rng.uniform(*GAP_S)
+    trips.sort(key=lambda tr: tr["t0"])
+    return trips
+
+
+def smoothstep(u):
+    u = min(1.0, max(0.0, u))
+    return u * u * (3 - 2 * u)
+
+
+def trip_position(trip, t):
+    """Abscisse sur la voie : 1 (bout lointain) -> s_stop -> 1."""
+    s_stop = trip["s_stop"]
+    if t < trip["t_arrived"]:
+        u = smoothstep((t - trip["t0"]) / (trip["t_arrived"] - trip["t0"]))
+        return 1.0 + (s_stop - 1.0) * u
+    if t < trip["t_leave"]:
+        return s_stop
+    u = smoothstep((t - trip["t_leave"]) / (trip["t_end"] - trip["t_leave"]))
+    return s_stop + (1.0 - s_stop) * u
+
+
+# -------------------------
+# RENDU
+# -------------------------
+def paste(frame, crop, mask, cx, bottom):
+    """Colle le crop détouré avec son bas-centre en (cx, bottom), découpé aux bords."""
+    h, w = mask.shape
+    x0, y0 = int(round(cx - w / 2)), int(round(bottom - h))
+    fx0, fy0 = max(0, x0), max(0, y0)
+    fx1, fy1 = min(frame.shape[1], x0 + w), min(frame.shape[0], y0 + h)
+    if fx1 <= fx0 or fy1 <= fy0:
+        return
+    sx, sy = fx0 - x0, fy0 - y0
+    roi = frame[fy0:fy1, fx0:fx1]
+    cv2.copyTo(crop[sy:sy + fy1 - fy0, sx:sx + fx1 - fx0], mask[sy:sy + fy1 - fy0, sx:sx + fx1 - fx0], roi)
+
+
+def write_gt(path: Path, trips):
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        w = csv.writer(f)
+        w.writerow(["voie", "gt_id", "start_s", "end_s"])
+        for tr in sorted(trips, key=lambda tr: (tr["voie"], tr["t0"])):
+            if tr["t0"] >= DURATION_S:
+                continue
+            w.writerow([tr["voie"], tr["gt_id"], f"{tr['t0']:.3f}", f"{min(tr['t_end'], DURATION_S):.3f}"])
+
+
+# -------------------------
+# MAIN
+# -------------------------
+def main():
+    rng = np.random.default_rng(SEED)
+    img_path, label_path = pick_background()
+    bg, rails = load_rails(img_path, label_path)
+    sprites = load_sprites(rng)
+    trips = make_schedule(rails, len(sprites), rng)
+
+    print(f"🖼️ Fond: {img_path} ({len(rails)} voies)")
+    print(f"🚆 {len(sprites)} crops de trains, {len(trips)} trajets sur {DURATION_S} s")
+
+    @lru_cache(maxsize=SPRITE_CACHE)
+    def scaled(idx, height):
+        crop, mask = sprites[idx]
+        w = max(1, int(crop.shape[1] * height / crop.shape[0]))
+        return (cv2.resize(crop, (w, height), interpolation=cv2.INTER_AREA),
+                cv2.resize(mask, (w, height), interpolation=cv2.INTER_NEAREST))
+
+    noise_pos, noise_neg = [], []
+    for _ in range(NOISE_FRAMES if NOISE_STD > 0 else 0):
+        n = rng.normal(0, NOISE_STD, size=(HEIGHT, WIDTH, 3))
+        noise_pos.append(np.clip(n, 0, 255).astype(np.uint8))
+        noise_neg.append(np.clip(-n, 0, 255).astype(np.uint8))
+
+    OUT_DIR.mkdir(parents=True, exist_ok=True)
+    video_path = OUT_DIR / f"{NAME}.mp4"
+    writer = cv2.VideoWriter(str(video_path), cv2.VideoWriter_fourcc(*FOURCC), FPS, (WIDTH, HEIGHT))
+    if not writer.isOpened():
+        die(f"VideoWriter n'a pas pu ouvrir {video_path} ({FOURCC})")
+
+    frame = np.empty_like(bg)
+    n_frames = int(DURATION_S * FPS)
+    nxt, active = 0, []
+    t_start = time.perf_counter()
+    for f in range(n_frames):
+        t = f / FPS
+        while nxt < len(trips) and trips[nxt]["t0"] <= t:
+            active.append(trips[nxt])
+            nxt += 1
+        active = [tr for tr in active if tr["t_end"] > t]
+
+        np.copyto(frame, bg)
+        placed = []
+        for tr in active:
+            x, y, width = point_on_rail(tr["geom"], trip_position(tr, t))
+            placed.append((width, tr, x, y))
+        # du plus lointain (voie étroite) au plus proche
+        for width, tr, x, y in sorted(placed, key=lambda p: p[0]):
+            height = max(8, int(TRAIN_HEIGHT_FACTOR * width) // 4 * 4)
+            crop, mask = scaled(tr["sprite"], height)
+            paste(frame, crop, mask, x, y + POINT_OFFSET_PX)
+
+        if noise_pos:
+            k = f % len(noise_pos)
+            cv2.add(frame, noise_pos[k], dst=frame)
+            cv2.subtract(frame, noise_neg[k], dst=frame)
+        if LIGHT_DRIFT:
+            gain = 1.0 + LIGHT_DRIFT * math.sin(2 * math.pi * t / LIGHT_PERIOD_S)
+            cv2.convertScaleAbs(frame, dst=frame, alpha=gain)
+        writer.write(frame)
+
+        if (f + 1) % max(1, n_frames // 10) == 0:
+            el = time.perf_counter() - t_start
+            print(f"  {f + 1}/{n_frames} frames ({(f + 1) / el:.1f} FPS)")
+    writer.release()
+
+    gt_path = OUT_DIR / f"{NAME}_gt.csv"
+    write_gt(gt_path, trips)
+
+    rails_png = OUT_DIR / f"{NAME}_rails.png"
+    labels = np.zeros((HEIGHT, WIDTH), dtype=np.uint8)
+    for i, rail in enumerate(rails, start=1):
+        labels[rail["mask"] > 0] = i
+    cv2.imwrite(str(rails_png), labels)
+
+    meta = {
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "background": str(img_path), "voies": [r["voie"] for r in rails],
+        "size": [WIDTH, HEIGHT], "fps": FPS, "duration_s": DURATION_S, "frames": n_frames,
+        "seed": SEED, "trips": sum(1 for tr in trips if tr["t0"] < DURATION_S),
+        "sprites": len(sprites), "noise_std": NOISE_STD, "light_drift": LIGHT_DRIFT,
+        "sprite_cache": scaled.cache_info()._asdict(),
+        "gen_fps": round(n_frames / (time.perf_counter() - t_start), 1),
+    }
+    (OUT_DIR / f"{NAME}_meta.json").write_text(json.dumps(meta, indent=2, ensure_ascii=False), encoding="utf-8")
+
+    print("✅ Vidéo :", video_path)
+    print("🧾 Vérité terrain :", gt_path)
+    print("🛤️ Masque des voies (1..N) :", rails_png)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,283 @@
+import csv
+import json
+import shutil
+import sqlite3
+from pathlib import Path
+
+import yaml
+
+
+# -------------------------
+# CONFIG (modifie si besoin)
+# -------------------------
+# Dossiers contenant des runs Ultralytics (<racine>/<task>/<run>/args.yaml)
+RUNS_ROOTS = [Path("runs"), Path("3_training/runs")]
+
+OUT_DIR = Path("6_evaluation/reports")
+OUT_CSV = OUT_DIR / "runs_ledger.csv"
+OUT_JSON = OUT_DIR / "runs_ledger.json"
+OUT_DB = OUT_DIR / "runs_ledger.sqlite"
+
+# Mesure de la latence d'inférence (ms/img) sur le split test, si des poids existent
+MEASURE_SPEED = True
+SPEED_DEVICE = "cpu"
+
+# Seuils de régression (par rapport au meilleur run précédent de la même tâche)
+MAP_TOL = 0.02           # perte absolue de mAP50-95 tolérée
+SPEED_TOL = 0.15         # hausse relative tolérée du temps/époque et du ms/img
+
+# Promotion des poids Pareto-optimaux
+PROMOTE = False
+PROMOTE_DIRS = {
+    "detect": Path("4_models/detection"),
+    "segment": Path("4_models/segmentation"),
+}
+
+# Colonnes d'hyperparamètres reprises de args.yaml
+HPARAMS = ["model", "data", "epochs", "imgsz", "batch", "device", "workers", "cache",
+           "optimizer", "lr0", "lrf", "mosaic", "close_mosaic", "patience"]
+
+# Métrique principale par tâche (colonne de results.csv)
+MAP_COLUMN = {
+    "detect": "metrics/mAP50-95(B)",
+    "segment": "metrics/mAP50-95(M)",
+}
+
+COLUMNS = ["task", "run", "status", "epochs_done"] + HPARAMS + [
+    "mean_epoch_s", "total_train_s", "best_epoch", "best_map50_95", "best_map50",
+    "weights", "infer_ms_per_img", "pareto", "regression",
+]
+
+
+# -------------------------
+# INDEXATION
+# -------------------------
+def run_sort_key(run_dir: Path):
+    # train, train2, train3... dans l'ordre de création Ultralytics
+    suffix = run_dir.name.rstrip("0123456789")
+    num = run_dir.name[len(suffix):]
+    return suffix, int(num) if num else 1
+
+
+def read_results(results_csv: Path):
+    if not results_csv.exists():
+        return []
+    with open(results_csv, newline="", encoding="utf-8") as f:
+        return [{k.strip(): v.strip() for k, v in row.items()} for row in csv.DictReader(f)]
+
+
+def summarize_results(rows, task):
+    """
+    Résume results.csv : temps/époque (colonne time cumulée) et meilleure mAP50-95.
+    """
+    if not rows:
+        return {}
+    map_col = MAP_COLUMN.get(task, "metrics/mAP50-95(B)")
+    map50_col = map_col.replace("mAP50-95", "mAP50")
+
+    times = [float(r["time"]) for r in rows if r.get("time")]
+    best = max(rows, key=lambda r: float(r.get(map_col) or 0.0))
+    return {
+        "epochs_done": len(rows),
+        "total_train_s": round(times[-1], 1) if times else None,
+        "mean_epoch_s": round(times[-1] / len(times), 1) if times else None,
+        "best_epoch": int(best["epoch"]),
+        "best_map50_95": float(best[map_col]),
+        "best_map50": float(best.get(map50_col) or 0.0),
+    }
+
+
+def find_weights(run_dir: Path):
+    for name in ["best.pt", "best.onnx"]:
+        p = run_dir / "weights" / name
+        if p.exists():
+            return p
+    return None
+
+
+def measure_infer_ms(weights: Path, data: str, task: str):
+    """
+    Latence d'inférence moyenne (ms/img) d'Ultralytics sur le split test.
+    Import paresseux : le ledger reste utilisable sans torch.
+    """
+    from ultralytics import YOLO
+
+    model = YOLO(str(weights), task=task)
+    metrics = model.val(data=data, split="test", device=SPEED_DEVICE, plots=False, verbose=False)
+    return round(float(metrics.speed["inference"]), 2)
+
+
+def index_run(run_dir: Path):
+    args = yaml.safe_load((run_dir / "args.yaml").read_text(encoding="utf-8")) or {}
+    task = args.get("task") or run_dir.parent.name
+    rows = read_results(run_dir / "results.csv")
+
+    entry = {c: None for c in COLUMNS}
+    entry.update({"task": task, "run": run_dir.name, "epochs_done": 0})
+    for k in HPARAMS:
+        v = args.get(k)
+        entry[k] = v if v is None or isinstance(v, (int, float, str)) else str(v)
+    entry.update(summarize_results(rows, task))
+
+    if not rows:
+        entry["status"] = "aborted"
+    elif entry["epochs_done"] < int(args.get("epochs") or 0):
+        entry["status"] = "partial"  # early stopping (patience) ou interruption
+    else:
+        entry["status"] = "complete"
+
+    weights = find_weights(run_dir)
+    entry["weights"] = str(weights) if weights else None
+    if MEASURE_SPEED and weights and rows:
+        try:
+            entry["infer_ms_per_img"] = measure_infer_ms(weights, args.get("data"), task)
+        except Exception as e:
+            print(f"⚠️ {task}/{run_dir.name}: mesure de vitesse impossible ({e})")
+    return entry
+
+
+def index_all():
+    ledger = []
+    for root in RUNS_ROOTS:
+        if not root.exists():
+            continue
+        for task_dir in sorted(p for p in root.iterdir() if p.is_dir()):
+            run_dirs = [p for p in task_dir.iterdir() if (p / "args.yaml").exists()]
+            for run_dir in sorted(run_dirs, key=run_sort_key):
+                ledger.append(index_run(run_dir))
+    return ledger
+
+
+# -------------------------
+# RÉGRESSIONS / PARETO
+# -------------------------
+def flag_regressions(ledger):
+    """
+    Compare chaque run terminé au meilleur run précédent de la même tâche
+    et du même YAML de données (les mAP de datasets différents ne se comparent pas).
+    """
+    ref = {}
+    for e in ledger:
+        if e["best_map50_95"] is None:
+            continue
+        flags = []
+        key = (e["task"], e["data"])
+        prev = ref.get(key)
+        if prev is not None:
+            if e["best_map50_95"] < prev["best_map50_95"] - MAP_TOL:
+                flags.append(f"map:{e['best_map50_95']:.3f}<{prev['best_map50_95']:.3f}")
+            if e["mean_epoch_s"] and prev["mean_epoch_s"] and \
+                    e["mean_epoch_s"] > prev["mean_epoch_s"] * (1 + SPEED_TOL):
+                flags.append(f"epoch_s:{e['mean_epoch_s']}>{prev['mean_epoch_s']}")
+            if e["infer_ms_per_img"] and prev["infer_ms_per_img"] and \
+                    e["infer_ms_per_img"] > prev["infer_ms_per_img"] * (1 + SPEED_TOL):
+                flags.append(f"infer_ms:{e['infer_ms_per_img']}>{prev['infer_ms_per_img']}")
+        e["regression"] = ";".join(flags)
+        if prev is None or e["best_map50_95"] > prev["best_map50_95"]:
+            ref[key] = e
+
+
+def mark_pareto(ledger):
+    """
+    Front de Pareto par tâche : maximiser mAP50-95, minimiser le coût.
+    Retourne {task: run recommandé (meilleure mAP du front)}.
+    """
+    picks = {}
+    for task in sorted({e["task"] for e in ledger}):
+        cands = [e for e in ledger if e["task"] == task and e["best_map50_95"] is not None and e["weights"]]
+        # coût = latence d'inférence si mesurée pour tous les candidats, sinon temps/époque
+        cost_key = "infer_ms_per_img" if all(e["infer_ms_per_img"] for e in cands) else "mean_epoch_s"
+        cands = [e for e in cands if e[cost_key] is not None]
+
+        def cost_of(e):
+            return e[cost_key]
+
+        front = []
+        for a in cands:
+            dominated = any(
+                b is not a
+                and b["best_map50_95"] >= a["best_map50_95"] and cost_of(b) <= cost_of(a)
+                and (b["best_map50_95"] > a["best_map50_95"] or cost_of(b) < cost_of(a))
+                for b in cands
+            )
+            a["pareto"] = not dominated
+            if not dominated:
+                front.append(a)
+        if front:
+            picks[task] = max(front, key=lambda e: e["best_map50_95"])
+    return picks
+
+
+def promote(picks):
+    for task, e in picks.items():
+        out_dir = PROMOTE_DIRS.get(task)
+        if out_dir is None:
+            continue
+        out_dir.mkdir(parents=True, exist_ok=True)
+        weights_dir = Path(e["weights"]).parent
+        for name in ["best.pt", "best.onnx"]:
+            src = weights_dir / name
+            if src.exists():
+                shutil.copyfile(src, out_dir / name)
+        manifest = {k: e[k] for k in ["task", "run", "best_epoch", "best_map50_95",
+                                      "infer_ms_per_img", "mean_epoch_s", "weights"]}
+        (out_dir / "promoted.json").write_text(json.dumps(manifest, indent=2), encoding="utf-8")
+        print(f"📦 {task}: {e['run']} promu -> {out_dir}")
+
+
+# -------------------------
+# EXPORT
+# -------------------------
+def write_outputs(ledger):
+    OUT_DIR.mkdir(parents=True, exist_ok=True)
+
+    with open(OUT_CSV, "w", newline="", encoding="utf-8") as f:
+        w = csv.DictWriter(f, fieldnames=COLUMNS)
+        w.writeheader()
+        w.writerows(ledger)
+
+    OUT_JSON.write_text(json.dumps(ledger, indent=2, ensure_ascii=False), encoding="utf-8")
+
+    # Table SQLite pour les requêtes ad hoc :
+    #   sqlite3 6_evaluation/reports/runs_ledger.sqlite "select run, best_map50_95 from runs where task='detect'"
+    if OUT_DB.exists():
+        OUT_DB.unlink()
+    cols = ", ".join(f'"{c}"' for c in COLUMNS)
+    con = sqlite3.connect(OUT_DB)
+    con.execute(f"CREATE TABLE runs ({cols})")
+    con.executemany(
+        f"INSERT INTO runs VALUES ({', '.join('?' for _ in COLUMNS)})",
+        [[e[c] for c in COLUMNS] for e in ledger],
+    )
+    con.commit()
+    con.close()
+
+
+def main():
+    ledger = index_all()
+    if not ledger:
+        raise SystemExit("❌ Aucun run trouvé.")
+
+    flag_regressions(ledger)
+    picks = mark_pareto(ledger)
+    write_outputs(ledger)
+
+    print(f"\n📒 Runs indexés: {len(ledger)}")
+    for e in ledger:
+        mark = "★" if e["pareto"] else " "
+        print(f" {mark} {e['task']:>7}/{e['run']:<8} {e['status']:<9} "
+              f"mAP50-95={e['best_map50_95']}  s/époque={e['mean_epoch_s']}  "
+              f"ms/img={e['infer_ms_per_img']}  {e['regression'] or ''}")
+
+    for task, e in picks.items():
+        print(f"🏆 {task}: {e['run']} (Pareto, mAP50-95={e['best_map50_95']})")
+    if PROMOTE:
+        promote(picks)
+
+    print(f"\n📊 CSV   : {OUT_CSV}")
+    print(f"🧾 JSON  : {OUT_JSON}")
+    print(f"🗄️ SQLite: {OUT_DB}")
+
+
+if __name__ == "__main__":
+    main()
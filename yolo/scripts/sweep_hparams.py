@@ -0,0 +1,302 @@
+import csv
+import itertools
+import json
+import os
+import random
+import time
+from multiprocessing import get_context
+from pathlib import Path
+
+import cv2
+import yaml
+
+from run_ledger import MAP_COLUMN, mark_pareto, read_results, summarize_results
+
+
+# -------------------------
+# CONFIG (modifie si besoin)
+# -------------------------
+# Run de base : ses args.yaml fournissent tout ce que l'espace de recherche ne fixe pas
+BASE_ARGS = Path("runs/detect/train5/args.yaml")
+
+# Espace de recherche : champs de args.yaml -> valeurs candidates
+SEARCH_SPACE = {
+    "model": ["yolo11n.pt", "yolo11s.pt"],
+    "imgsz": [480, 640],
+    "batch": [8, 16],
+    "lr0": [0.005, 0.01],
+    "mosaic": [0.5, 1.0],
+}
+SEARCH = "random"        # "grid" (toutes les combinaisons) | "random" (N_TRIALS tirées sans remise)
+N_TRIALS = 12
+SEED = 0
+
+SWEEP_NAME = "sweep1"
+EPOCHS = 30
+# Runs dans 3_training/runs/<task>/<SWEEP_NAME>_tNNN : indexés aussi par run_ledger.py
+PROJECT_ROOT = Path("3_training/runs")
+
+# Parallélisme CPU : chaque essai est épinglé sur CORES_PER_TRIAL cœurs dédiés
+CORES_PER_TRIAL = 4      # threads torch de l'essai
+PARALLEL = None          # essais simultanés (None = cœurs disponibles // CORES_PER_TRIAL)
+WORKERS_PER_TRIAL = None # workers du dataloader (None = CORES_PER_TRIAL // 2)
+
+# Arrêt anticipé : un essai est arrêté s'il est dominé à la même époque par un autre essai
+# (mAP50-95 plus haute d'au moins DOMINANCE_MARGIN et époque pas plus lente que TIME_TOL)
+GRACE_EPOCHS = 5
+DOMINANCE_MARGIN = 0.02
+TIME_TOL = 0.10
+POLL_S = 10.0
+
+# Latence d'inférence des essais terminés (séquentiel, après le sweep)
+MEASURE_LATENCY = True
+LATENCY_IMAGES = 50
+LATENCY_WARMUP = 5
+
+OUT_DIR = Path("6_evaluation/reports")
+
+# Champs de args.yaml repris du run de base (le reste est propre à un run ou à la prédiction)
+BASE_KEYS = ["data", "patience", "device", "cache", "optimizer", "lrf", "momentum", "weight_decay",
+             "warmup_epochs", "close_mosaic", "cos_lr", "seed", "deterministic", "single_cls", "rect",
+             "fraction", "hsv_h", "hsv_s", "hsv_v", "degrees", "translate", "scale", "fliplr", "mixup",
+             "copy_paste", "overlap_mask", "mask_ratio"]
+
+IMG_EXTS = {".jpg", ".jpeg", ".png", ".bmp"}
+
+
+def die(msg: str):
+    raise SystemExit(f"\n❌ {msg}\n")
+
+
+# -------------------------
+# ESSAIS
+# -------------------------
+def make_trials(base):
+    keys = list(SEARCH_SPACE)
+    combos = list(itertools.product(*(SEARCH_SPACE[k] for k in keys)))
+    if SEARCH == "random":
+        combos = random.Random(SEED).sample(combos, min(N_TRIALS, len(combos)))
+    elif SEARCH != "grid":
+        die(f"SEARCH inconnu: {SEARCH!r}")
+
+    task = base.get("task", "detect")
+    trials = []
+    for i, combo in enumerate(combos):
+        params = dict(zip(keys, combo))
+        args = {k: base[k] for k in BASE_KEYS if k in base}
+        args.update({k: v for k, v in params.items() if k != "model"})
+        args.update({"epochs": EPOCHS, "project": str(PROJECT_ROOT / task), "name": f"{SWEEP_NAME}_t{i:03d}",
+                     "exist_ok": True, "plots": False, "verbose": False})
+        trials.append({"id": f"t{i:03d}", "task": task, "model": params.get("model", base.get("model")),
+                       "params": params, "args": args,
+                       "dir": PROJECT_ROOT / task / args["name"]})
+    return trials
+
+
+def core_slots():
+    """Groupes de cœurs disjoints, un par essai simultané."""
+    cores = sorted(os.sched_getaffinity(0)) if hasattr(os, "sched_getaffinity") else list(range(os.cpu_count() or 1))
+    per = max(1, min(CORES_PER_TRIAL, len(cores)))
+    n = PARALLEL or max(1, len(cores) // per)
+    slots = [cores[i * per:(i + 1) * per] for i in range(n)]
+    return [s for s in slots if s] or [cores]
+
+
+def run_trial(trial, cores, workers):
+    """Processus fils (spawn) : épinglage et threads fixés avant l'import de torch."""
+    n = str(len(cores))
+    for var in ["OMP_NUM_THREADS", "MKL_NUM_THREADS", "OPENBLAS_NUM_THREADS"]:
+        os.environ[var] = n
+    if hasattr(os, "sched_setaffinity"):
+        os.sched_setaffinity(0, cores)   # hérité par les workers du dataloader
+    cv2.setNumThreads(1)
+
+    import torch
+    from ultralytics import YOLO
+
+    torch.set_num_threads(len(cores))
+    YOLO(trial["model"]).train(**trial["args"], workers=workers)
+
+
+# -------------------------
+# ARRÊT ANTICIPÉ
+# -------------------------
+def curve(trial):
+    """[(mAP50-95, durée de l'époque)] par époque, depuis results.csv."""
+    rows = read_results(trial["dir"] / "results.csv")
+    col = MAP_COLUMN.get(trial["task"], "metrics/mAP50-95(B)")
+    out, prev_t = [], 0.0
+    for r in rows:
+        t = float(r.get("time") or 0.0)
+        out.append((float(r.get(col) or 0.0), t - prev_t))
+        prev_t = t
+    return out
+
+
+def dominated_by(trial, trials):
+    c = trial["curve"]
+    e = len(c)
+    if e < GRACE_EPOCHS:
+        return None
+    m = max(x[0] for x in c)
+    t = sum(x[1] for x in c) / e
+    for other in trials:
+        oc = other["curve"]
+        if other is trial or len(oc) < e:
+            continue
+        om = max(x[0] for x in oc[:e])
+        ot = sum(x[1] for x in oc[:e]) / e
+        if om >= m + DOMINANCE_MARGIN and ot <= t * (1 + TIME_TOL):
+            return other["id"]
+    return None
+
+
+# -------------------------
+# LATENCE
+# -------------------------
+def test_frames(data_yaml, n):
+    cfg = yaml.safe_load(Path(data_yaml).read_text(encoding="utf-8"))
+    folder = Path(cfg["path"]) / cfg.get("test", cfg["val"])
+    imgs = sorted(p for p in folder.iterdir() if p.suffix.lower() in IMG_EXTS)[:n] if folder.exists() else []
+    return [cv2.imread(str(p)) for p in imgs]
+
+
+def measure_latency(weights: Path, task, imgsz, frames):
+    from ultralytics import YOLO
+
+    model = YOLO(str(weights), task=task)
+    for f in frames[:LATENCY_WARMUP]:
+        model.predict(f, imgsz=imgsz, device="cpu", verbose=False)
+    times = []
+    for f in frames:
+        t = time.perf_counter()
+        model.predict(f, imgsz=imgsz, device="cpu", verbose=False)
+        times.append((time.perf_counter() - t) * 1000.0)
+    times.sort()
+    return round(times[len(times) // 2], 2)
+
+
+# -------------------------
+# MAIN
+# -------------------------
+def load_state(path: Path):
+    return json.loads(path.read_text(encoding="utf-8")) if path.exists() else {}
+
+
+def save_state(path: Path, trials):
+    state = {t["id"]: {"status": t["status"], "stopped_by": t.get("stopped_by"), "params": t["params"]}
+             for t in trials}
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(json.dumps(state, indent=2, ensure_ascii=False), encoding="utf-8")
+
+
+def main():
+    if not BASE_ARGS.exists():
+        die(f"args.yaml de base introuvable: {BASE_ARGS}")
+    base = yaml.safe_load(BASE_ARGS.read_text(encoding="utf-8")) or {}
+    trials = make_trials(base)
+
+    state_path = PROJECT_ROOT / trials[0]["task"] / f"{SWEEP_NAME}_state.json"
+    state = load_state(state_path)
+    for t in trials:
+        t["status"] = state.get(t["id"], {}).get("status", "pending")
+        t["stopped_by"] = state.get(t["id"], {}).get("stopped_by")
+        if t["status"] in ("running", "failed"):
+            t["status"] = "pending"   # sweep interrompu : l'essai est relancé
+        t["curve"] = curve(t)
+
+    slots = core_slots()
+    workers = WORKERS_PER_TRIAL if WORKERS_PER_TRIAL is not None else max(1, len(slots[0]) // 2)
+    print(f"🔬 Sweep {SWEEP_NAME}: {len(trials)} essais ({SEARCH}), {len(slots)} en parallèle, "
+          f"{len(slots[0])} cœurs + {workers} workers par essai")
+
+    ctx = get_context("spawn")
+    pending = [t for t in trials if t["status"] == "pending"]
+    running = {}   # id -> (trial, process, slot)
+    free = list(range(len(slots)))
+    while pending or running:
+        while pending and free:
+            t = pending.pop(0)
+            slot = free.pop(0)
+            p = ctx.Process(target=run_trial, name=t["id"], args=(t, slots[slot], workers))
+            p.start()
+            t["status"] = "running"
+            running[t["id"]] = (t, p, slot)
+            print(f"🚀 {t['id']} cœurs {slots[slot]} {t['params']}")
+        save_state(state_path, trials)
+
+        time.sleep(POLL_S)
+        for t in trials:
+            if t["status"] in ("running", "complete", "stopped"):
+                t["curve"] = curve(t)
+
+        for tid, (t, p, slot) in list(running.items()):
+            if not p.is_alive():
+                t["status"] = "complete" if p.exitcode == 0 else "failed"
+                print(f"{'✅' if p.exitcode == 0 else '❌'} {tid}: {len(t['curve'])} époques")
+            else:
+                by = dominated_by(t, trials)
+                if by is None:
+                    continue
+                p.terminate()
+                p.join()
+                t["status"], t["stopped_by"] = "stopped", by
+                print(f"✋ {tid} arrêté à l'époque {len(t['curve'])} (dominé par {by})")
+            del running[tid]
+            free.append(slot)
+    save_state(state_path, trials)
+
+    # classement
+    rows = []
+    frames = test_frames(base["data"], LATENCY_IMAGES) if MEASURE_LATENCY and base.get("data") else []
+    for t in trials:
+        summary = summarize_results(read_results(t["dir"] / "results.csv"), t["task"])
+        weights = t["dir"] / "weights" / "best.pt"
+        row = {"trial": t["id"], "run": str(t["dir"]), "task": t["task"], "status": t["status"],
+               "stopped_by": t["stopped_by"], **t["params"],
+               "epochs_done": summary.get("epochs_done", 0), "best_map50_95": summary.get("best_map50_95"),
+               "best_map50": summary.get("best_map50"), "mean_epoch_s": summary.get("mean_epoch_s"),
+               "weights": str(weights) if weights.exists() else None, "infer_ms_per_img": None, "pareto": False}
+        if frames and row["weights"] and t["status"] == "complete":
+            try:
+                row["infer_ms_per_img"] = measure_latency(weights, t["task"], t["args"]["imgsz"], frames)
+            except Exception as e:
+                print(f"⚠️ {t['id']}: mesure de latence impossible ({e})")
+        rows.append(row)
+
+    finished = [r for r in rows if r["status"] == "complete" and r["best_map50_95"] is not None]
+    mark_pareto(finished)
+    by_map = sorted(finished, key=lambda r: -r["best_map50_95"])
+    by_latency = sorted((r for r in finished if r["infer_ms_per_img"] is not None),
+                        key=lambda r: r["infer_ms_per_img"])
+    for i, r in enumerate(by_map, start=1):
+        r["rank_map"] = i
+    for i, r in enumerate(by_latency, start=1):
+        r["rank_latency"] = i
+
+    OUT_DIR.mkdir(parents=True, exist_ok=True)
+    out_json = OUT_DIR / f"sweep_{SWEEP_NAME}.json"
+    out_csv = OUT_DIR / f"sweep_{SWEEP_NAME}.csv"
+    report = {"sweep": SWEEP_NAME, "base_args": str(BASE_ARGS), "search": SEARCH, "search_space": SEARCH_SPACE,
+              "epochs": EPOCHS, "slots": slots, "workers_per_trial": workers, "trials": rows,
+              "by_map": [r["trial"] for r in by_map], "by_latency": [r["trial"] for r in by_latency],
+              "pareto": [r["trial"] for r in by_map if r["pareto"]]}
+    out_json.write_text(json.dumps(report, indent=2, ensure_ascii=False, default=str), encoding="utf-8")
+    fields = list(dict.fromkeys(k for r in rows for k in r))
+    with open(out_csv, "w", newline="", encoding="utf-8") as f:
+        w = csv.DictWriter(f, fieldnames=fields)
+        w.writeheader()
+        w.writerows(rows)
+
+    print("\n📊 Essais terminés (mAP50-95 / latence):")
+    for r in by_map:
+        print(f"  {r['trial']} {'⭐' if r['pareto'] else '  '} mAP50-95={r['best_map50_95']:<7} "
+              f"{r['infer_ms_per_img']} ms  {r['mean_epoch_s']} s/époque  {dict((k, r[k]) for k in SEARCH_SPACE)}")
+    stopped = [r for r in rows if r["status"] == "stopped"]
+    if stopped:
+        print(f"✋ {len(stopped)} essais arrêtés tôt: {', '.join(r['trial'] for r in stopped)}")
+    print(f"🧾 Rapport: {out_json}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,195 @@
+import csv
+import json
+import time
+from pathlib import Path
+
+import ultralytics.data.build as ul_build
+from ultralytics import YOLO
+from ultralytics.data.dataset import YOLODataset
+
+from build_image_cache import DATA_YAML, IMGSZ, SPLITS, cache_dir_for, load_data_yaml, open_split
+
+
+# -------------------------
+# CONFIG (modifie si besoin)
+# -------------------------
+MODEL = "yolo11s.pt"
+EPOCHS = 3            # quelques époques suffisent pour mesurer le temps/époque
+BATCH = 8
+DEVICE = "cpu"
+WORKERS = 8
+
+PROJECT = "3_training/runs/cache_bench"
+
+# Modes comparés : "false"/"ram"/"disk" = option cache d'Ultralytics,
+# "mmap" = store uint8 pré-décodé (scripts/build_image_cache.py)
+MODES = ["false", "ram", "disk", "mmap"]
+
+OUT_REPORT = Path("6_evaluation/reports/image_cache_benchmark.json")
+
+
+def die(msg: str):
+    raise SystemExit(f"\n❌ {msg}\n")
+
+
+# -------------------------
+# HOOK DATALOADER
+# -------------------------
+class MmapYOLODataset(YOLODataset):
+    """
+    YOLODataset dont load_image lit les images dans le store memory-mappé
+    au lieu de décoder le JPEG. Les images absentes du store retombent
+    sur le chargement Ultralytics normal.
+    """
+
+    mmap_dir = None  # fixé par install_mmap_hook()
+
+    def __init__(self, *args, **kwargs):
+        # attribut d'instance : survit au pickling vers les workers (spawn sous Windows)
+        self._mmap_dir = type(self).mmap_dir
+        self._mmap = None
+        super().__init__(*args, **kwargs)
+
+    def _open_mmap(self):
+        # ouvert paresseusement : chaque worker du DataLoader ouvre ses propres memmaps
+        lookup = {}
+        for split in SPLITS:
+            store, index = open_split(self._mmap_dir, split)
+            if store is None or index["imgsz"] != self.imgsz:
+                continue
+            for name, entry in index["files"].items():
+                lookup[name] = (store, entry["slot"], tuple(entry["hw0"]), tuple(entry["hw"]))
+        self._mmap = lookup
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state["_mmap"] = None  # ne jamais sérialiser les memmaps
+        return state
+
+    def load_image(self, i, rect_mode=True):
+        if self.ims[i] is not None or not rect_mode:
+            return super().load_image(i, rect_mode)
+        if self._mmap is None:
+            self._open_mmap()
+        hit = self._mmap.get(Path(self.im_files[i]).name)
+        if hit is None:
+            return super().load_image(i, rect_mode)
+
+        store, slot, hw0, hw = hit
+        # copie : les augmentations (HSV, etc.) modifient l'image en place
+        im = store[slot, :hw[0], :hw[1]].copy()
+
+        if self.augment:
+            # même logique de buffer que BaseDataset (mosaic)
+            self.ims[i], self.im_hw0[i], self.im_hw[i] = im, hw0, hw
+            self.buffer.append(i)
+            if 1 < len(self.buffer) >= self.max_buffer_length:
+                j = self.buffer.pop(0)
+                if self.cache != "ram":
+                    self.ims[j], self.im_hw0[j], self.im_hw[j] = None, None, None
+        return im, hw0, hw
+
+
+def install_mmap_hook(cache_dir: Path):
+    """
+    Remplace YOLODataset dans ultralytics.data.build (utilisé par build_yolo_dataset()
+    pour les trainers detect et segment). Retourne la classe d'origine.
+    """
+    MmapYOLODataset.mmap_dir = cache_dir
+    original = ul_build.YOLODataset
+    ul_build.YOLODataset = MmapYOLODataset
+    return original
+
+
+# -------------------------
+# BENCHMARK
+# -------------------------
+def epoch_times(results_csv: Path):
+    """
+    La colonne "time" de results.csv est cumulée : on la différencie pour obtenir le temps par époque.
+    """
+    if not results_csv.exists():
+        return []
+    with open(results_csv, newline="", encoding="utf-8") as f:
+        rows = list(csv.DictReader(f))
+    times = []
+    prev = 0.0
+    for row in rows:
+        row = {k.strip(): v for k, v in row.items()}
+        t = float(row["time"])
+        times.append(t - prev)
+        prev = t
+    return times
+
+
+def run_mode(mode: str, cache_dir: Path):
+    original = None
+    if mode == "mmap":
+        original = install_mmap_hook(cache_dir)
+        cache = False
+    else:
+        cache = {"false": False, "ram": "ram", "disk": "disk"}[mode]
+
+    model = YOLO(MODEL)
+    t0 = time.perf_counter()
+    try:
+        model.train(
+            data=str(DATA_YAML),
+            epochs=EPOCHS,
+            imgsz=IMGSZ,
+            batch=BATCH,
+            device=DEVICE,
+            workers=WORKERS,
+            cache=cache,
+            project=PROJECT,
+            name=f"cache_{mode}",
+            exist_ok=True,
+            plots=False,
+        )
+    finally:
+        if original is not None:
+            ul_build.YOLODataset = original
+    wall = time.perf_counter() - t0
+
+    per_epoch = epoch_times(Path(model.trainer.save_dir) / "results.csv")
+    # la 1re époque inclut le warm-up et le remplissage éventuel du cache RAM/disk
+    steady = per_epoch[1:] or per_epoch
+    return {
+        "mode": mode,
+        "wall_s": round(wall, 3),
+        "epoch_s": [round(t, 3) for t in per_epoch],
+        "mean_epoch_s": round(sum(steady) / len(steady), 3) if steady else None,
+    }
+
+
+def main():
+    root, _ = load_data_yaml(DATA_YAML)
+    cache_dir = cache_dir_for(root, IMGSZ)
+    if "mmap" in MODES and not any((cache_dir / f"{s}.json").exists() for s in SPLITS):
+        die(f"Store absent: {cache_dir}. Lance d'abord scripts/build_image_cache.py")
+
+    results = []
+    for mode in MODES:
+        print(f"\n🚀 Entraînement cache={mode}")
+        results.append(run_mode(mode, cache_dir))
+        print(f"⏱️ {mode}: {results[-1]['mean_epoch_s']} s/époque")
+
+    ref = next((r["mean_epoch_s"] for r in results if r["mode"] == "false"), None)
+    for r in results:
+        r["speedup_vs_false"] = round(ref / r["mean_epoch_s"], 3) if ref and r["mean_epoch_s"] else None
+
+    OUT_REPORT.parent.mkdir(parents=True, exist_ok=True)
+    report = {
+        "model": MODEL, "data": str(DATA_YAML), "imgsz": IMGSZ, "batch": BATCH,
+        "device": DEVICE, "workers": WORKERS, "epochs": EPOCHS, "results": results,
+    }
+    OUT_REPORT.write_text(json.dumps(report, indent=2, ensure_ascii=False), encoding="utf-8")
+
+    print("\n📊 Temps moyen par époque (hors 1re époque):")
+    for r in results:
+        print(f"  {r['mode']:>5}: {r['mean_epoch_s']} s  (x{r['speedup_vs_false']})")
+    print(f"🧾 Rapport: {OUT_REPORT}")
+
+
+if __name__ == "__main__":
+    main()